@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'user_expenses.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,16 +81,85 @@ WSGI_APPLICATION = 'expense_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'split_expense',
-        'USER': 'eprinter_owner',
-        'PASSWORD':'Yfolyxzg48WR',
-        'HOST':'ep-crimson-surf-a1weguwe.ap-southeast-1.aws.neon.tech',
-        'PORT':'5432'
+# Database, configured from the environment; the defaults are the hosted
+# PostgreSQL database.
+#
+# DB_POOL picks how each worker manages its connections:
+#   'persistent' - keep a connection open for DB_CONN_MAX_AGE seconds and
+#                  check that it is alive before reusing it in a new request
+#   'pool'       - psycopg 3 connection pool of DB_POOL_MIN_SIZE to
+#                  DB_POOL_MAX_SIZE connections, waiting up to DB_POOL_TIMEOUT
+#                  seconds for a free one (needs psycopg[pool])
+#   'none'       - open and close a connection for every request
+# Set DB_DISABLE_SERVER_SIDE_CURSORS=1 behind a transaction-mode pooler such
+# as PgBouncer.
+#
+# `manage.py test` runs on SQLite so the suite works offline; set DB_ENGINE to
+# 'postgresql' to test against PostgreSQL, or to 'sqlite' to use SQLite anywhere.
+TESTING = sys.argv[1:2] == ['test']
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite' if TESTING else 'postgresql')
+DB_POOL = os.environ.get('DB_POOL', 'persistent')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
+    # SQLite ignores the INCLUDE columns of the covering indexes
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'split_expense'),
+            'USER': os.environ.get('DB_USER', 'eprinter_owner'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'Yfolyxzg48WR'),
+            'HOST': os.environ.get('DB_HOST', 'ep-crimson-surf-a1weguwe.ap-southeast-1.aws.neon.tech'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'OPTIONS': {},
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        }
+    }
+    if os.environ.get('DB_SSLMODE'):
+        DATABASES['default']['OPTIONS']['sslmode'] = os.environ['DB_SSLMODE']
+
+    if DB_POOL == 'pool':
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    elif DB_POOL == 'persistent':
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    elif DB_POOL != 'none':
+        raise ImproperlyConfigured(f"DB_POOL must be 'persistent', 'pool' or 'none', not {DB_POOL!r}")
+
+# Read replicas (user_expenses/replicas.py). DB_REPLICAS lists their hosts
+# (PostgreSQL) or database files (SQLite), comma separated; each becomes an
+# alias replica_1, replica_2, ... with the rest of the primary's settings.
+# Reads of data an expense write touched stay on the primary for
+# REPLICA_READ_YOUR_WRITES seconds after it commits; keep it above the
+# replicas' usual lag. Tests get a separate 'replica' database instead and
+# turn routing on themselves.
+DATABASE_ROUTERS = ['user_expenses.replicas.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_READ_YOUR_WRITES = 5
+
+if TESTING:
+    DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'}
+else:
+    replica_locations = [location.strip() for location in os.environ.get('DB_REPLICAS', '').split(',') if location.strip()]
+    for number, location in enumerate(replica_locations, start=1):
+        alias = f'replica_{number}'
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+            ('NAME' if DB_ENGINE == 'sqlite' else 'HOST'): location,
+        }
+        DATABASE_REPLICAS.append(alias)
 
 
 # Password validation
@@ -130,6 +204,13 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Swagger docs at /api/swagger/ (user_expenses/schema.py). drf_yasg's schema
+# view is built by the first docs request; once `manage.py build_schema` has
+# written SWAGGER_SCHEMA_PATH, that file is served instead of generating the
+# document.
+SWAGGER_ENABLED = True
+SWAGGER_SCHEMA_PATH = BASE_DIR / 'openapi.json'
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -138,4 +219,119 @@ SWAGGER_SETTINGS = {
             'in': 'header'
         }
     }
-}
\ No newline at end of file
+}
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'user_expenses.authentication.JWTAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'user_expenses.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Per-process cache of authenticated users (see user_expenses/user_cache.py).
+# USER_CACHE_TTL is in seconds; 0 disables the cache.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 300
+
+# Batch expense creation (/api/create_expenses/batch/)
+# 'partial' creates the valid expenses and reports the invalid ones;
+# 'atomic' rejects the whole batch if any expense is invalid.
+EXPENSE_BATCH_MODE = 'partial'
+EXPENSE_BATCH_MAX_SIZE = 1000
+
+# Balance sheet CSV export (/api/expenses/balance-sheet/)
+# When streaming, splits are read from a server-side cursor in chunks of
+# BALANCE_SHEET_CHUNK_SIZE rows and written out as they arrive.
+BALANCE_SHEET_STREAM = True
+BALANCE_SHEET_CHUNK_SIZE = 2000
+
+# Overall expense listing (/api/expenses/overall/) page size and its upper bound
+EXPENSE_PAGE_SIZE = 50
+EXPENSE_MAX_PAGE_SIZE = 500
+
+# Per-request performance metrics (user_expenses/middleware.py), served in
+# Prometheus text format at /metrics/. METRICS_SAMPLE_RATE is the fraction of
+# requests measured; quantile gauges cover the last METRICS_WINDOW_SECONDS.
+METRICS_ENABLED = True
+METRICS_SAMPLE_RATE = 1.0
+METRICS_WINDOW_SECONDS = 60
+METRICS_PREFIX = 'expense_api'
+METRICS_EXCLUDED_VIEWS = ['metrics']
+
+# Async read endpoints (/api/async/...; user_expenses/async_views.py) run their
+# queries on a pool of this many threads, each with its own connection
+ASYNC_DB_WORKERS = 16
+
+# Response cache for /api/balance/, /api/expenses/user/ and
+# /api/expenses/overall/ (user_expenses/response_cache.py). Entries live in the
+# RESPONSE_CACHE_ALIAS cache for RESPONSE_CACHE_TTL seconds; expense writes
+# invalidate them through versioned keys. LocMemCache is per process, so an
+# expense created in one worker would not invalidate another's entries: point
+# the cache at a shared backend (e.g. Redis) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TTL = 300
+RESPONSE_CACHE_PREFIX = 'responses'
+
+# Background exports (/api/exports/...; user_expenses/jobs.py). At most
+# EXPORT_WORKERS exports run at once per process and a user can have
+# EXPORT_MAX_ACTIVE_PER_USER pending or running. Files are written under
+# EXPORT_ROOT and kept for EXPORT_TTL seconds after the job finishes;
+# purge_exports deletes expired ones and fails jobs still unfinished after
+# EXPORT_JOB_TIMEOUT seconds.
+EXPORT_ROOT = BASE_DIR / 'exports'
+EXPORT_WORKERS = 2
+EXPORT_MAX_ACTIVE_PER_USER = 3
+EXPORT_TTL = 24 * 60 * 60
+EXPORT_JOB_TIMEOUT = 60 * 60
+
+# Incremental sync (/api/sync/; user_expenses/sync.py): expenses per response
+# and its upper bound
+SYNC_PAGE_SIZE = 200
+SYNC_MAX_PAGE_SIZE = 1000
+
+# Rate limits and request coalescing for expensive endpoints. RATE_LIMITS
+# gives each endpoint a per-user token bucket (user_expenses/throttling.py):
+# 'rate' requests per second on average, in bursts of up to 'burst'.
+# COALESCE_REQUESTS lets concurrent identical requests share one computation
+# (user_expenses/coalescing.py); waiters give up after COALESCE_TIMEOUT
+# seconds. Both keep their state per process by default; set
+# RATE_LIMIT_CACHE_ALIAS / COALESCE_CACHE_ALIAS to a cache shared by all
+# workers (e.g. Redis) to apply them across processes.
+RATE_LIMITS = {
+    'balance': {'rate': 5, 'burst': 20},
+    'settle-up': {'rate': 1, 'burst': 5},
+    'balance-sheet': {'rate': 0.2, 'burst': 3},
+}
+RATE_LIMIT_CACHE_ALIAS = None
+COALESCE_REQUESTS = True
+COALESCE_CACHE_ALIAS = None
+COALESCE_TIMEOUT = 30
+COALESCE_POLL_INTERVAL = 0.05
+
+# Split analytics at /admin/analytics/ (staff only; user_expenses/analytics.py).
+# Splits are read in chunks of ANALYTICS_CHUNK_SIZE rows and kept as a NumPy
+# snapshot at ANALYTICS_SNAPSHOT_PATH, reused until it is
+# ANALYTICS_SNAPSHOT_MAX_AGE seconds old; None reads the database every time.
+ANALYTICS_CHUNK_SIZE = 50000
+ANALYTICS_SNAPSHOT_PATH = BASE_DIR / 'snapshots' / 'splits.npy'
+ANALYTICS_SNAPSHOT_MAX_AGE = 10 * 60
+ANALYTICS_TOP_USERS = 10
+
+# Idempotency-Key support on POST /api/create_expense/
+# (user_expenses/idempotency.py): a key and its stored response are kept for
+# IDEMPOTENCY_KEY_TTL seconds, after which purge_idempotency_keys deletes them
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
@@ -0,0 +1,42 @@
+"""
+Production profile for API workers:
+
+    DJANGO_SETTINGS_MODULE=expense_api.settings_production gunicorn expense_api.wsgi
+
+Everything in settings.py applies, minus what the JWT API does not use, so
+workers boot faster: the admin with its auth, sessions and messages apps and
+middleware (and the staff analytics, which need NumPy), the browsable API
+renderer, and the Swagger docs. DJANGO_ADMIN=1 and SWAGGER=1 bring them back.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, REST_FRAMEWORK, SECRET_KEY
+
+DEBUG = False
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+ADMIN_ENABLED = os.environ.get('DJANGO_ADMIN') == '1'
+SWAGGER_ENABLED = os.environ.get('SWAGGER') == '1'
+
+if not ADMIN_ENABLED:
+    INSTALLED_APPS = ['user_expenses', 'rest_framework']
+    MIDDLEWARE = [
+        'user_expenses.middleware.PerformanceMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+    # Without django.contrib.auth there is no AnonymousUser model;
+    # unauthenticated requests get request.user = None
+    REST_FRAMEWORK = {**REST_FRAMEWORK, 'UNAUTHENTICATED_USER': None}
+    if SWAGGER_ENABLED:
+        INSTALLED_APPS += ['django.contrib.staticfiles', 'drf_yasg']
+elif not SWAGGER_ENABLED:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'drf_yasg']
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['user_expenses.renderers.ORJSONRenderer'],
+}
@@ -14,10 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path
 from django.conf.urls import include
+from user_expenses.metrics import metrics_view
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/', include('user_expenses.urls'))
+    path('api/', include('user_expenses.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
+
+# The admin, and the staff analytics (with NumPy) behind it, only when the
+# admin app is installed; the production profile leaves it out by default
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    from user_expenses.analytics import analytics_view
+
+    urlpatterns += [
+        path('admin/analytics/', admin.site.admin_view(analytics_view), name='analytics'),
+        path('admin/', admin.site.urls),
+    ]
@@ -1,7 +1,10 @@
-from .models import User, Expense, ExpenseSplit
+from .models import User, Expense, ExpenseSplit, PairBalance, Group, GroupBalance
 from django.contrib import admin
 # Register your models here.
 
 admin.site.register(User)
 admin.site.register(Expense)
 admin.site.register(ExpenseSplit)
+admin.site.register(PairBalance)
+admin.site.register(Group)
+admin.site.register(GroupBalance)
@@ -0,0 +1,191 @@
+import itertools
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.functions import Cast, Round
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .enums import SplitType
+from .models import ExpenseSplit, User
+from .replicas import read_from_replica
+from .splitting import from_cents
+
+# Analytics over every ExpenseSplit, computed on NumPy column arrays.
+#
+# Splits are read with values_list in chunks of ANALYTICS_CHUNK_SIZE rows,
+# with the amounts already in integer cents and the split types as small
+# integer codes, so no model instance or Decimal is created per row. The
+# result is one int64 array of shape (len(COLUMNS), splits), one contiguous
+# row per column. Net positions and per split type aggregates are computed
+# with bincount and masks over whole columns.
+#
+# The array can be kept as an .npy snapshot at ANALYTICS_SNAPSHOT_PATH and is
+# then memory-mapped instead of read from the database until it is
+# ANALYTICS_SNAPSHOT_MAX_AGE seconds old. A snapshot is a point-in-time view:
+# expenses created since it was written are not in it.
+#
+# The report is served to staff at /admin/analytics/.
+
+COLUMNS = ('expense', 'user', 'payer', 'cents', 'split_type')
+EXPENSE, USER, PAYER, CENTS, SPLIT_TYPE = range(len(COLUMNS))
+SPLIT_TYPES = [split_type.value for split_type in SplitType]
+PERCENTILES = (50, 90, 99)
+
+
+def splits_values():
+    # One tuple of ints per split, in COLUMNS order
+    return (
+        ExpenseSplit.objects.order_by('id')
+        .annotate(
+            payer=F('expense__user'),
+            cents=Cast(Round(F('amount_owed') * 100), BigIntegerField()),
+            split_type_code=Case(
+                *[When(split_type=name, then=Value(code)) for code, name in enumerate(SPLIT_TYPES)],
+                default=Value(len(SPLIT_TYPES)),  # unknown types are counted apart
+            ),
+        )
+        .values_list('expense', 'user', 'payer', 'cents', 'split_type_code')
+    )
+
+
+def load_columns(chunk_size=None):
+    # Read every split from the database into a (len(COLUMNS), n) int64 array
+    chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+    rows = splits_values().iterator(chunk_size=chunk_size)
+    chunks = []
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        chunks.append(np.array(chunk, dtype=np.int64).T)
+    if not chunks:
+        return np.empty((len(COLUMNS), 0), dtype=np.int64)
+    return np.ascontiguousarray(np.concatenate(chunks, axis=1))
+
+
+def write_snapshot(columns, path):
+    # Written under a temporary name and renamed, so readers never map a
+    # partial file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.part')
+    try:
+        with open(partial, 'wb') as f:
+            np.save(f, columns)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def load_snapshot(path, max_age):
+    # The memory-mapped snapshot, or None if it is missing or too old
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    if age > max_age:
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def split_columns(refresh=False):
+    # (columns, source): the snapshot if there is a fresh one, otherwise the
+    # database, writing a new snapshot when one is configured
+    path = settings.ANALYTICS_SNAPSHOT_PATH
+    if path and not refresh:
+        columns = load_snapshot(path, settings.ANALYTICS_SNAPSHOT_MAX_AGE)
+        if columns is not None:
+            return columns, 'snapshot'
+    columns = load_columns()
+    if path:
+        write_snapshot(columns, path)
+    return columns, 'database'
+
+
+def net_positions(columns):
+    # int64 array indexed by user id: cents owed to the user minus cents the
+    # user owes, over splits between different users. bincount sums in
+    # float64, which is exact while every partial sum stays below 2**53
+    # cents.
+    user, payer, cents = columns[USER], columns[PAYER], columns[CENTS]
+    shared = user != payer
+    size = int(max(user.max(initial=0), payer.max(initial=0))) + 1
+    owed_to = np.bincount(payer[shared], weights=cents[shared], minlength=size)
+    owed_by = np.bincount(user[shared], weights=cents[shared], minlength=size)
+    return np.rint(owed_to - owed_by).astype(np.int64)
+
+
+def top_users(net, count, creditors=True):
+    # Ids of the `count` largest creditors (or debtors), largest amount
+    # first, then by user id
+    signed = net if creditors else -net
+    candidates = np.flatnonzero(signed > 0)
+    order = np.lexsort((candidates, -signed[candidates]))
+    return candidates[order][:count]
+
+
+def split_type_summary(columns):
+    # {split_type: {count, total, share, mean, p50, p90, p99}}
+    codes, cents = columns[SPLIT_TYPE], columns[CENTS]
+    counts = np.bincount(codes, minlength=len(SPLIT_TYPES))
+    totals = np.bincount(codes, weights=cents, minlength=len(SPLIT_TYPES))
+    grand_total = totals.sum()
+    summary = {}
+    for code, name in enumerate(SPLIT_TYPES):
+        if not counts[code]:
+            continue
+        values = cents[codes == code]
+        percentiles = np.percentile(values, PERCENTILES)
+        summary[name] = {
+            'count': int(counts[code]),
+            'total': from_cents(int(round(totals[code]))),
+            'share': round(float(totals[code] / grand_total), 4) if grand_total else 0.0,
+            'mean': from_cents(int(round(totals[code] / counts[code]))),
+            **{f'p{p}': from_cents(int(round(value))) for p, value in zip(PERCENTILES, percentiles)},
+        }
+    return summary
+
+
+def report(columns, top=10):
+    # The analytics response for a split column array
+    net = net_positions(columns)
+    creditors = top_users(net, top, creditors=True)
+    debtors = top_users(net, top, creditors=False)
+    names = dict(User.objects.filter(pk__in=[*creditors.tolist(), *debtors.tolist()]).values_list('id', 'name'))
+
+    def entries(user_ids):
+        return [{'user': user_id, 'name': names.get(user_id), 'amount': from_cents(abs(int(net[user_id])))}
+                for user_id in user_ids.tolist()]
+
+    expenses = columns[EXPENSE]
+    return {
+        'splits': int(expenses.size),
+        'expenses': int(np.unique(expenses).size),
+        'total': from_cents(int(columns[CENTS].sum())),
+        'outstanding': from_cents(int(net[net > 0].sum())),
+        'users_with_balance': int(np.count_nonzero(net)),
+        'top_creditors': entries(creditors),
+        'top_debtors': entries(debtors),
+        'split_types': split_type_summary(columns),
+    }
+
+
+@require_GET
+@read_from_replica(per_user=False)
+def analytics_view(request):
+    # Staff only (wrapped in admin_view in expense_api/urls.py). ?top=<n>
+    # sets the length of the creditor and debtor lists; ?refresh=1 reads the
+    # database even if the snapshot is fresh.
+    start = time.perf_counter()
+    try:
+        top = min(int(request.GET.get('top', settings.ANALYTICS_TOP_USERS)), 100)
+    except ValueError:
+        top = settings.ANALYTICS_TOP_USERS
+    columns, source = split_columns(refresh=request.GET.get('refresh', '').lower() in ('1', 'true', 'yes'))
+    data = report(columns, max(top, 0))
+    data['source'] = source
+    data['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return JsonResponse(data, encoder=DjangoJSONEncoder)
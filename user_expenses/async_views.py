@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import replicas, response_cache
+from .authentication import JWTAuthentication
+from .coalescing import CACHE_RESULT_TTL
+from .metrics import registry
+from .queries import owes_to_queryset, owed_from_queryset, user_splits_queryset
+from .throttling import rate_limit
+from .user_cache import user_cache
+from .views import OverallExpensesView, balance_data, user_expense_rows
+
+# Async variants of the read endpoints, for deployments served over ASGI
+# (uvicorn expense_api.asgi:application). Responses match the DRF views,
+# encoded with DRF's JSON encoder.
+#
+# Under ASGI, sync views and Django's async ORM both run every query on one
+# shared thread, so concurrent requests queue behind each other's round trips
+# to the database. These views run each query on a pool of worker threads
+# instead, each holding its own connection: requests overlap their database
+# waits, and independent queries within a request run side by side. The pool
+# size (ASYNC_DB_WORKERS) caps the connections a process opens this way.
+#
+# Each view gets what its DRF counterpart has (see serve_read): the same rate
+# limit, response cache, request coalescing and replica routing, with the
+# same settings. Waiting for a coalesced result happens on the event loop.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def db_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.ASYNC_DB_WORKERS, thread_name_prefix='async-db')
+    return _executor
+
+
+async def run_query(func, *args):
+    # Await func(*args) on a database worker thread. Connections are reused
+    # or closed per CONN_MAX_AGE, as the request cycle does for sync views.
+    def run():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return await sync_to_async(run, thread_sensitive=False, executor=db_executor())()
+
+
+async def authenticate(request):
+    # The same checks as JWTAuthentication; a cached user costs no thread hop
+    authenticator = JWTAuthentication()
+    payload = authenticator.decode(request)
+    if payload is None:
+        raise exceptions.NotAuthenticated()
+    user = user_cache.cached(payload['user_id'])
+    if user is None:
+        user = await run_query(user_cache.get, payload['user_id'])
+    if user is None:
+        raise exceptions.AuthenticationFailed('User not found')
+    return user
+
+
+async def run_blocking(func, *args):
+    # Await func(*args), e.g. cache lookups, on a database worker thread
+    return await sync_to_async(func, thread_sensitive=False, executor=db_executor())(*args)
+
+
+class AsyncFlights:
+    # LocalFlights (coalescing.py) for coroutines: waiters await the first
+    # request's future instead of blocking a thread. Futures belong to one
+    # event loop, so flights are kept per loop.
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, compute):
+        # await compute() if no flight for key is in progress, else the
+        # running flight's result; None if it failed or took too long
+        key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(key)
+        if flight is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), settings.COALESCE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        result = None
+        try:
+            result = await compute()
+            return result
+        finally:
+            del self._flights[key]
+            flight.set_result(result)
+
+
+local_flights = AsyncFlights()
+
+
+async def cache_flights_run(alias, key, compute):
+    # CacheFlights (coalescing.py) with Django's async cache API, polling
+    # with asyncio.sleep
+    cache = caches[alias]
+    flight_key, result_key = f'{key}:flight', f'{key}:result'
+    if await cache.aadd(flight_key, 1, settings.COALESCE_TIMEOUT):
+        try:
+            result = await compute()
+            await cache.aset(result_key, result, CACHE_RESULT_TTL)
+            return result
+        finally:
+            await cache.adelete(flight_key)
+
+    deadline = time.monotonic() + settings.COALESCE_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.COALESCE_POLL_INTERVAL)
+        result = await cache.aget(result_key)
+        if result is not None or not await cache.ahas_key(flight_key):
+            return result
+    return None
+
+
+def prepare_read(request, view_name, scope, rate_scope):
+    # What the DRF view's decorators do before its queries, in one trip to a
+    # worker thread: the rate limit (raises Throttled), the response cache
+    # lookup and the database to read from. Returns (versions, cached data
+    # or None, alias).
+    if rate_scope is not None:
+        throttle = rate_limit(rate_scope)()
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+    versions = response_cache.current_versions([response_cache.EPOCH_SCOPE, scope])
+    data = None
+    if settings.RESPONSE_CACHE_ENABLED:
+        key = response_cache.response_key(view_name, request, scope, versions)
+        data = response_cache.get_cache().get(key)
+        registry.increment('response_cache_hits_total' if data is not None else 'response_cache_misses_total',
+                           view_name)
+    return versions, data, replicas.replica_for([scope])
+
+
+def store_read(view_name, request, scope, versions, data):
+    key = response_cache.response_key(view_name, request, scope, versions)
+    response_cache.get_cache().set(key, data, settings.RESPONSE_CACHE_TTL)
+
+
+async def serve_read(request, view_name, load, user=None, rate_scope=None):
+    # The response data of a read view: load() awaited on the chosen
+    # database, unless the response cache or a concurrent identical request
+    # has it. request is a DRF Request; views with a user are cached and
+    # coalesced per user, the others share the overall scope.
+    if user is not None:
+        request.user = user
+    scope = response_cache.user_scope(user.id) if user is not None else response_cache.OVERALL_SCOPE
+    versions, data, alias = await run_blocking(prepare_read, request, view_name, scope, rate_scope)
+    if data is not None:
+        return data
+
+    own = None
+
+    async def compute():
+        nonlocal own
+        with replicas.reading_from(alias):
+            own = await load()
+        return own
+
+    if settings.COALESCE_REQUESTS:
+        key = response_cache.response_key(f'coalesce:{view_name}', request, scope, versions)
+        if settings.COALESCE_CACHE_ALIAS is None:
+            shared = await local_flights.run(key, compute)
+        else:
+            shared = await cache_flights_run(settings.COALESCE_CACHE_ALIAS, key, compute)
+        if own is None and shared is not None:
+            registry.increment('coalesced_requests_total', view_name)
+        data = own if own is not None else shared
+    if data is None:
+        data = await compute()
+    if settings.RESPONSE_CACHE_ENABLED:
+        await run_blocking(store_read, view_name, request, scope, versions, data)
+    return data
+
+
+def api_errors(view):
+    # Render API exceptions the way DRF's exception handler does
+    @functools.wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = JsonResponse(data, status=exc.status_code, safe=False, encoder=JSONEncoder)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response['WWW-Authenticate'] = JWTAuthentication.keyword
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+    return wrapped
+
+
+@require_GET
+@api_errors
+async def user_balance_view(request):
+    user = await authenticate(request)
+
+    async def load():
+        # The two directions are independent queries; run them concurrently
+        owes_to, owed_from = await asyncio.gather(
+            run_query(list, owes_to_queryset(user.id)),
+            run_query(list, owed_from_queryset(user.id)),
+        )
+        return balance_data(owes_to, owed_from)
+
+    data = await serve_read(Request(request), 'async-balance', load, user=user, rate_scope='balance')
+    return JsonResponse(data, encoder=JSONEncoder)
+
+
+@require_GET
+@api_errors
+async def user_expenses(request):
+    user = await authenticate(request)
+
+    async def load():
+        return user_expense_rows(await run_query(list, user_splits_queryset(user.id)))
+
+    data = await serve_read(Request(request), 'async-user-expenses', load, user=user)
+    return JsonResponse(data, safe=False, encoder=JSONEncoder)
+
+
+def overall_expenses_page(view):
+    # The page and splits queries and serialization, as for the DRF view
+    return view.list(view.request).data
+
+
+@require_GET
+@api_errors
+async def overall_expenses(request):
+    request = Request(request)
+    view = OverallExpensesView(request=request, format_kwarg=None, args=(), kwargs={})
+
+    async def load():
+        return await run_query(overall_expenses_page, view)
+
+    return JsonResponse(await serve_read(request, 'async-overall-expenses', load), encoder=JSONEncoder)
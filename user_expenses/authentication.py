@@ -0,0 +1,44 @@
+import jwt
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+
+from .user_cache import user_cache
+
+
+class JWTAuthentication(BaseAuthentication):
+    # Authenticates `Authorization: Bearer <token>` headers issued by
+    # generate_jwt_token. The token is verified locally and the user is
+    # resolved through the per-process user cache, so warm requests cost no
+    # database queries.
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        payload = self.decode(request)
+        if payload is None:
+            return None
+        user = user_cache.get(payload['user_id'])
+        if user is None:
+            raise exceptions.AuthenticationFailed('User not found')
+        return (user, payload)
+
+    def decode(self, request):
+        # The verified token payload, or None when no token was sent
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        token = header.replace(f'{self.keyword} ', '')
+        if not token:
+            return None
+
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            raise exceptions.AuthenticationFailed('Signature expired')
+        except jwt.InvalidTokenError:
+            raise exceptions.AuthenticationFailed('Invalid token')
+
+        if not isinstance(payload.get('user_id'), int):
+            raise exceptions.AuthenticationFailed('Invalid token')
+        return payload
+
+    def authenticate_header(self, request):
+        return self.keyword
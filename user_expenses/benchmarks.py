@@ -0,0 +1,230 @@
+import collections
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from . import ledger, response_cache, rollups, splitting, sync
+from .enums import SplitType
+from .models import Expense, ExpenseSplit, Group, GroupMembership, User
+
+# Helpers shared by the bench_* management commands.
+
+
+@contextlib.contextmanager
+def scratch_database(verbosity=0):
+    # Run a benchmark against a throwaway test database, created the same way
+    # `manage.py test` does, so the configured database is never touched.
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    # An in-memory SQLite test database survives destroy_test_db within the
+    # process, so make sure each scratch database starts out empty
+    call_command('flush', interactive=False, verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def time_calls(func, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(durations):
+    total = sum(durations)
+    return {
+        'count': len(durations),
+        'mean_ms': round(total / len(durations) * 1000, 3),
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'per_second': round(len(durations) / total, 1) if total else None,
+    }
+
+
+def weighted_choice(weights, rng):
+    # Pick a key of {value: weight} with probability proportional to weight
+    values = list(weights)
+    return rng.choices(values, weights=[weights[value] for value in values])[0]
+
+
+def random_parts(total, parts, rng):
+    # Split the integer `total` into `parts` positive integers summing to it
+    cuts = sorted(rng.sample(range(1, total), parts - 1)) if parts > 1 else []
+    bounds = [0] + cuts + [total]
+    return [high - low for low, high in zip(bounds, bounds[1:])]
+
+
+def random_split(split_type, size, rng):
+    # (expense amount, [(amount_owed, percentage)]) for one synthetic expense
+    # that passes ExpenseSerializer validation for its split type. Amounts are
+    # worked out in cents.
+    if split_type == SplitType.EQUAL:
+        share = rng.randint(100, 10000)
+        return Decimal(share * size).scaleb(-2), [(Decimal(share).scaleb(-2), None)] * size
+
+    total = rng.randint(size * 100, size * 10000)
+    if split_type == SplitType.EXACT:
+        return Decimal(total).scaleb(-2), [(Decimal(part).scaleb(-2), None) for part in random_parts(total, size, rng)]
+
+    # Percentages in hundredths of a percent, summing to exactly 100%
+    percentages = random_parts(splitting.FULL_PERCENTAGE, size, rng)
+    owed = splitting.percentage_shares(total, percentages)
+    return Decimal(total).scaleb(-2), [
+        (Decimal(amount).scaleb(-2), Decimal(percentage).scaleb(-2))
+        for amount, percentage in zip(owed, percentages)
+    ]
+
+
+def seed_dataset(users, expenses, rng, split_sizes=None, split_types=None, days=0, prefix='user', batch_size=2000,
+                 groups=0):
+    # Bulk-insert a synthetic dataset of `users` users and `expenses` expenses,
+    # each paid by a random user and split between random participants.
+    #
+    # split_sizes ({participants: weight}) and split_types ({SplitType:
+    # weight}) give the distributions to draw from; by default every expense
+    # is split equally between 5 users. With days > 0, expenses are spread
+    # uniformly over that many past days. With groups > 0, users are dealt
+    # into that many groups and every expense is kept within a random group.
+    # Users are named `<prefix><n>`. Returns the created users.
+    split_sizes = split_sizes or {5: 1}
+    split_types = split_types or {SplitType.EQUAL: 1}
+
+    created_users = User.objects.bulk_create(
+        [
+            User(name=f'{prefix}{i}', email=f'{prefix}{i}@example.com', mobile_number='0000000000', password='!')
+            for i in range(users)
+        ],
+        batch_size=batch_size,
+    )
+    user_ids = [user.id for user in created_users]
+    now = timezone.now()
+
+    # [(group_id, member ids)]; one pool of everyone without groups
+    pools = [(None, user_ids)]
+    if groups:
+        created_groups = Group.objects.bulk_create(
+            [Group(name=f'{prefix}-group{i}') for i in range(min(groups, len(user_ids)))], batch_size=batch_size
+        )
+        pools = [(group.id, user_ids[i::len(created_groups)]) for i, group in enumerate(created_groups)]
+        GroupMembership.objects.bulk_create(
+            [GroupMembership(group_id=group_id, user_id=user_id) for group_id, members in pools for user_id in members],
+            batch_size=batch_size,
+        )
+
+    for start in range(0, expenses, batch_size):
+        created = []
+        for i in range(start, min(start + batch_size, expenses)):
+            split_type = weighted_choice(split_types, rng)
+            group_id, members = rng.choice(pools) if groups else pools[0]
+            size = min(weighted_choice(split_sizes, rng), len(members))
+            amount, shares = random_split(split_type, size, rng)
+            expense = Expense(user_id=rng.choice(members), group_id=group_id, amount=amount, description=f'Expense {i}')
+            created.append((expense, [
+                ExpenseSplit(expense=expense, user_id=user_id, amount_owed=owed,
+                             split_type=split_type.value, percentage=percentage)
+                for user_id, (owed, percentage) in zip(rng.sample(members, size), shares)
+            ]))
+        batch = [expense for expense, _ in created]
+        splits = [split for _, expense_splits in created for split in expense_splits]
+
+        # Only this batch goes into the ledger, rollups and sync feed, so
+        # seeding next to existing data leaves its rows and sync numbers alone
+        with transaction.atomic():
+            Expense.objects.bulk_create(batch)
+            ExpenseSplit.objects.bulk_create(splits, batch_size=batch_size)
+            if days:
+                # created_at is auto_now_add, so backdate the batch afterwards
+                for expense in batch:
+                    expense.created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+                Expense.objects.filter(id__in=[expense.id for expense in batch]).update(created_at=Case(
+                    *[When(id=expense.id, then=Value(expense.created_at)) for expense in batch],
+                    output_field=DateTimeField(),
+                ))
+            ledger.record_expense_splits(splits)
+            rollups.record_expenses(created)
+            sync.record_expenses(created)
+
+    response_cache.invalidate_users(user_ids, [group_id for group_id, _ in pools if group_id is not None])
+    return created_users
+
+
+# Boots the WSGI application the way a worker does and serves it one request
+# (unauthenticated, so no database is involved), then prints its timings and
+# which of HEAVY_MODULES got imported as JSON
+BOOT_SCRIPT = '''
+import io, json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+setup = time.perf_counter()
+statuses = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/balance/', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+    'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+}
+response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+b''.join(response)
+response.close()
+done = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - start) * 1000,
+    'first_request_ms': (done - setup) * 1000,
+    'status': int(statuses[0].split()[0]),
+    'modules': [name for name in sys.argv[1:] if name in sys.modules],
+}))
+'''
+# Modules a lean worker should not import. (django.contrib.admin is not one:
+# rest_framework.renderers imports it for AdminRenderer whatever the settings.)
+HEAVY_MODULES = ('django.contrib.sessions', 'django.contrib.auth.models', 'drf_yasg.views', 'drf_yasg.generators',
+                 'numpy')
+
+
+def boot_worker(settings_module, importtime=False, env=None):
+    # Run BOOT_SCRIPT in a fresh interpreter; returns its JSON result plus the
+    # wall time including interpreter startup, and its stderr
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', BOOT_SCRIPT, *HEAVY_MODULES]
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module, **(env or {})}
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+    wall = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(f'{settings_module} failed to boot:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.splitlines()[-1])
+    result['wall_ms'] = wall * 1000
+    return result, completed.stderr
+
+
+def import_breakdown(importtime_output):
+    # {top-level package: ms} of import time from `-X importtime` output,
+    # counting each module's self time so nested imports are not counted twice
+    totals = collections.Counter()
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line.split(':', 1)[1].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1000
+    return totals
@@ -0,0 +1,142 @@
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from . import response_cache
+from .metrics import registry
+
+# Single-flight coalescing of identical GET requests.
+#
+# Concurrent requests for the same URL from the same user (or for the same
+# shared data) share one computation: the first runs the view, the others
+# wait for it and get a copy of its response. Keys carry the response
+# cache's version counters, so a request that starts after an expense write
+# never waits for one that read the data before it.
+#
+# Flights are tracked in this process unless COALESCE_CACHE_ALIAS names a
+# Django cache shared by all workers; there the first request claims the key
+# with cache.add() and the others poll for the result every
+# COALESCE_POLL_INTERVAL seconds. Waiters give up after COALESCE_TIMEOUT
+# seconds, and when the first request fails or streams its response, and run
+# the view themselves.
+
+# How long a shared-cache result stays readable for waiters still polling
+CACHE_RESULT_TTL = 5
+
+
+def freeze(response):
+    # A picklable copy of a response, or None if it cannot be shared
+    if isinstance(response, Response):
+        return ('drf', response.data, response.status_code)
+    if isinstance(response, HttpResponse):
+        return ('http', response.content, response.status_code, list(response.items()))
+    return None
+
+
+def thaw(frozen):
+    if frozen[0] == 'drf':
+        return Response(frozen[1], status=frozen[2])
+    _, content, status, headers = frozen
+    return HttpResponse(content, status=status, headers=dict(headers))
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class LocalFlights:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, compute):
+        # compute() if no flight for key is in progress, else wait for that
+        # flight's result; None if it failed or took too long
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait(settings.COALESCE_TIMEOUT)
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class CacheFlights:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def run(self, key, compute):
+        cache = caches[self.alias]
+        flight_key, result_key = f'{key}:flight', f'{key}:result'
+        if cache.add(flight_key, 1, settings.COALESCE_TIMEOUT):
+            try:
+                result = compute()
+                if result is not None:
+                    cache.set(result_key, result, CACHE_RESULT_TTL)
+                return result
+            finally:
+                cache.delete(flight_key)
+
+        deadline = time.monotonic() + settings.COALESCE_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(settings.COALESCE_POLL_INTERVAL)
+            result = cache.get(result_key)
+            if result is not None or flight_key not in cache:
+                return result or cache.get(result_key)
+        return None
+
+
+local_flights = LocalFlights()
+
+
+def flights():
+    alias = settings.COALESCE_CACHE_ALIAS
+    return local_flights if alias is None else CacheFlights(alias)
+
+
+def coalesced(view_name, per_user=True, scope=None):
+    # Share one computation between concurrent identical GET requests to a
+    # DRF view; the scope is picked as in cached_response (see request_scope).
+    # Apply it below api_view, so every request is authenticated and
+    # throttled on its own.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not settings.COALESCE_REQUESTS or request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            view_scope = response_cache.request_scope(request, args, kwargs, per_user, scope)
+            versions = response_cache.current_versions([response_cache.EPOCH_SCOPE, view_scope])
+            key = response_cache.response_key(f'coalesce:{view_name}', request, view_scope, versions)
+            own = None
+
+            def compute():
+                nonlocal own
+                own = view(request, *args, **kwargs)
+                return freeze(own)
+
+            shared = flights().run(key, compute)
+            if own is not None:
+                return own
+            if shared is None:
+                return view(request, *args, **kwargs)
+            registry.increment('coalesced_requests_total', view_name)
+            return thaw(shared)
+        return wrapped
+    return decorator
@@ -0,0 +1,61 @@
+import csv
+
+from .filters import created_between
+from .models import ExpenseSplit
+
+# CSV balance sheet generation shared by the buffered and streaming download
+# paths. Rows are produced lazily so a streaming response only ever holds one
+# chunk of splits in memory.
+
+BALANCE_SHEET_HEADER = ['Expense', 'Amount Owed', 'Split Type', 'Percentage', 'Date', 'Owed To/From']
+
+
+class Echo:
+    # File-like object whose write() hands the formatted line straight back,
+    # letting csv.writer act as a line formatter for a generator.
+    def write(self, value):
+        return value
+
+
+def balance_sheet_queryset(user_id, start_date=None, end_date=None):
+    # Join the expense and both users up front instead of loading them per row
+    return (
+        ExpenseSplit.objects.filter(user=user_id)
+        .filter(created_between(start_date, end_date, field='expense__created_at'))
+        .select_related('expense__user', 'user')
+    )
+
+
+def balance_sheet_rows(user_id, splits):
+    yield BALANCE_SHEET_HEADER
+    for split in splits:
+        if split.expense.user_id == user_id:
+            owed_to_from = f'owed from {split.user.name}'
+        else:
+            owed_to_from = f'owed to {split.expense.user.name}'
+        yield [
+            split.expense.description,
+            split.amount_owed,
+            split.split_type,
+            split.percentage if split.split_type == 'percentage' else 'N/A',
+            split.expense.created_at,
+            owed_to_from
+        ]
+
+
+def stream_csv(rows, buffer_size=64 * 1024):
+    # Yield CSV text in blocks of roughly buffer_size characters rather than
+    # one tiny chunk per row.
+    writer = csv.writer(Echo())
+    buffer = []
+    buffered = 0
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= buffer_size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
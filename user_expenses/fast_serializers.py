@@ -0,0 +1,109 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ExpenseSplit
+from .serializers import ExpenseSerializer, ExpenseSplitSerializer
+
+# Expense serialization for hot paths, without DRF's field machinery.
+#
+# ExpenseSerializer resolves and calls a Field object for every value of
+# every expense and split; on listing pages that per-field overhead is most
+# of the CPU time. These functions build the same dicts straight from
+# values() rows: decimals as 2-place strings, datetimes in ISO 8601 in the
+# current time zone with 'Z' for UTC, related users and groups as ids. Tests
+# hold the output to ExpenseSerializer's.
+
+EXPENSE_FIELDS = ExpenseSerializer.Meta.fields
+SPLIT_FIELDS = ExpenseSplitSerializer.Meta.fields
+CENT = Decimal('0.01')
+
+
+def format_decimal(value):
+    return format(value.quantize(CENT), 'f')
+
+
+def format_datetime(value):
+    if settings.USE_TZ:
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+# Formatter per field; None passes the value through. Nulls are never formatted.
+FORMATTERS = {
+    'id': None,
+    'user': None,
+    'amount': format_decimal,
+    'description': None,
+    'created_at': format_datetime,
+    'group': None,
+    'amount_owed': format_decimal,
+    'split_type': None,
+    'percentage': format_decimal,
+}
+
+
+def format_row(row, fields):
+    data = {}
+    for name in fields:
+        value = row[name]
+        formatter = FORMATTERS[name]
+        data[name] = value if formatter is None or value is None else formatter(value)
+    return data
+
+
+def split_rows(expense_ids):
+    # {expense_id: [split dict]} for the given expenses, in one query
+    splits = defaultdict(list)
+    rows = (
+        ExpenseSplit.objects.filter(expense__in=expense_ids)
+        .order_by('id')
+        .values('expense', *SPLIT_FIELDS)
+    )
+    for row in rows:
+        splits[row['expense']].append(format_row(row, SPLIT_FIELDS))
+    return splits
+
+
+def expense_rows(rows, fields=EXPENSE_FIELDS):
+    # Serialize values() rows of Expense holding the requested columns, plus
+    # 'id' when splits are requested. Keys follow ExpenseSerializer's field
+    # order, in which splits comes last.
+    fields = [name for name in EXPENSE_FIELDS if name in fields]
+    columns = [name for name in fields if name != 'splits']
+    splits = split_rows([row['id'] for row in rows]) if 'splits' in fields else None
+
+    data = []
+    for row in rows:
+        item = format_row(row, columns)
+        if splits is not None:
+            item['splits'] = splits.get(row['id'], [])
+        data.append(item)
+    return data
+
+
+def expense_data(expense, splits_data):
+    # Serialize a just-created expense and its validated split data without
+    # reading the splits back
+    row = {
+        'id': expense.id,
+        'user': expense.user_id,
+        'amount': expense.amount,
+        'description': expense.description,
+        'created_at': expense.created_at,
+        'group': expense.group_id,
+    }
+    data = format_row(row, [name for name in EXPENSE_FIELDS if name != 'splits'])
+    data['splits'] = [
+        format_row({
+            'user': split['user'].id,
+            'amount_owed': split['amount_owed'],
+            'split_type': split['split_type'],
+            'percentage': split.get('percentage'),
+        }, SPLIT_FIELDS)
+        for split in splits_data
+    ]
+    return data
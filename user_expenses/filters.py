@@ -0,0 +1,19 @@
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def created_between(start_date=None, end_date=None, field='created_at'):
+    # Q for an inclusive date range on a datetime column. The bounds are
+    # turned into datetimes (start of start_date, start of the day after
+    # end_date) so the filter can use an index on the raw column, unlike a
+    # __date lookup.
+    condition = Q()
+    if start_date:
+        start = datetime.datetime.combine(start_date, datetime.time.min)
+        condition &= Q(**{f'{field}__gte': timezone.make_aware(start)})
+    if end_date:
+        end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+        condition &= Q(**{f'{field}__lt': timezone.make_aware(end)})
+    return condition
@@ -0,0 +1,116 @@
+import functools
+import hashlib
+from datetime import timedelta
+
+import orjson
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import registry
+from .models import IdempotencyKey
+
+# Idempotency-Key support for write endpoints.
+#
+# A client that may retry a write sends the same Idempotency-Key header with
+# every attempt. The first attempt to succeed stores its response under
+# (user, key) for IDEMPOTENCY_KEY_TTL seconds, and later attempts get that
+# response back (with Idempotent-Replayed: true) instead of writing again.
+# A replay is a single indexed read: the request is neither validated nor
+# written. Reusing a key for a different request is rejected with 422.
+#
+# The key row is inserted before the view runs, in the same transaction as
+# its write. A concurrent attempt with the same key blocks on that row's
+# unique index entry until the first commits, then reads its stored
+# response; if the first fails, nothing was committed and the next attempt
+# runs the view. Only 2xx responses are kept, so a failed attempt can be
+# retried with its key.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+encoder = JSONEncoder()
+
+
+def request_hash(request):
+    # Read before the view parses the body
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def replay(record, digest, view_name):
+    if record.request_hash != digest:
+        return Response({'error': f'{HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    registry.increment('idempotent_replays_total', view_name)
+    response = Response(orjson.loads(record.response), status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def find_key(user_id, key, now):
+    # The unexpired record for a key, if its request has committed
+    return IdempotencyKey.objects.filter(user=user_id, key=key, expires_at__gt=now).first()
+
+
+def idempotent(view_name):
+    # Apply to a DRF function view below api_view, so requests are
+    # authenticated first and keys are per user
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view(request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            user_id = request.user.id
+            digest = request_hash(request)
+            now = timezone.now()
+            record = find_key(user_id, key, now)
+            if record is not None:
+                return replay(record, digest, view_name)
+
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            user_id=user_id, key=key, request_hash=digest, status_code=0, response='',
+                            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                        )
+                except IntegrityError:
+                    # Inserted by an attempt that has committed since
+                    record = IdempotencyKey.objects.select_for_update().get(user=user_id, key=key)
+                    if record.expires_at > now:
+                        return replay(record, digest, view_name)
+                    # Expired but not purged yet: the key is free again
+                    record.request_hash = digest
+                    record.created_at = now
+                    record.expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+                response = view(request, *args, **kwargs)
+                if not isinstance(response, Response) or not status.is_success(response.status_code):
+                    transaction.set_rollback(True)
+                    return response
+                record.status_code = response.status_code
+                record.response = orjson.dumps(response.data, default=encoder.default).decode()
+                record.save()
+            return response
+        return wrapped
+    return decorator
+
+
+def purge_expired_keys(batch_size=10000):
+    # Delete expired keys in batches, so no single statement locks or logs
+    # the whole table; returns how many were deleted
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+    purged = 0
+    while batch := list(expired.values_list('pk', flat=True)[:batch_size]):
+        purged += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+    return purged
@@ -0,0 +1,173 @@
+import csv
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import replicas, response_cache
+from .exports import balance_sheet_queryset, balance_sheet_rows
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Background exports, with the job table as the queue.
+#
+# Creating a job stores an ExportJob row and, once that commits, hands its id
+# to a pool of EXPORT_WORKERS threads in this process, which bounds how many
+# exports run at once; jobs beyond that wait in the pool's queue. A worker
+# claims the job by moving it from pending to running in one UPDATE, writes
+# the file under EXPORT_ROOT (to a temporary name, renamed when complete) and
+# records the outcome on the row. Clients poll the row and download the file
+# until it expires after EXPORT_TTL seconds.
+#
+# No broker is involved, so queued jobs live only in the process that created
+# them: fail_stale_jobs (run by purge_exports) fails jobs a restart left
+# pending or running, and clients can start them again.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class TooManyJobs(Exception):
+    pass
+
+
+def job_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.EXPORT_WORKERS, thread_name_prefix='export')
+    return _executor
+
+
+def export_root():
+    return Path(settings.EXPORT_ROOT)
+
+
+def export_path(job):
+    return export_root() / job.file_name
+
+
+def start_job(user, kind, params):
+    # Create a job and queue it after the surrounding transaction commits.
+    # Raises TooManyJobs when the user already has EXPORT_MAX_ACTIVE_PER_USER
+    # jobs pending or running.
+    active = ExportJob.objects.filter(user=user, status__in=ExportJob.ACTIVE_STATUSES).count()
+    if active >= settings.EXPORT_MAX_ACTIVE_PER_USER:
+        raise TooManyJobs(f'{active} exports are already in progress.')
+    job = ExportJob.objects.create(user=user, kind=kind, params=params)
+    transaction.on_commit(lambda: job_executor().submit(run_job, job.id))
+    return job
+
+
+def claim_job(job_id):
+    # Move a pending job to running; False if another worker claimed it or
+    # fail_stale_jobs failed it first
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.PENDING).update(
+        status=ExportJob.RUNNING, started_at=timezone.now()
+    )
+    return claimed == 1
+
+
+def run_job(job_id):
+    # Worker entry point: run one job and record its outcome
+    close_old_connections()
+    try:
+        if not claim_job(job_id):
+            return
+        job = ExportJob.objects.get(pk=job_id)
+        try:
+            job.row_count = WRITERS[job.kind](job)
+        except Exception as e:
+            logger.exception('Export %s failed', job_id)
+            finish_job(job, ExportJob.FAILED, error=str(e) or e.__class__.__name__)
+        else:
+            finish_job(job, ExportJob.SUCCEEDED)
+    finally:
+        close_old_connections()
+
+
+def finish_job(job, status, error=''):
+    # Record the outcome unless fail_stale_jobs gave up on the job meanwhile
+    now = timezone.now()
+    if status == ExportJob.FAILED:
+        delete_file(job)
+        job.file_name = ''
+    finished = ExportJob.objects.filter(pk=job.pk, status=ExportJob.RUNNING).update(
+        status=status, error=error, file_name=job.file_name, row_count=job.row_count,
+        finished_at=now, expires_at=now + timedelta(seconds=settings.EXPORT_TTL),
+    )
+    if not finished:
+        delete_file(job)
+
+
+def write_balance_sheet(job):
+    # Write the job's balance sheet CSV and return the number of data rows,
+    # read from a replica like the download view
+    with replicas.reading_from(replicas.replica_for([response_cache.user_scope(job.user_id)])):
+        return write_balance_sheet_file(job)
+
+
+def write_balance_sheet_file(job):
+    start_date = job.params.get('start_date')
+    end_date = job.params.get('end_date')
+    splits = balance_sheet_queryset(
+        job.user_id,
+        date.fromisoformat(start_date) if start_date else None,
+        date.fromisoformat(end_date) if end_date else None,
+    )
+    rows = balance_sheet_rows(job.user_id, splits.iterator(chunk_size=settings.BALANCE_SHEET_CHUNK_SIZE))
+
+    job.file_name = f'{job.id}.csv'
+    path = export_path(job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.part')
+    count = 0
+    try:
+        with open(partial, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(next(rows))  # header
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return count
+
+
+# Writer per ExportJob.kind
+WRITERS = {
+    ExportJob.BALANCE_SHEET: write_balance_sheet,
+}
+
+
+def delete_file(job):
+    if job.file_name:
+        export_path(job).unlink(missing_ok=True)
+
+
+def fail_stale_jobs(older_than):
+    # Fail jobs that have been pending or running for longer than older_than
+    # seconds, e.g. because the process that queued them exited
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=older_than)
+    return ExportJob.objects.filter(status__in=ExportJob.ACTIVE_STATUSES, created_at__lt=cutoff).update(
+        status=ExportJob.FAILED, error='The export did not finish in time.', finished_at=now,
+        expires_at=now + timedelta(seconds=settings.EXPORT_TTL),
+    )
+
+
+def purge_expired_jobs(now=None):
+    # Delete expired jobs and their files; returns the number of jobs deleted
+    expired = list(ExportJob.objects.filter(expires_at__lte=now or timezone.now()))
+    for job in expired:
+        delete_file(job)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from . import response_cache
+from .models import ExpenseSplit, GroupBalance, PairBalance
+from .upserts import increment_rows
+
+# Pairwise balance ledger.
+#
+# PairBalance holds one row per (debtor, creditor) with the total the debtor
+# owes across every split, i.e. what user_balance_view used to aggregate from
+# ExpenseSplit on each request. Rows are bumped in the same transaction that
+# writes the splits, and can be rebuilt from ExpenseSplit at any time.
+#
+# Splits of group expenses also go into GroupBalance, the same totals keyed
+# by (group, debtor, creditor), so a group's balances never read other
+# groups' rows. PairBalance keeps covering every expense.
+
+
+def split_deltas(splits):
+    # Collapse splits into {(debtor_id, creditor_id): amount}. A payer's own
+    # share of an expense is not a debt, so it is skipped.
+    deltas = defaultdict(Decimal)
+    for split in splits:
+        creditor_id = split.expense.user_id
+        if split.user_id != creditor_id:
+            deltas[(split.user_id, creditor_id)] += split.amount_owed
+    return deltas
+
+
+def group_split_deltas(splits):
+    # {(group_id, debtor_id, creditor_id): amount} for splits of group expenses
+    deltas = defaultdict(Decimal)
+    for split in splits:
+        group_id = split.expense.group_id
+        creditor_id = split.expense.user_id
+        if group_id is not None and split.user_id != creditor_id:
+            deltas[(group_id, split.user_id, creditor_id)] += split.amount_owed
+    return deltas
+
+
+def apply_deltas(deltas, model=PairBalance, key_fields=('debtor_id', 'creditor_id')):
+    # Add each delta to its balance row with a fixed two queries
+    increment_rows(model, key_fields, {key: {'amount': amount} for key, amount in deltas.items()})
+
+
+def record_expense_splits(splits):
+    apply_deltas(split_deltas(splits))
+    apply_deltas(group_split_deltas(splits), GroupBalance, ('group_id', 'debtor_id', 'creditor_id'))
+
+
+def split_totals():
+    # Every pairwise total aggregated straight from ExpenseSplit.
+    return (
+        ExpenseSplit.objects.exclude(user=F('expense__user'))
+        .values('user', 'expense__user')
+        .annotate(total=Sum('amount_owed'))
+    )
+
+
+def group_split_totals():
+    # Every per-group pairwise total aggregated straight from ExpenseSplit.
+    return (
+        ExpenseSplit.objects.filter(expense__group__isnull=False)
+        .exclude(user=F('expense__user'))
+        .values('expense__group', 'user', 'expense__user')
+        .annotate(total=Sum('amount_owed'))
+    )
+
+
+def expected_balances():
+    return {(row['user'], row['expense__user']): row['total'] for row in split_totals()}
+
+
+def expected_group_balances():
+    return {
+        (row['expense__group'], row['user'], row['expense__user']): row['total']
+        for row in group_split_totals()
+    }
+
+
+def current_balances():
+    rows = PairBalance.objects.values_list('debtor_id', 'creditor_id', 'amount')
+    return {(debtor, creditor): amount for debtor, creditor, amount in rows}
+
+
+def current_group_balances():
+    rows = GroupBalance.objects.values_list('group_id', 'debtor_id', 'creditor_id', 'amount')
+    return {row[:3]: row[3] for row in rows}
+
+
+def mismatched(current, expected):
+    # [(key..., stored, expected)] for every key where the two disagree. Zero
+    # rows and missing rows are treated as equal.
+    mismatches = []
+    for key in sorted(expected.keys() | current.keys()):
+        stored = current.get(key, Decimal(0))
+        actual = expected.get(key, Decimal(0))
+        if stored != actual:
+            mismatches.append((*key, stored, actual))
+    return mismatches
+
+
+def verify_balances():
+    # Return [(debtor_id, creditor_id, stored, expected)] for every pair where
+    # the ledger disagrees with ExpenseSplit.
+    return mismatched(current_balances(), expected_balances())
+
+
+def verify_group_balances():
+    # Return [(group_id, debtor_id, creditor_id, stored, expected)]
+    return mismatched(current_group_balances(), expected_group_balances())
+
+
+@transaction.atomic
+def rebuild_balances(batch_size=1000):
+    # Rebuild PairBalance and GroupBalance; returns the number of pair rows
+    PairBalance.objects.all().delete()
+    PairBalance.objects.bulk_create(
+        [
+            PairBalance(debtor_id=debtor, creditor_id=creditor, amount=amount)
+            for (debtor, creditor), amount in expected_balances().items()
+        ],
+        batch_size=batch_size,
+    )
+    GroupBalance.objects.all().delete()
+    GroupBalance.objects.bulk_create(
+        [
+            GroupBalance(group_id=group, debtor_id=debtor, creditor_id=creditor, amount=amount)
+            for (group, debtor, creditor), amount in expected_group_balances().items()
+        ],
+        batch_size=batch_size,
+    )
+    response_cache.invalidate_all()
+    return PairBalance.objects.count()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user_expenses import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MonthlyRollup table from ExpenseSplit, or verify it with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the rollups against ExpenseSplit without modifying them.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = rollups.verify_rollups()
+            for (user_id, month, split_type), stored, expected in mismatches:
+                self.stdout.write(f'user {user_id} {month:%Y-%m} {split_type}: rollup {stored}, splits {expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} monthly rollup(s) out of sync.')
+            self.stdout.write(self.style.SUCCESS('Monthly rollups are in sync.'))
+            return
+
+        count = rollups.rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly rollup(s).'))
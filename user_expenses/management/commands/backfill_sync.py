@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from user_expenses import sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the sync change feed (SyncChange, SyncSequence) from the expenses and their splits. '
+        'Sequence numbers start over, so clients must sync again from an empty token.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = sync.rebuild_changes(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} sync change(s).'))
@@ -0,0 +1,97 @@
+import random
+import tempfile
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from user_expenses import analytics
+from user_expenses.benchmarks import percentile, scratch_database, seed_dataset, summarize, time_calls
+from user_expenses.enums import SplitType
+from user_expenses.models import ExpenseSplit
+from user_expenses.splitting import to_cents
+
+
+def orm_report(chunk_size):
+    # Baseline: the same net positions and split type aggregates, one model
+    # instance per split with Decimal arithmetic
+    net = defaultdict(Decimal)
+    amounts = defaultdict(list)
+    for split in ExpenseSplit.objects.select_related('expense').iterator(chunk_size=chunk_size):
+        amounts[split.split_type].append(split.amount_owed)
+        if split.user_id != split.expense.user_id:
+            net[split.expense.user_id] += split.amount_owed
+            net[split.user_id] -= split.amount_owed
+    summary = {
+        split_type: {
+            'count': len(values),
+            'total': sum(values, Decimal(0)),
+            **{f'p{p}': percentile(values, p / 100) for p in analytics.PERCENTILES},
+        }
+        for split_type, values in amounts.items()
+    }
+    return net, summary
+
+
+def numpy_report(columns):
+    return analytics.net_positions(columns), analytics.split_type_summary(columns)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare net positions and split type aggregates over every split computed per ORM instance '
+        'against NumPy column arrays read from the database and from a memory-mapped snapshot, '
+        'on a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--splits', type=int, default=1000000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--participants', type=int, default=5, help='Splits per expense.')
+        parser.add_argument('--chunk-size', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        with scratch_database(), tempfile.TemporaryDirectory() as directory:
+            self.stdout.write(f"Seeding {options['splits']:,} splits...")
+            seed_dataset(
+                options['users'], options['splits'] // options['participants'], random.Random(options['seed']),
+                split_sizes={options['participants']: 1},
+                split_types={SplitType.EQUAL: 2, SplitType.EXACT: 1, SplitType.PERCENTAGE: 1},
+                batch_size=5000,
+            )
+            snapshot = Path(directory) / 'splits.npy'
+            columns = analytics.load_columns(chunk_size)
+            analytics.write_snapshot(columns, snapshot)
+
+            # The baseline's net positions must match to the cent
+            net, _ = orm_report(chunk_size)
+            vectorized, _ = numpy_report(columns)
+            assert {user: to_cents(amount) for user, amount in net.items() if amount} == {
+                user: int(amount) for user, amount in enumerate(vectorized.tolist()) if amount
+            }
+
+            # (label, callable); the load steps are timed on their own too
+            cases = [
+                ('orm per row', lambda: orm_report(chunk_size)),
+                ('numpy load from db', lambda: analytics.load_columns(chunk_size)),
+                ('numpy load snapshot', lambda: analytics.load_snapshot(snapshot, max_age=float('inf'))),
+                ('numpy compute', lambda: numpy_report(columns)),
+                ('numpy from db', lambda: numpy_report(analytics.load_columns(chunk_size))),
+                ('numpy from snapshot', lambda: numpy_report(analytics.load_snapshot(snapshot, float('inf')))),
+            ]
+            results = {}
+            splits = columns.shape[1]
+            for label, func in cases:
+                stats = summarize(time_calls(func, options['repeat']))
+                results[label] = stats['mean_ms']
+                self.stdout.write(
+                    f"  {label:<20} mean {stats['mean_ms']:>10} ms  p95 {stats['p95_ms']:>10} ms  "
+                    f"{splits / stats['mean_ms'] * 1000:>14,.0f} splits/s"
+                )
+            for label in ('numpy from db', 'numpy from snapshot'):
+                gain = results['orm per row'] / results[label]
+                self.stdout.write(self.style.SUCCESS(f'  {label} is {gain:.1f}x faster than orm per row'))
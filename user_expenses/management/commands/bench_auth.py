@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from user_expenses.benchmarks import scratch_database, summarize, time_calls
+from user_expenses.models import User
+from user_expenses.user_cache import user_cache
+from user_expenses.views import generate_jwt_token
+
+
+class Command(BaseCommand):
+    help = 'Measure authenticated requests/sec with the per-process user cache disabled and enabled.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--url', default='user-expenses', help='URL name of the endpoint to request.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            user = User.objects.create(name='bench', email='bench@example.com', mobile_number='0000000000', password='!')
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(user)}')
+            url = reverse(options['url'])
+
+            results = {}
+            for label, ttl in (('uncached', 0), ('cached', settings.USER_CACHE_TTL or 300)):
+                with override_settings(USER_CACHE_TTL=ttl):
+                    user_cache.clear()
+                    client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url)
+                    # Read the count now: every request resets the query log
+                    query_count = len(queries)
+                    stats = summarize(time_calls(lambda: client.get(url), options['requests']))
+                stats['queries_per_request'] = query_count
+                results[label] = stats
+                self.stdout.write(
+                    f"{label:>9}: {stats['per_second']:>9} req/s  p50 {stats['p50_ms']} ms  "
+                    f"p95 {stats['p95_ms']} ms  {stats['queries_per_request']} queries/request"
+                )
+
+            gain = results['cached']['per_second'] / results['uncached']['per_second']
+            self.stdout.write(self.style.SUCCESS(f'User cache throughput gain: {gain:.2f}x'))
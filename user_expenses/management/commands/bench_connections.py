@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from user_expenses.benchmarks import summarize, time_calls
+
+MODES = ('none', 'persistent', 'pool')
+
+
+def mode_settings(base, mode):
+    # Copy of the default database settings using the given DB_POOL mode
+    options = {name: value for name, value in base.get('OPTIONS', {}).items() if name != 'pool'}
+    config = {**base, 'OPTIONS': options, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+    if mode == 'persistent':
+        config.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    elif mode == 'pool':
+        # One thread issues the requests, so one pooled connection is enough
+        options['pool'] = {'min_size': 1, 'max_size': 1}
+    return config
+
+
+def simulate_request(connection, query):
+    # The database work of a one-query request. Django's request_started and
+    # request_finished handlers call close_if_unusable_or_obsolete(), which
+    # is where CONN_MAX_AGE and health checks take effect.
+    connection.close_if_unusable_or_obsolete()
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        cursor.fetchall()
+    connection.close_if_unusable_or_obsolete()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure per-request latency of a one-query request against the configured database with each '
+        'connection mode: a new connection per request, persistent connections, and a psycopg pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--query', default='SELECT 1')
+
+    def handle(self, *args, **options):
+        base = connections.settings['default']
+        results = {}
+        for mode in options['modes']:
+            if mode == 'pool' and base['ENGINE'] != 'django.db.backends.postgresql':
+                self.stderr.write('Skipping pool: connection pooling needs PostgreSQL with psycopg 3.')
+                continue
+
+            alias = f'bench_{mode}'
+            connections.settings[alias] = mode_settings(base, mode)
+            connection = connections[alias]
+            try:
+                simulate_request(connection, options['query'])
+                stats = summarize(time_calls(lambda: simulate_request(connection, options['query']),
+                                             options['requests']))
+            finally:
+                connection.close()
+                if mode == 'pool':
+                    connection.close_pool()
+                del connections[alias]
+                del connections.settings[alias]
+
+            results[mode] = stats
+            self.stdout.write(
+                f"{mode:>10}: mean {stats['mean_ms']} ms  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+                f"{stats['per_second']} req/s"
+            )
+
+        if 'none' in results:
+            for mode, stats in results.items():
+                if mode != 'none':
+                    saved = results['none']['mean_ms'] - stats['mean_ms']
+                    self.stdout.write(self.style.SUCCESS(f'{mode} saves {saved:.3f} ms per request over none'))
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user_expenses.benchmarks import percentile
+from user_expenses.models import User
+from user_expenses.views import generate_jwt_token
+
+
+async def fetch(host, port, path, headers, timeout):
+    # One GET over a fresh connection; returns the status code. A minimal
+    # HTTP/1.1 client keeps the load generator cheap and dependency free.
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def run_load(url, headers, concurrency, requests, timeout):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    durations, failures = [], 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal failures
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await fetch(parts.hostname, parts.port or 80, path, headers, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            durations.append(time.perf_counter() - start)
+            if status != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'per_second': round(len(durations) / elapsed, 1),
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'failures': failures,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure throughput of running servers at several concurrency levels, e.g. the same '
+        'project under WSGI (gunicorn expense_api.wsgi) and ASGI (uvicorn expense_api.asgi:application). '
+        'Servers must share this settings module and database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', nargs='+', required=True,
+                            help='Base URL of each server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--paths', nargs='+', default=['/api/balance/', '/api/async/balance/'])
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per path and concurrency level.')
+        parser.add_argument('--user', type=int, help='Authenticate as this user id (default: the first user).')
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(pk=options['user']) if options['user'] else User.objects.order_by('id')
+        user = user.first()
+        if user is None:
+            raise CommandError('No user to authenticate as; seed the database first (manage.py seed_data).')
+        headers = {'Authorization': f'Bearer {generate_jwt_token(user)}'}
+
+        self.stdout.write(f"{'server':<28} {'path':<28} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'fail':>5}")
+        for base_url in options['base_url']:
+            for path in options['paths']:
+                for concurrency in options['concurrency']:
+                    stats = asyncio.run(run_load(
+                        base_url.rstrip('/') + path, headers, concurrency, options['requests'], options['timeout'],
+                    ))
+                    self.stdout.write(
+                        f"{base_url:<28} {path:<28} {concurrency:>5} {stats['per_second']:>9} "
+                        f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['failures']:>5}"
+                    )
@@ -0,0 +1,60 @@
+import random
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from user_expenses.benchmarks import scratch_database, seed_dataset, summarize, time_calls
+from user_expenses.fast_serializers import EXPENSE_FIELDS, expense_rows
+from user_expenses.models import Expense
+from user_expenses.renderers import ORJSONRenderer
+from user_expenses.serializers import ExpenseListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/sec of ExpenseListSerializer + JSONRenderer against expense_rows + ORJSONRenderer '
+        'on pages of expenses with their splits, on a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[50, 500], help='Expenses per page.')
+        parser.add_argument('--participants', type=int, default=4, help='Splits per expense.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_dataset(max(50, options['participants']), max(options['rows']), random.Random(options['seed']),
+                         split_sizes={options['participants']: 1}, days=30)
+            for rows in options['rows']:
+                expenses = Expense.objects.order_by('-created_at', '-id')[:rows]
+                drf_page = list(expenses.prefetch_related('splits'))
+                columns = [field for field in EXPENSE_FIELDS if field != 'splits']
+                page = list(expenses.values(*columns))
+                drf_data = ExpenseListSerializer(drf_page, many=True).data
+                fast_data = expense_rows(page)
+
+                # (label, callable). drf serialize runs on prefetched instances,
+                # while fast serialize includes its splits query; the end to end
+                # cases include every query.
+                cases = [
+                    ('drf serialize', lambda: ExpenseListSerializer(drf_page, many=True).data),
+                    ('fast serialize', lambda: expense_rows(page)),
+                    ('json render', lambda: JSONRenderer().render(drf_data)),
+                    ('orjson render', lambda: ORJSONRenderer().render(fast_data)),
+                    ('drf end to end', lambda: JSONRenderer().render(
+                        ExpenseListSerializer(list(expenses.prefetch_related('splits')), many=True).data)),
+                    ('fast end to end', lambda: ORJSONRenderer().render(
+                        expense_rows(list(expenses.values(*columns))))),
+                ]
+                self.stdout.write(f'{rows} expenses x {options["participants"]} splits:')
+                results = {}
+                for label, func in cases:
+                    stats = summarize(time_calls(func, options['repeat']))
+                    results[label] = rows * stats['per_second']
+                    self.stdout.write(
+                        f"  {label:<16} {results[label]:>12,.0f} rows/s  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms"
+                    )
+                self.stdout.write('  (fast serialize includes its splits query)')
+                gain = results['fast end to end'] / results['drf end to end']
+                self.stdout.write(self.style.SUCCESS(f'  End to end speedup: {gain:.2f}x'))
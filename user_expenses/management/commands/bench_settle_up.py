@@ -0,0 +1,33 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from user_expenses.benchmarks import summarize, time_calls
+from user_expenses.settlement import simplify_debts
+
+
+def random_balances(users, rng):
+    # Random net positions in whole cents that sum to exactly zero
+    cents = [rng.randint(-500000, 500000) for _ in range(users - 1)]
+    cents.append(-sum(cents))
+    return {user: Decimal(amount).scaleb(-2) for user, amount in enumerate(cents, start=1)}
+
+
+class Command(BaseCommand):
+    help = 'Time the settle-up debt simplification on random balances of increasing size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        for size in options['sizes']:
+            balances = random_balances(size, rng)
+            transfers = simplify_debts(balances)
+            stats = summarize(time_calls(lambda: simplify_debts(balances), options['repeat']))
+            self.stdout.write(
+                f"{size:>8} users: {len(transfers):>8} transfers  mean {stats['mean_ms']} ms  p95 {stats['p95_ms']} ms"
+            )
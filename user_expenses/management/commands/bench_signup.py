@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from user_expenses.benchmarks import scratch_database, summarize, time_calls
+from user_expenses.user_import import default_workers, import_users
+
+PASSWORD = 'bench-Passw0rd!'
+
+
+def signup_payload(prefix, i):
+    return {'name': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com', 'mobile_number': '0000000000',
+            'password': PASSWORD}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare users/sec of one-by-one signups through /register/ against import_users with one and '
+        'several hashing processes, on a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Users created by each method.')
+        parser.add_argument('--workers', type=int, nargs='+', default=None,
+                            help='Process counts to import with; defaults to 1 and the CPU count.')
+
+    def handle(self, *args, **options):
+        count = options['users']
+        workers = options['workers'] or sorted({1, default_workers()})
+
+        with scratch_database():
+            client = Client()
+            url = reverse('register')
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(url, signup_payload('probe', 0), content_type='application/json')
+            assert response.status_code == 201, response.content
+            self.stdout.write(f'/register/: {len(queries)} queries per signup')
+
+            emails = iter(range(count))
+            stats = summarize(time_calls(
+                lambda: client.post(url, signup_payload('signup', next(emails)), content_type='application/json'),
+                count,
+            ))
+            results = {'register': stats['per_second']}
+            self.stdout.write(
+                f"{'register':>12}: {stats['per_second']:>8} users/s  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms"
+            )
+
+            for processes in workers:
+                rows = [signup_payload(f'import{processes}-', i) for i in range(count)]
+                start = time.perf_counter()
+                users, errors = import_users(rows, workers=processes)
+                elapsed = time.perf_counter() - start
+                assert len(users) == count and not errors, errors
+                label = f'import x{processes}'
+                results[label] = round(count / elapsed, 1)
+                self.stdout.write(f'{label:>12}: {results[label]:>8} users/s  total {elapsed * 1000:.1f} ms')
+
+            best = max(results[label] for label in results if label != 'register')
+            self.stdout.write(self.style.SUCCESS(f"Bulk import speedup over /register/: {best / results['register']:.2f}x"))
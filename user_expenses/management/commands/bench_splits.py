@@ -0,0 +1,99 @@
+import random
+from decimal import ROUND_DOWN, Decimal
+
+from django.core.management.base import BaseCommand
+
+from user_expenses import splitting
+from user_expenses.benchmarks import random_parts, summarize, time_calls
+from user_expenses.models import User
+from user_expenses.serializers import ExpenseSerializer
+
+CENT = Decimal('0.01')
+
+
+def decimal_equal_split(amount, count):
+    # Baseline: equal shares rounded down to the cent, leftover cents to the first shares
+    share = (amount / count).quantize(CENT, rounding=ROUND_DOWN)
+    shares = [share] * count
+    for index in range(int((amount - share * count) / CENT)):
+        shares[index] += CENT
+    return shares
+
+
+def cents_equal_split(amount, count):
+    return splitting.to_amounts(splitting.equal_shares(splitting.to_cents(amount), count))
+
+
+def decimal_percentage_split(amount, percentages):
+    # Baseline: the same largest-remainder split done in Decimal arithmetic
+    exact = [amount * percentage / 100 for percentage in percentages]
+    shares = [value.quantize(CENT, rounding=ROUND_DOWN) for value in exact]
+    leftover = int((amount - sum(shares)) / CENT)
+    order = sorted(range(len(shares)), key=lambda i: (shares[i] - exact[i], i))
+    for index in order[:leftover]:
+        shares[index] += CENT
+    return shares
+
+
+def cents_percentage_split(amount, percentages):
+    basis_points = [splitting.to_basis_points(percentage) for percentage in percentages]
+    shares = splitting.percentage_shares(splitting.to_cents(amount), basis_points)
+    return splitting.to_amounts(shares)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time split generation in integer cents against Decimal arithmetic, and ExpenseSerializer '
+        'validation of generated splits, for groups of increasing size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000])
+        parser.add_argument('--validate-sizes', type=int, nargs='+', default=[10, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        for size in options['sizes']:
+            amount = splitting.from_cents(rng.randint(size * 100, size * 10000))
+            percentages = [splitting.from_cents(part) for part in random_parts(splitting.FULL_PERCENTAGE * 100, size, rng)]
+            # Keep two decimal places: percentages are stored as basis points
+            percentages = [percentage.quantize(CENT, rounding=ROUND_DOWN) for percentage in percentages]
+            percentages[-1] += 100 - sum(percentages)
+
+            # (label, decimal baseline, integer cents); both return Decimal shares
+            cases = [
+                ('equal', lambda: decimal_equal_split(amount, size), lambda: cents_equal_split(amount, size)),
+                ('percentage', lambda: decimal_percentage_split(amount, percentages),
+                 lambda: cents_percentage_split(amount, percentages)),
+            ]
+            for label, baseline, func in cases:
+                decimal = summarize(time_calls(baseline, repeat))
+                cents = summarize(time_calls(func, repeat))
+                self.stdout.write(
+                    f"{size:>8} users, {label:<10}: decimal {decimal['mean_ms']} ms  cents {cents['mean_ms']} ms  "
+                    f"({decimal['mean_ms'] / cents['mean_ms']:.2f}x)"
+                )
+
+        for size in options['validate_sizes']:
+            # Unsaved users in the context: validation without database lookups
+            users = {pk: User(pk=pk) for pk in range(1, size + 1)}
+            payload = {
+                'user': 1,
+                'amount': str(splitting.from_cents(size * 1000 + 1)),
+                'description': 'Benchmark',
+                'splits': [{'user': pk, 'split_type': 'equal'} for pk in users],
+            }
+
+            def validate():
+                serializer = ExpenseSerializer(data=payload, context={'users': users})
+                assert serializer.is_valid(), serializer.errors
+
+            stats = summarize(time_calls(validate, repeat))
+            self.stdout.write(
+                f"{size:>8} users: validating a generated equal split {stats['mean_ms']} ms "
+                f"({stats['mean_ms'] * 1000 / size:.2f} us per split)"
+            )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from user_expenses.benchmarks import boot_worker, import_breakdown, summarize
+
+PROFILES = ['expense_api.settings', 'expense_api.settings_production']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure worker boot time (interpreter start, Django setup and the first request) for each settings '
+        'profile in fresh interpreters, with a per-package breakdown of import time from -X importtime.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=PROFILES, help='Settings modules to compare.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=12, help='Packages to list in the breakdown.')
+
+    def handle(self, *args, **options):
+        # The production profile rejects unknown hosts
+        env = {'ALLOWED_HOSTS': 'localhost'}
+        walls = {}
+        for profile in options['profiles']:
+            boot_worker(profile, env=env)  # warm the filesystem cache
+            results = [boot_worker(profile, env=env)[0] for _ in range(options['repeat'])]
+            wall = summarize([result['wall_ms'] / 1000 for result in results])
+            setup = summarize([result['setup_ms'] / 1000 for result in results])
+            first = summarize([result['first_request_ms'] / 1000 for result in results])
+            walls[profile] = wall['mean_ms']
+
+            traced, importtime = boot_worker(profile, importtime=True, env=env)
+            breakdown = import_breakdown(importtime)
+            self.stdout.write(
+                f"{profile}: boot {wall['mean_ms']} ms (p95 {wall['p95_ms']} ms) = interpreter + "
+                f"setup {setup['mean_ms']} ms + first request {first['mean_ms']} ms; "
+                f"first response {traced['status']}"
+            )
+            self.stdout.write(f"  heavy modules loaded: {', '.join(traced['modules']) or 'none'}")
+            self.stdout.write(f"  imports {sum(breakdown.values()):.1f} ms under -X importtime, by package:")
+            for package, ms in breakdown.most_common(options['top']):
+                self.stdout.write(f'    {package:<24} {ms:8.1f} ms')
+
+        baseline = walls[options['profiles'][0]]
+        for profile, wall in list(walls.items())[1:]:
+            self.stdout.write(self.style.SUCCESS(
+                f'{profile} boots in {wall:.1f} ms vs {baseline:.1f} ms ({baseline / wall:.2f}x)'
+            ))
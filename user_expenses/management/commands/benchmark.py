@@ -0,0 +1,194 @@
+import itertools
+import json
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from user_expenses import urls
+from user_expenses.benchmarks import scratch_database, seed_dataset, summarize
+from user_expenses.enums import SplitType
+from user_expenses.models import ExpenseSplit, ExportJob, User
+from user_expenses.user_cache import user_cache
+from user_expenses.views import generate_jwt_token
+
+BENCH_PASSWORD = 'bench-Passw0rd!'
+
+
+class RequestFactory:
+    # Builds the request for each URL name in user_expenses/urls.py. Names
+    # without an entry in `specs` are requested with a plain GET. `settle`
+    # runs after each request, outside the timings, for endpoints that leave
+    # work running in the background.
+
+    def __init__(self, user, participants):
+        self.user = user
+        self.participants = participants
+        self.counter = itertools.count()
+        self.specs = {
+            'register': ('post', self.register_payload),
+            'login': ('post', lambda: {'email': self.user.email, 'password': BENCH_PASSWORD}),
+            'create_expense': ('post', self.expense_payload),
+            'create_expenses_batch': ('post', lambda: [self.expense_payload() for _ in range(20)]),
+            'export-balance-sheet': ('post', dict),
+        }
+        self.settle_steps = {'export-balance-sheet': self.wait_for_exports}
+        # Password hashing dominates these, and each export writes a file; a
+        # few samples are enough
+        self.max_requests = {'register': 5, 'login': 5, 'export-balance-sheet': 10}
+
+    def register_payload(self):
+        n = next(self.counter)
+        return {'email': f'bench-signup{n}@example.com', 'password': BENCH_PASSWORD,
+                'name': f'signup{n}', 'mobile_number': '0000000000'}
+
+    def expense_payload(self):
+        return {
+            'user': self.user.id,
+            'amount': f'{10 * len(self.participants)}.00',
+            'description': 'Benchmark',
+            'splits': [
+                {'user': user.id, 'amount_owed': '10.00', 'split_type': SplitType.EQUAL.value}
+                for user in self.participants
+            ],
+        }
+
+    def wait_for_exports(self, timeout=60):
+        # Let the export a request started finish, so it neither competes
+        # with the next request nor counts against EXPORT_MAX_ACTIVE_PER_USER
+        deadline = time.monotonic() + timeout
+        active = ExportJob.objects.filter(user=self.user, status__in=ExportJob.ACTIVE_STATUSES)
+        while active.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def settle(self, name):
+        step = self.settle_steps.get(name)
+        if step is not None:
+            step()
+
+    def request(self, client, name):
+        method, payload = self.specs.get(name, ('get', None))
+        url = reverse(f'{name}')
+        if method == 'post':
+            response = client.post(url, payload(), content_type='application/json')
+        else:
+            response = client.get(url)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every endpoint in user_expenses/urls.py at several dataset sizes on a scratch '
+        'database and report p50/p95 latency, query counts and peak memory as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                            help='Number of expenses to seed for each run.')
+        parser.add_argument('--users-per-expense', type=float, default=0.1,
+                            help='Users to seed per seeded expense (at least 50).')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        report = {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'runs': [self.run_size(size, options) for size in options['sizes']],
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run_size(self, size, options):
+        users = max(50, int(size * options['users_per_expense']))
+        self.stderr.write(f'Seeding {size} expenses across {users} users...')
+        # Time the endpoints' own work: no rate limit turns repeated requests
+        # into 429s, no request waits on another's result, and no response
+        # comes from the response cache (which would hide the queries)
+        with scratch_database(), tempfile.TemporaryDirectory() as export_root, \
+                override_settings(RATE_LIMITS={}, COALESCE_REQUESTS=False, RESPONSE_CACHE_ENABLED=False,
+                                  EXPORT_ROOT=export_root):
+            user_cache.clear()
+            seed_dataset(users, size, random.Random(options['seed']),
+                         split_sizes={2: 3, 5: 5, 10: 2, 30: 1},
+                         split_types={SplitType.EQUAL: 6, SplitType.EXACT: 3, SplitType.PERCENTAGE: 1},
+                         days=365)
+
+            # Request as the busiest user, whose endpoints do the most work
+            busiest = ExpenseSplit.objects.values('user').annotate(n=Count('id')).order_by('-n').first()
+            user = User.objects.get(pk=busiest['user'])
+            user.set_password(BENCH_PASSWORD)
+            user.save()
+            factory = RequestFactory(user, list(User.objects.order_by('id')[:5]))
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(user)}')
+
+            endpoints = {}
+            for pattern in urls.urlpatterns:
+                if not pattern.name or pattern.pattern.converters:
+                    continue
+                endpoints[pattern.name] = self.measure(client, factory, pattern.name, options['requests'])
+                self.stderr.write(f"  {pattern.name}: p50 {endpoints[pattern.name]['p50_ms']} ms")
+
+            return {
+                'expenses': size,
+                'users': users,
+                'splits': ExpenseSplit.objects.count(),
+                'endpoints': endpoints,
+            }
+
+    def measure(self, client, factory, name, requests):
+        status = factory.request(client, name).status_code
+        factory.settle(name)
+
+        with CaptureQueriesContext(connection) as queries:
+            factory.request(client, name)
+        # Read the count now: every request resets the query log
+        query_count = len(queries)
+        factory.settle(name)
+
+        tracemalloc.start()
+        factory.request(client, name)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        factory.settle(name)
+
+        iterations = min(requests, factory.max_requests.get(name, requests))
+        durations, failures = [], 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = factory.request(client, name)
+            durations.append(time.perf_counter() - start)
+            failures += not 200 <= response.status_code < 300
+            factory.settle(name)
+        stats = summarize(durations)
+        # Latencies of error responses say nothing about the endpoint's work;
+        # non_2xx counts the timed requests that were not successful
+        stats.update({'status': status, 'non_2xx': failures, 'queries': query_count,
+                      'peak_memory_bytes': peak_memory})
+        return stats
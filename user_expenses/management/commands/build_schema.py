@@ -0,0 +1,29 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user_expenses import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI document and write it to SWAGGER_SCHEMA_PATH, from where the docs serve it '
+        'without generating it per process. Run it again on deploy after API changes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write here instead of SWAGGER_SCHEMA_PATH.')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.SWAGGER_SCHEMA_PATH
+        if not output:
+            raise CommandError('Set SWAGGER_SCHEMA_PATH or pass --output.')
+        path = Path(output)
+        content = schema.build_schema()
+        # Replaced in one rename so the docs never serve a partial file
+        partial = path.with_name(f'{path.name}.part')
+        partial.write_bytes(content)
+        os.replace(partial, path)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(content)} bytes to {path}.'))
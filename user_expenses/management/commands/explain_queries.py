@@ -0,0 +1,93 @@
+import contextlib
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from user_expenses import ledger
+from user_expenses.benchmarks import scratch_database, seed_dataset, summarize, time_calls
+from user_expenses.exports import balance_sheet_queryset
+from user_expenses.models import Expense, ExpenseSplit, GroupMembership, PairBalance
+from user_expenses.pagination import after_position
+from user_expenses.queries import balances, owed_from_queryset, owes_to_queryset, user_splits_queryset
+
+
+def endpoint_querysets(user_id):
+    # (label, queryset) for the queries each read endpoint runs
+    page_size = settings.EXPENSE_PAGE_SIZE
+    newest = Expense.objects.order_by('-created_at', '-id')
+
+    querysets = [
+        ('balance: owes_to', owes_to_queryset(user_id)),
+        ('balance: owed_from', owed_from_queryset(user_id)),
+        ('expenses/user', user_splits_queryset(user_id)),
+        ('expenses/balance-sheet', balance_sheet_queryset(user_id)),
+        ('expenses/overall: first page', newest[:page_size + 1]),
+        ('expenses/overall: payer filter', newest.filter(user=user_id)[:page_size + 1]),
+        ('settle-up', PairBalance.objects.values_list('debtor', 'creditor', 'amount')),
+        ('rebuild_balances', ledger.split_totals()),
+    ]
+
+    # A page from the middle of the listing, to compare against the first
+    middle = newest.values_list('created_at', 'id')[newest.count() // 2:].first()
+    if middle is not None:
+        querysets.append(('expenses/overall: deep page', after_position(newest, *middle)[:page_size + 1]))
+
+    # The group endpoints, for one of the user's groups
+    group_id = GroupMembership.objects.filter(user=user_id).values_list('group', flat=True).first()
+    if group_id is not None:
+        querysets += [
+            ('groups/balance: owes_to', owes_to_queryset(user_id, group_id)),
+            ('groups/balance: owed_from', owed_from_queryset(user_id, group_id)),
+            ('groups/expenses: first page', newest.filter(group=group_id)[:page_size + 1]),
+            ('groups/settle-up', balances(group_id).values_list('debtor', 'creditor', 'amount')),
+        ]
+    return querysets
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN (ANALYZE on PostgreSQL) for each endpoint's queries against a seeded "
+        "scratch database and report the plan and timing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--expenses', type=int, default=20000)
+        parser.add_argument('--participants', type=int, default=5)
+        parser.add_argument('--groups', type=int, default=0, help='Seed this many groups (see seed_data).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed executions per query.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--existing',
+            action='store_true',
+            help='Explain against the configured database and its data instead of seeding a scratch one.',
+        )
+
+    def handle(self, *args, **options):
+        database = contextlib.nullcontext() if options['existing'] else scratch_database()
+        with database:
+            if not options['existing']:
+                self.stdout.write('Seeding scratch database...')
+                seed_dataset(options['users'], options['expenses'], random.Random(options['seed']),
+                             split_sizes={options['participants']: 1}, groups=options['groups'])
+
+            # Explain for the busiest user, where index choices matter most
+            busiest = (
+                ExpenseSplit.objects.values('user').annotate(splits=Count('id')).order_by('-splits').first()
+            )
+            if busiest is None:
+                self.stdout.write('No expense splits to explain against.')
+                return
+            user_id = busiest['user']
+            self.stdout.write(f"User {user_id} with {busiest['splits']} splits\n")
+
+            explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+            for label, queryset in endpoint_querysets(user_id):
+                plan = queryset.explain(**explain_options)
+                stats = summarize(time_calls(lambda: list(queryset.all()), options['repeat']))
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(plan)
+                self.stdout.write(f"p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms\n")
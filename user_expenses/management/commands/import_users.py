@@ -0,0 +1,52 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user_expenses.user_import import default_workers, import_users
+
+COLUMNS = ('name', 'email', 'mobile_number', 'password')
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users in bulk from a CSV file with the columns name, email, mobile_number and password, '
+        'hashing passwords on a pool of worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row; '-' reads standard input.")
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes; defaults to the CPU count.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--atomic', action='store_true', help='Import nothing if any row is invalid.')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            rows = self.read_rows(sys.stdin)
+        else:
+            with open(options['path'], newline='') as f:
+                rows = self.read_rows(f)
+
+        start = time.perf_counter()
+        users, errors = import_users(rows, workers=options['workers'], batch_size=options['batch_size'],
+                                     atomic=options['atomic'])
+        elapsed = time.perf_counter() - start
+
+        for error in errors:
+            # Data rows are numbered from 2, after the header line
+            self.stderr.write(f"Row {error['index'] + 2}: {error['errors']}")
+        if errors and options['atomic']:
+            raise CommandError(f'{len(errors)} invalid row(s); nothing was imported.')
+        rate = len(users) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(users)} user(s), skipped {len(errors)}, in {elapsed:.2f} s ({rate:.1f} users/s "
+            f"with {options['workers'] or default_workers()} worker(s))."
+        ))
+
+    def read_rows(self, f):
+        reader = csv.DictReader(f)
+        missing = set(COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f"Missing column(s): {', '.join(sorted(missing))}")
+        return [{name: row[name] for name in COLUMNS} for row in reader]
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user_expenses import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired background exports and their files, and fail exports left pending or running '
+        'for longer than EXPORT_JOB_TIMEOUT (e.g. by a restarted process). Run it periodically, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int, default=None,
+                            help='Seconds after which an unfinished export is failed; defaults to EXPORT_JOB_TIMEOUT.')
+
+    def handle(self, *args, **options):
+        timeout = options['timeout'] if options['timeout'] is not None else settings.EXPORT_JOB_TIMEOUT
+        failed = jobs.fail_stale_jobs(timeout)
+        purged = jobs.purge_expired_jobs()
+        self.stdout.write(self.style.SUCCESS(f'Failed {failed} stale export(s), purged {purged} expired export(s).'))
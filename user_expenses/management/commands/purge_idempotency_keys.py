@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from user_expenses import idempotency
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL; repeats of those requests are '
+        'no longer recognized. Run it periodically, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        purged = idempotency.purge_expired_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency key(s).'))
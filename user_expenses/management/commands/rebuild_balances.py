@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user_expenses import ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the PairBalance and GroupBalance ledgers from ExpenseSplit, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the ledger against ExpenseSplit without modifying it.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = ledger.verify_balances()
+            for debtor, creditor, stored, expected in mismatches:
+                self.stdout.write(
+                    f'user {debtor} -> user {creditor}: ledger {stored}, splits {expected}'
+                )
+            group_mismatches = ledger.verify_group_balances()
+            for group, debtor, creditor, stored, expected in group_mismatches:
+                self.stdout.write(
+                    f'group {group}: user {debtor} -> user {creditor}: ledger {stored}, splits {expected}'
+                )
+            if mismatches or group_mismatches:
+                raise CommandError(
+                    f'{len(mismatches)} pair balance(s) and {len(group_mismatches)} group balance(s) out of sync.'
+                )
+            self.stdout.write(self.style.SUCCESS('Pair and group balances are in sync.'))
+            return
+
+        count = ledger.rebuild_balances(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} pair balance(s).'))
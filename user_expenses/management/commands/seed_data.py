@@ -0,0 +1,58 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from user_expenses.benchmarks import seed_dataset
+from user_expenses.enums import SplitType
+from user_expenses.models import User
+
+
+def parse_weights(value, convert):
+    # "2:5,5:3,20:1" -> {2: 5.0, 5: 3.0, 20: 1.0}
+    weights = {}
+    try:
+        for item in value.split(','):
+            key, _, weight = item.partition(':')
+            weights[convert(key.strip())] = float(weight or 1)
+    except ValueError as e:
+        raise CommandError(f'Invalid distribution {value!r}: {e}')
+    return weights
+
+
+class Command(BaseCommand):
+    help = 'Create a synthetic dataset of users, expenses and splits in the configured database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--expenses', type=int, default=10000)
+        parser.add_argument(
+            '--split-sizes', default='2:3,5:5,10:2,30:1',
+            help='Participants per expense as size:weight pairs, e.g. "2:3,5:5,30:1".',
+        )
+        parser.add_argument(
+            '--split-types', default='equal:6,exact:3,percentage:1',
+            help=f"Split type mix as type:weight pairs; types are {', '.join(t.value for t in SplitType)}.",
+        )
+        parser.add_argument('--days', type=int, default=365, help='Spread expenses over this many past days.')
+        parser.add_argument('--groups', type=int, default=0,
+                            help='Deal users into this many groups and keep every expense within one.')
+        parser.add_argument('--prefix', default='user', help='Name/email prefix for the generated users.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        split_sizes = parse_weights(options['split_sizes'], int)
+        split_types = parse_weights(options['split_types'], SplitType)
+        if User.objects.filter(email__startswith=options['prefix'], email__endswith='@example.com').exists():
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist; pass a different --prefix.")
+
+        with transaction.atomic():
+            users = seed_dataset(
+                options['users'], options['expenses'], random.Random(options['seed']),
+                split_sizes=split_sizes, split_types=split_types, days=options['days'],
+                prefix=options['prefix'], batch_size=options['batch_size'], groups=options['groups'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users and {options['expenses']} expenses."
+        ))
@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+
+# In-process request metrics, exposed in Prometheus text format at /metrics/.
+#
+# Each metric is a histogram per view. Bucket counts, sums and counts are
+# cumulative since the process started, as Prometheus expects. A ring of
+# time slots additionally keeps the same buckets for the last
+# METRICS_WINDOW_SECONDS, from which p50/p95 gauges are estimated, so recent
+# latency is visible without a Prometheus server doing the windowing.
+#
+# Plain counters per view (e.g. response cache hits) are kept alongside.
+#
+# Every worker process keeps its own registry; scrape each one, or aggregate
+# in Prometheus.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+WINDOW_SLOTS = 12
+QUANTILES = (0.5, 0.95)
+
+
+class RollingHistogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+        self.slots = [[0] * (len(buckets) + 1) for _ in range(WINDOW_SLOTS)]
+        self.slot_started = [0.0] * WINDOW_SLOTS
+
+    def observe(self, value, now):
+        index = bisect.bisect_left(self.buckets, value)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+        slot_seconds = settings.METRICS_WINDOW_SECONDS / WINDOW_SLOTS
+        slot = int(now // slot_seconds)
+        ring_index = slot % WINDOW_SLOTS
+        if self.slot_started[ring_index] != slot:
+            # The slot last held data from a previous lap of the ring
+            self.slots[ring_index] = [0] * (len(self.buckets) + 1)
+            self.slot_started[ring_index] = slot
+        self.slots[ring_index][index] += 1
+
+    def window_counts(self, now):
+        slot_seconds = settings.METRICS_WINDOW_SECONDS / WINDOW_SLOTS
+        current = int(now // slot_seconds)
+        totals = [0] * (len(self.buckets) + 1)
+        for started, counts in zip(self.slot_started, self.slots):
+            if current - WINDOW_SLOTS < started <= current:
+                totals = [a + b for a, b in zip(totals, counts)]
+        return totals
+
+    def window_quantile(self, quantile, now):
+        # Upper bound of the bucket holding the quantile; None when the
+        # window is empty
+        counts = self.window_counts(now)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = quantile * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    metrics = {
+        'request_duration_seconds': ('Wall time spent in the view and middleware.', DURATION_BUCKETS),
+        'db_queries': ('Database queries issued per request.', COUNT_BUCKETS),
+        'db_duration_seconds': ('Time spent executing database queries per request.', DURATION_BUCKETS),
+        'serialize_duration_seconds': ('Time spent rendering the response body.', DURATION_BUCKETS),
+        'response_size_bytes': ('Size of non-streaming response bodies.', SIZE_BUCKETS),
+    }
+    counters = {
+        'response_cache_hits_total': 'Responses served from the response cache.',
+        'response_cache_misses_total': 'Cacheable responses computed because the cache had no entry.',
+        'throttled_requests_total': 'Requests rejected by a rate limit.',
+        'coalesced_requests_total': 'Responses shared from an identical request in flight.',
+        'idempotent_replays_total': 'Stored responses returned for a repeated Idempotency-Key.',
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {name: {} for name in self.metrics}
+        self.counts = {name: {} for name in self.counters}
+
+    def observe(self, view, values):
+        now = time.monotonic()
+        with self._lock:
+            for name, value in values.items():
+                if value is None:
+                    continue
+                histogram = self.histograms[name].get(view)
+                if histogram is None:
+                    histogram = self.histograms[name][view] = RollingHistogram(self.metrics[name][1])
+                histogram.observe(value, now)
+
+    def increment(self, name, view, amount=1):
+        with self._lock:
+            self.counts[name][view] = self.counts[name].get(view, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self.histograms = {name: {} for name in self.metrics}
+            self.counts = {name: {} for name in self.counters}
+
+    def render(self):
+        prefix = settings.METRICS_PREFIX
+        now = time.monotonic()
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets) in self.metrics.items():
+                metric = f'{prefix}_{name}'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                window = []
+                for view, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else format_value(bound)
+                        lines.append(f'{metric}_bucket{{view="{view}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{view="{view}"}} {format_value(histogram.sum)}')
+                    lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+                    for quantile in QUANTILES:
+                        value = histogram.window_quantile(quantile, now)
+                        if value is not None:
+                            window.append(f'{metric}_window{{view="{view}",quantile="{quantile}"}} '
+                                          f'{format_value(value)}')
+                if window:
+                    lines.append(f'# HELP {metric}_window Bucket upper bound of each quantile over the '
+                                 f'last {settings.METRICS_WINDOW_SECONDS}s.')
+                    lines.append(f'# TYPE {metric}_window gauge')
+                    lines.extend(window)
+            for name, help_text in self.counters.items():
+                metric = f'{prefix}_{name}'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for view, count in sorted(self.counts[name].items()):
+                    lines.append(f'{metric}{{view="{view}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
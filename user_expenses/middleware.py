@@ -0,0 +1,136 @@
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import registry
+
+# Timer of the request being measured. Context variables are copied into
+# sync_to_async threads, so queries the async views run in worker threads
+# (each on its own connection) are attributed to the right request.
+current_timer = contextvars.ContextVar('query_timer', default=None)
+
+
+class QueryTimer:
+    # Counts queries and their total time; queries may run in several threads
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, duration):
+        with self._lock:
+            self.duration += duration
+            self.count += 1
+
+
+def time_query(execute, sql, params, many, context):
+    # execute_wrapper installed on every connection (see signals.py); does
+    # nothing outside a sampled request
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add(time.perf_counter() - start)
+
+
+class PerformanceMiddleware:
+    # Records wall time, DB query count and time, render time and response
+    # size for a sample of requests (METRICS_SAMPLE_RATE). Each sampled
+    # response gets a Server-Timing header, and the numbers feed the per-view
+    # histograms served at /metrics/.
+    #
+    # Unsampled requests pay for one random() call. For streaming responses
+    # only the time to the first byte is measured and no size is recorded.
+    # Works in both the WSGI and the ASGI handler.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timer, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timer, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    @staticmethod
+    def sampled():
+        return settings.METRICS_ENABLED and random.random() < settings.METRICS_SAMPLE_RATE
+
+    @staticmethod
+    def start(request):
+        timer = QueryTimer()
+        request._render_duration = None
+        return timer, current_timer.set(timer), time.perf_counter()
+
+    def finish(self, request, response, timer, start):
+        duration = time.perf_counter() - start
+
+        view = self.view_name(request)
+        if view is None:
+            return response
+
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, {
+            'request_duration_seconds': duration,
+            'db_queries': timer.count,
+            'db_duration_seconds': timer.duration,
+            'serialize_duration_seconds': request._render_duration,
+            'response_size_bytes': size,
+        })
+
+        timings = [
+            f'db;dur={timer.duration * 1000:.2f};desc="{timer.count} queries"',
+            f'total;dur={duration * 1000:.2f}',
+        ]
+        if request._render_duration is not None:
+            timings.insert(1, f'serialize;dur={request._render_duration * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook; time the render
+        # (JSON encoding of the serializer output) with a post-render callback
+        if hasattr(request, '_render_duration'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._render_duration = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name in settings.METRICS_EXCLUDED_VIEWS:
+            return None
+        return match.view_name
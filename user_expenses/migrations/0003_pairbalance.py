@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def populate_pair_balances(apps, schema_editor):
+    ExpenseSplit = apps.get_model('user_expenses', 'ExpenseSplit')
+    PairBalance = apps.get_model('user_expenses', 'PairBalance')
+    rows = (
+        ExpenseSplit.objects.exclude(user=F('expense__user'))
+        .values('user', 'expense__user')
+        .annotate(total=Sum('amount_owed'))
+    )
+    PairBalance.objects.bulk_create(
+        [
+            PairBalance(debtor_id=row['user'], creditor_id=row['expense__user'], amount=row['total'])
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_expenses', '0002_remove_user_uid_alter_user_id_alter_user_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('creditor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='user_expenses.user')),
+                ('debtor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debts', to='user_expenses.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('debtor', 'creditor'), name='unique_pair_balance')],
+            },
+        ),
+        migrations.RunPython(populate_pair_balances, migrations.RunPython.noop),
+    ]
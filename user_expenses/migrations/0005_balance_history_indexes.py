@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_expenses', '0004_expense_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_expenses.user'),
+        ),
+        migrations.AlterField(
+            model_name='expensesplit',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='user_expenses.user'),
+        ),
+        migrations.AlterField(
+            model_name='pairbalance',
+            name='creditor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='user_expenses.user'),
+        ),
+        migrations.AlterField(
+            model_name='pairbalance',
+            name='debtor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='debts', to='user_expenses.user'),
+        ),
+        migrations.AddIndex(
+            model_name='expensesplit',
+            index=models.Index(fields=['user', 'expense'], include=('amount_owed', 'split_type', 'percentage'), name='split_user_expense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pairbalance',
+            index=models.Index(fields=['creditor', 'debtor'], include=('amount',), name='pairbalance_creditor_idx'),
+        ),
+    ]
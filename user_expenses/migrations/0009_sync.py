@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_expenses', '0008_groups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_sequence', serialize=False, to='user_expenses.user')),
+                ('last_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('expense', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to='user_expenses.expense')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to='user_expenses.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'seq'), name='unique_sync_change')],
+            },
+        ),
+    ]
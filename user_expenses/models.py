@@ -18,29 +18,79 @@ class User(models.Model):
     date_joined = models.DateTimeField(default=timezone.now)
 
     def set_password(self, raw_password):
-        #hashing password
+        #hashing password; like Django's own set_password it does not save,
+        #so creating a user is a single write
         self.password = make_password(raw_password)
-        self.save()
 
     def check_password(self, raw_password):
         #checking password
         return check_password(raw_password, self.password)
 
+    @property
+    def is_authenticated(self):
+        # Users resolved by JWTAuthentication are always authenticated; lets
+        # DRF's IsAuthenticated permission work with this model
+        return True
+
     def __str__(self):
         return f"{self.id} - {self.email}"
 
+# A set of users sharing expenses, with its own balances (GroupBalance).
+# Expenses outside any group stay in the global pool.
+class Group(models.Model):
+    name = models.CharField(max_length=128)
+    created_by = models.ForeignKey(User, related_name='created_groups', on_delete=models.SET_NULL, null=True)
+    members = models.ManyToManyField(User, through='GroupMembership', related_name='expense_groups')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.name}"
+
+class GroupMembership(models.Model):
+    # Both columns are covered by the unique constraint and index below
+    group = models.ForeignKey(Group, related_name='memberships', on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(User, related_name='group_memberships', on_delete=models.CASCADE, db_index=False)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index for a group's members and membership checks
+            models.UniqueConstraint(fields=['group', 'user'], name='unique_group_member'),
+        ]
+        indexes = [
+            # A user's groups
+            models.Index(fields=['user', 'group'], name='groupmember_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.group_id}"
+
 class Expense(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed through expense_user_created_id_idx, which leads with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    # Indexed through expense_group_created_id_idx, which leads with group
+    group = models.ForeignKey(Group, related_name='expenses', on_delete=models.CASCADE, null=True, blank=True,
+                              db_index=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Back the keyset pagination of the overall expense listing, with and
+        # without the payer filter, and of a group's expense listing.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='expense_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='expense_user_created_id_idx'),
+            models.Index(fields=['group', 'created_at', 'id'], name='expense_group_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.description} - {self.amount}"
 
 class ExpenseSplit(models.Model):
     expense = models.ForeignKey(Expense, related_name='splits', on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed through split_user_expense_idx, which leads with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     amount_owed = models.DecimalField(max_digits=10, decimal_places=2)
     split_type = models.CharField(
         max_length=20,
@@ -48,6 +98,181 @@ class ExpenseSplit(models.Model):
     )
     percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # Used only for percentage splits
 
+    class Meta:
+        indexes = [
+            # A user's splits joined to their expenses (balance sheet, user
+            # expense list). On PostgreSQL the INCLUDE columns make the split
+            # side an index-only scan.
+            models.Index(
+                fields=['user', 'expense'],
+                include=['amount_owed', 'split_type', 'percentage'],
+                name='split_user_expense_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.email} owes {self.amount_owed} for {self.expense.description} ({self.split_type})"
 
+# Running total of what `debtor` owes `creditor` across all expense splits.
+# Maintained incrementally by ledger.record_expense_splits so balances are a
+# single indexed lookup instead of an aggregation over ExpenseSplit.
+class PairBalance(models.Model):
+    # Both columns are covered by the composite unique constraint and index below
+    debtor = models.ForeignKey(User, related_name='debts', on_delete=models.CASCADE, db_index=False)
+    creditor = models.ForeignKey(User, related_name='credits', on_delete=models.CASCADE, db_index=False)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['debtor', 'creditor'], name='unique_pair_balance'),
+        ]
+        indexes = [
+            # "Owed from" lookups filter on creditor
+            models.Index(fields=['creditor', 'debtor'], include=['amount'], name='pairbalance_creditor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.debtor_id} owes {self.creditor_id}: {self.amount}"
+
+
+# What `debtor` owes `creditor` across the splits of one group's expenses:
+# PairBalance partitioned by group, so group balances and settle-up read only
+# the group's rows. Maintained alongside PairBalance by the ledger.
+class GroupBalance(models.Model):
+    # Covered by the unique constraint and index below, which lead with group
+    group = models.ForeignKey(Group, related_name='balances', on_delete=models.CASCADE, db_index=False)
+    debtor = models.ForeignKey(User, related_name='group_debts', on_delete=models.CASCADE, db_index=False)
+    creditor = models.ForeignKey(User, related_name='group_credits', on_delete=models.CASCADE, db_index=False)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'debtor', 'creditor'], name='unique_group_balance'),
+        ]
+        indexes = [
+            # "Owed from" lookups filter on group and creditor
+            models.Index(fields=['group', 'creditor', 'debtor'], include=['amount'], name='groupbalance_creditor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.debtor_id} owes {self.creditor_id} in group {self.group_id}: {self.amount}"
+
+
+# Incremental sync (see sync.py). Every expense a user pays or shares gets
+# the next number of the user's own sequence; clients ask for what came
+# after the last number they saw. `last_seq` is the last number handed out.
+class SyncSequence(models.Model):
+    user = models.OneToOneField(User, primary_key=True, related_name='sync_sequence', on_delete=models.CASCADE)
+    last_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.last_seq}"
+
+class SyncChange(models.Model):
+    # Indexed through unique_sync_change, which leads with user
+    user = models.ForeignKey(User, related_name='sync_changes', on_delete=models.CASCADE, db_index=False)
+    seq = models.BigIntegerField()
+    expense = models.ForeignKey(Expense, related_name='sync_changes', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            # Also the index for a user's changes after a sequence number
+            models.UniqueConstraint(fields=['user', 'seq'], name='unique_sync_change'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} #{self.seq}: expense {self.expense_id}"
+
+
+# Per-user monthly totals by split type, for reports. Maintained
+# incrementally by rollups.record_expenses; rebuild with backfill_rollups.
+# `month` is the first day of the month (in TIME_ZONE) the expenses were
+# created in; `count` is the number of expenses the user paid or shared.
+class MonthlyRollup(models.Model):
+    user = models.ForeignKey(User, related_name='monthly_rollups', on_delete=models.CASCADE, db_index=False)
+    month = models.DateField()
+    split_type = models.CharField(
+        max_length=10,
+        choices=[(split_type.value, split_type.name.capitalize()) for split_type in SplitType]
+    )
+    total_owed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for a user's months in order
+            models.UniqueConstraint(fields=['user', 'month', 'split_type'], name='unique_monthly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} {self.split_type}: owed {self.total_owed}, paid {self.total_paid}"
+
+
+# A background export (see jobs.py). The request that creates a job returns
+# at once; a worker thread writes the file under EXPORT_ROOT and records the
+# outcome here. Finished files are kept until `expires_at`, after which
+# purge_exports deletes the job and its file.
+class ExportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    BALANCE_SHEET = 'balance_sheet'
+    KIND_CHOICES = [(BALANCE_SHEET, 'Balance sheet')]
+
+    # Random ids, so a job's URL cannot be guessed from another's
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name='export_jobs', on_delete=models.CASCADE, db_index=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file_name = models.CharField(max_length=255, blank=True)
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # A user's active jobs, counted against EXPORT_MAX_ACTIVE_PER_USER
+            models.Index(fields=['user', 'status'], name='exportjob_user_status_idx'),
+            # purge_exports
+            models.Index(fields=['expires_at'], name='exportjob_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} export {self.id} for {self.user_id}: {self.status}"
+
+
+# A client-supplied Idempotency-Key for a write (see idempotency.py): the
+# hash of the request it was first sent with and the response to replay for
+# repeats. Inserted in the same transaction as the write, so a key exists
+# exactly when its write committed. Rows expire at `expires_at`;
+# purge_idempotency_keys deletes them.
+class IdempotencyKey(models.Model):
+    # Indexed through unique_idempotency_key, which leads with user
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE, db_index=False)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # SHA-256 of the method, path and body
+    status_code = models.PositiveSmallIntegerField()
+    response = models.TextField()  # compact JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            # purge_idempotency_keys
+            models.Index(fields=['expires_at'], name='idempotencykey_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.key}: {self.status_code}"
@@ -0,0 +1,53 @@
+from .models import ExpenseSplit, GroupBalance, MonthlyRollup, PairBalance, SyncChange
+
+# Querysets behind the read endpoints, kept in one place so the views and the
+# explain_queries command always look at the same SQL.
+
+
+def balances(group_id=None):
+    # The ledger rows overall, or within one group
+    if group_id is None:
+        return PairBalance.objects.all()
+    return GroupBalance.objects.filter(group=group_id)
+
+
+def owes_to_queryset(user_id, group_id=None):
+    # Amounts the user owes to others
+    return (
+        balances(group_id).filter(debtor=user_id)
+        .values('creditor__name', 'amount')
+        .order_by('-amount')
+    )
+
+
+def owed_from_queryset(user_id, group_id=None):
+    # Amounts owed to the user by others
+    return (
+        balances(group_id).filter(creditor=user_id)
+        .values('debtor__name', 'amount')
+        .order_by('-amount')
+    )
+
+
+def user_splits_queryset(user_id):
+    # The user's splits, projecting just the columns /expenses/user/ returns
+    return ExpenseSplit.objects.filter(user=user_id).values(
+        'amount_owed', 'split_type', 'percentage', 'expense__description', 'expense__created_at'
+    )
+
+
+def monthly_rollups_queryset(user_id, start_date=None, end_date=None):
+    # The user's rollups for the whole months overlapping the date range
+    queryset = MonthlyRollup.objects.filter(user=user_id)
+    if start_date:
+        queryset = queryset.filter(month__gte=start_date.replace(day=1))
+    if end_date:
+        queryset = queryset.filter(month__lte=end_date)
+    return queryset.order_by('month', 'split_type').values(
+        'month', 'split_type', 'total_owed', 'total_paid', 'count'
+    )
+
+
+def sync_changes_queryset(user_id, since):
+    # The user's changes after sequence number `since`, oldest first
+    return SyncChange.objects.filter(user=user_id, seq__gt=since).order_by('seq').values_list('seq', 'expense')
@@ -0,0 +1,88 @@
+import contextlib
+import contextvars
+import functools
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import response_cache
+
+# Read replicas.
+#
+# DATABASE_REPLICAS names aliases in DATABASES that replicate the default
+# (primary) database. Views decorated with read_from_replica run their queries
+# on one of them, picked at random per request. ReplicaRouter sends every
+# write, and every query outside those views, to the primary. Decorated views
+# must only read.
+#
+# Replicas lag behind the primary, so each expense write opens a
+# read-your-writes window of REPLICA_READ_YOUR_WRITES seconds, from the
+# commit, on the response cache scopes it invalidates: the users involved,
+# their groups and the overall listing. Reads of a scope inside its window go
+# to the primary. Users see their own changes right away, and the response
+# cache never stores pre-write replica data under the post-write version.
+# Windows live in the response cache's backend, so they only span workers
+# when that cache is shared.
+
+current_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # None falls back to the primary
+        return current_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+
+def written_key(scope):
+    return f'{settings.RESPONSE_CACHE_PREFIX}:written:{scope}'
+
+
+def record_writes(scopes):
+    # Open the read-your-writes window of scopes; called once a write commits
+    if settings.DATABASE_REPLICAS and settings.REPLICA_READ_YOUR_WRITES > 0:
+        response_cache.get_cache().set_many(
+            {written_key(scope): 1 for scope in scopes}, settings.REPLICA_READ_YOUR_WRITES
+        )
+
+
+def replica_for(scopes):
+    # A replica alias to read scopes from, or None for the primary
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if settings.REPLICA_READ_YOUR_WRITES > 0:
+        keys = [written_key(scope) for scope in [response_cache.EPOCH_SCOPE, *scopes]]
+        if response_cache.get_cache().get_many(keys):
+            return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextlib.contextmanager
+def reading_from(alias):
+    # Route the reads in the block to alias (None: the primary)
+    token = current_alias.set(alias)
+    try:
+        yield
+    finally:
+        current_alias.reset(token)
+
+
+def read_from_replica(per_user=True, scope=None):
+    # Run a read-only DRF view's queries on a replica unless the view's scope
+    # (see request_scope) was written recently. Apply it below api_view so
+    # that authentication stays on the primary.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            view_scope = response_cache.request_scope(request, args, kwargs, per_user, scope)
+            with reading_from(replica_for([view_scope])):
+                return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
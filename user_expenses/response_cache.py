@@ -0,0 +1,146 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from . import replicas
+from .metrics import registry
+
+# Cache of the response data of hot read endpoints, in the Django cache
+# configured by RESPONSE_CACHE_ALIAS.
+#
+# Entries are never deleted. Their keys embed version counters, and writers
+# bump the counters so later reads look under new keys: one counter per user
+# for views built from that user's splits and balances, one for the
+# all-expenses listing, one per group for its listing, and a global epoch for
+# wholesale changes such as a ledger rebuild. Superseded entries age out after RESPONSE_CACHE_TTL.
+#
+# Invalidating also opens the scopes' read-your-writes window (replicas.py).
+#
+# Only expense writes invalidate; a renamed user shows up in other users'
+# cached balances once those entries expire.
+
+OVERALL_SCOPE = 'overall'
+EPOCH_SCOPE = 'epoch'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def version_key(scope):
+    return f'{settings.RESPONSE_CACHE_PREFIX}:version:{scope}'
+
+
+def new_version():
+    # Counters start at the clock, so one that was evicted never restarts
+    # at a value that an old entry is still stored under
+    return time.time_ns()
+
+
+def current_versions(scopes):
+    cache = get_cache()
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), timeout=None)
+
+
+def invalidate(scopes):
+    # Bump now, so later reads in the current transaction miss, and again on
+    # commit, so nothing other requests cached from the pre-commit state
+    # in between is served afterwards.
+    scopes = list(scopes)
+    if not scopes:
+        return
+    bump_versions(scopes)
+    transaction.on_commit(lambda: committed(scopes))
+
+
+def committed(scopes):
+    bump_versions(scopes)
+    replicas.record_writes(scopes)
+
+
+def invalidate_users(user_ids, group_ids=()):
+    # An expense changed for these users (in these groups): their own views,
+    # the groups' and the overall listing
+    invalidate(
+        [user_scope(user_id) for user_id in sorted(set(user_ids))]
+        + [group_scope(group_id) for group_id in sorted(set(group_ids))]
+        + [OVERALL_SCOPE]
+    )
+
+
+def invalidate_all():
+    invalidate([EPOCH_SCOPE])
+
+
+def response_key(view_name, request, scope, versions):
+    # Keyed on the full URL, host included (the listing's next links are
+    # absolute URLs)
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.scheme}://{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    version = '.'.join(str(version) for version in versions)
+    return f'{settings.RESPONSE_CACHE_PREFIX}:{view_name}:{scope}:{version}:{digest}'
+
+
+def request_scope(request, args, kwargs, per_user=True, scope=None):
+    # The scope of a view's data: scope(request, *args, **kwargs) when given,
+    # else the user's for per_user views and the overall one for the others
+    if scope is not None:
+        return scope(request, *args, **kwargs)
+    return user_scope(request.user.id) if per_user else OVERALL_SCOPE
+
+
+def cached_response(view_name, per_user=True, scope=None):
+    # Cache successful GET responses of a DRF view. per_user views are keyed
+    # and invalidated per authenticated user; the others share one version.
+    # scope, if given, picks the scope from the view's arguments instead,
+    # e.g. lambda request, group_id: group_scope(group_id).
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED or request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            view_scope = request_scope(request, args, kwargs, per_user, scope)
+            key = response_key(view_name, request, view_scope, current_versions([EPOCH_SCOPE, view_scope]))
+            data = get_cache().get(key)
+            if data is not None:
+                registry.increment('response_cache_hits_total', view_name)
+                return Response(data)
+
+            registry.increment('response_cache_misses_total', view_name)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                get_cache().set(key, response.data, settings.RESPONSE_CACHE_TTL)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,128 @@
+import itertools
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import response_cache
+from .models import ExpenseSplit, MonthlyRollup
+from .upserts import increment_rows
+
+# Per-user monthly rollups (MonthlyRollup).
+#
+# For every user, month and split type: the total the user owes across their
+# splits, the total they paid for expenses, and how many expenses they paid
+# or shared. Expenses are folded in as they are created, in the transaction
+# that writes their splits, so a report reads one row per month and split
+# type instead of every split. rebuild_rollups recomputes the table from
+# ExpenseSplit.
+#
+# An expense's split type is that of its splits; expenses without splits have
+# none and are left out.
+
+KEY_FIELDS = ('user_id', 'month', 'split_type')
+
+
+def month_of(created_at):
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+def new_totals():
+    return {'total_owed': Decimal(0), 'total_paid': Decimal(0), 'count': 0}
+
+
+def add_expense(totals, payer_id, amount, created_at, shares):
+    # Fold one expense into totals ({(user_id, month, split_type): totals});
+    # shares is [(user_id, amount_owed, split_type)] for its splits.
+    if not shares:
+        return
+    month = month_of(created_at)
+    split_type = shares[0][2]
+    involved = {payer_id}
+    for user_id, amount_owed, _ in shares:
+        totals[(user_id, month, split_type)]['total_owed'] += amount_owed
+        involved.add(user_id)
+    totals[(payer_id, month, split_type)]['total_paid'] += amount
+    for user_id in involved:
+        totals[(user_id, month, split_type)]['count'] += 1
+
+
+def record_expenses(expenses_with_splits):
+    # Add saved expenses, given as [(expense, [ExpenseSplit])], to the rollups
+    totals = defaultdict(new_totals)
+    for expense, splits in expenses_with_splits:
+        add_expense(totals, expense.user_id, expense.amount, expense.created_at,
+                    [(split.user_id, split.amount_owed, split.split_type) for split in splits])
+    increment_rows(MonthlyRollup, KEY_FIELDS, totals)
+
+
+def expected_rollups(chunk_size=2000):
+    # Every rollup computed from ExpenseSplit, reading splits in expense order
+    totals = defaultdict(new_totals)
+    rows = (
+        ExpenseSplit.objects.order_by('expense_id', 'id')
+        .values_list('expense_id', 'expense__user_id', 'expense__amount', 'expense__created_at',
+                     'user_id', 'amount_owed', 'split_type')
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        _, payer_id, amount, created_at = group[0][:4]
+        add_expense(totals, payer_id, amount, created_at, [row[4:] for row in group])
+    return totals
+
+
+def current_rollups():
+    rows = MonthlyRollup.objects.values_list(*KEY_FIELDS, 'total_owed', 'total_paid', 'count')
+    return {
+        row[:3]: {'total_owed': row[3], 'total_paid': row[4], 'count': row[5]}
+        for row in rows
+    }
+
+
+def verify_rollups():
+    # Return [(key, stored, expected)] for every rollup that disagrees with
+    # ExpenseSplit. Zero rows and missing rows are treated as equal.
+    expected = expected_rollups()
+    current = current_rollups()
+    mismatches = []
+    for key in sorted(expected.keys() | current.keys()):
+        stored = current.get(key, new_totals())
+        actual = expected.get(key, new_totals())
+        if stored != actual:
+            mismatches.append((key, stored, actual))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_rollups(batch_size=1000):
+    MonthlyRollup.objects.all().delete()
+    MonthlyRollup.objects.bulk_create(
+        [
+            MonthlyRollup(user_id=user_id, month=month, split_type=split_type, **values)
+            for (user_id, month, split_type), values in expected_rollups().items()
+        ],
+        batch_size=batch_size,
+    )
+    response_cache.invalidate_all()
+    return MonthlyRollup.objects.count()
+
+
+def monthly_report_data(rows):
+    # Group rollup rows (ordered by month) into one entry per month with a
+    # breakdown by split type, plus totals over the whole range
+    months = []
+    for month, group in itertools.groupby(rows, key=lambda row: row['month']):
+        entry = {'month': month.strftime('%Y-%m'), **new_totals(), 'split_types': {}}
+        for row in group:
+            totals = {name: row[name] for name in ('total_owed', 'total_paid', 'count')}
+            entry['split_types'][row['split_type']] = totals
+            for name, value in totals.items():
+                entry[name] += value
+        months.append(entry)
+    return {
+        'months': months,
+        'total_owed': sum((month['total_owed'] for month in months), Decimal(0)),
+        'total_paid': sum((month['total_paid'] for month in months), Decimal(0)),
+    }
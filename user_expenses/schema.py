@@ -0,0 +1,54 @@
+import functools
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+
+# Swagger docs, kept out of worker startup.
+#
+# drf_yasg's schema view brings in its generator, codecs and spec validators,
+# so it is built by the first docs request rather than when the URLconf
+# loads. A document written by `manage.py build_schema` is served from
+# SWAGGER_SCHEMA_PATH as is, without generating it or importing the view.
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Expense Sharing API",  # API title
+        default_version='v1',  # API version
+        description="API documentation for the Expense Sharing Application",  # API description
+        contact=openapi.Contact(email="adityauttarwar29@gmail.com"),  # Support email for the API
+    )
+
+
+@functools.cache
+def swagger_ui_view():
+    from drf_yasg.views import get_schema_view
+    from rest_framework.permissions import AllowAny
+
+    schema_view = get_schema_view(
+        api_info(),
+        public=True,  # Public visibility
+        permission_classes=[AllowAny],  # Docs stay reachable without a token
+    )
+    return schema_view.with_ui('swagger', cache_timeout=0)
+
+
+def swagger_ui(request, *args, **kwargs):
+    # The Swagger UI page, and the document it loads from ?format=openapi
+    path = settings.SWAGGER_SCHEMA_PATH
+    if request.GET.get('format') == 'openapi' and path and os.path.exists(path):
+        return FileResponse(open(path, 'rb'), content_type='application/openapi+json')
+    return swagger_ui_view()(request, *args, **kwargs)
+
+
+def build_schema():
+    # The OpenAPI document as JSON bytes. Generated without a request, so it
+    # names no host and clients use the one they loaded it from.
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(api_info()).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
-from .models import User,Expense, ExpenseSplit
-from decimal import Decimal
+from .models import User,Expense, ExpenseSplit, ExportJob, Group, GroupMembership
+from . import ledger, response_cache, rollups, splitting, sync
+from django.db import transaction
+from django.urls import reverse
 from django.contrib.auth.password_validation import validate_password
 
 class LoginSerializer(serializers.Serializer):
@@ -33,73 +35,298 @@ class UserSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])
         user.save()
         return user
+
+class UserImportSerializer(UserSerializer):
+    # Validates one row of a bulk import; user_import checks email
+    # uniqueness for all rows with one query instead of one per row
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {**UserSerializer.Meta.extra_kwargs, 'email': {'validators': []}}
+
 class RepresentativeSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'name', 'mobile_number']
         
-class ExpenseSplitSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ExpenseSplit
-        fields = ['user', 'amount_owed', 'split_type', 'percentage']
+class PrefetchedRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves ids from a {pk: instance} map in the serializer context (under
+    # context_key) when one is given, so validating a batch of expenses costs
+    # one query per model instead of one per expense and split.
+    context_key = None
+
+    def to_internal_value(self, data):
+        instances = self.context.get(self.context_key)
+        if instances is None:
+            return super().to_internal_value(data)
+        try:
+            return instances[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class PrefetchedUserField(PrefetchedRelatedField):
+    context_key = 'users'
+
+class PrefetchedGroupField(PrefetchedRelatedField):
+    context_key = 'groups'
 
 class ExpenseSplitSerializer(serializers.ModelSerializer):
+    serializer_related_field = PrefetchedUserField
+
     class Meta:
         model = ExpenseSplit
         fields = ['user', 'amount_owed', 'split_type', 'percentage']
+        # Worked out by ExpenseSerializer.validate when left out of every split
+        extra_kwargs = {'amount_owed': {'required': False}}
 
 class ExpenseSerializer(serializers.ModelSerializer):
+    serializer_related_field = PrefetchedUserField
+    group = PrefetchedGroupField(queryset=Group.objects.all(), required=False, allow_null=True)
     splits = ExpenseSplitSerializer(many=True)
 
     class Meta:
         model = Expense
-        fields = ['id', 'user', 'amount', 'description', 'created_at', 'splits']
+        fields = ['id', 'user', 'amount', 'description', 'created_at', 'group', 'splits']
 
     def validate(self, data):
+        # Splits are checked and generated in integer cents (see splitting.py).
+        # amount_owed may be left out of every split to have the server work
+        # the shares out from the split type (and percentages).
         amount = data['amount']
         splits = data['splits']
-        total_amount = Decimal(0)
-        total_percentage = Decimal(0)
         split_type = None
 
+        if data.get('group') is not None:
+            request = self.context.get('request')
+            self.check_group_members(data['group'], [data['user']] + [split['user'] for split in splits],
+                                     requester=request.user if request is not None else None)
+
         for split in splits:
             if split_type is None:
                 split_type = split['split_type']  # Set the split type based on the first entry
             elif split['split_type'] != split_type:
                 raise serializers.ValidationError("All Splits do not have same Split type.")
 
-            if split['split_type'] == 'exact':
-                total_amount += split['amount_owed']
-            elif split['split_type'] == 'equal':
-                total_amount += split['amount_owed']
-            elif split['split_type'] == 'percentage':
-                if split['percentage'] is None:
-                    raise serializers.ValidationError("Percentage Value must be provided")
-                total_percentage += split['percentage']
-
-        # Validate exact splits sum
-        if split_type == 'exact' and total_amount != amount:
-            raise serializers.ValidationError(f"Total amount for 'exact' split is not equal the expense amount ({amount}).")
-
-        # Validate equal splits
-        if split_type == 'equal':
-            expected_amount = amount / len(splits)
-            for split in splits:
-                if split['amount_owed'] != expected_amount:
-                    raise serializers.ValidationError(f"Each split must be equal to {expected_amount} for 'equal' split type.")
-
-        # Validate percentage splits sum
-        if split_type == 'percentage' and total_percentage != 100:
-            raise serializers.ValidationError(f"Total percentage for 'percentage' split must equal 100% (currently {total_percentage}%).")
+            if split['split_type'] == 'percentage' and split.get('percentage') is None:
+                raise serializers.ValidationError("Percentage Value must be provided")
 
+        if split_type is None:
+            return data
+
+        owed = [split.get('amount_owed') for split in splits]
+        generate = all(value is None for value in owed)
+        if not generate and None in owed:
+            raise serializers.ValidationError("Provide 'amount_owed' for every split or for none of them.")
+
+        total = splitting.to_cents(amount)
+        shares = None if generate else [splitting.to_cents(value) for value in owed]
+
+        if split_type == 'exact':
+            if generate:
+                raise serializers.ValidationError("'amount_owed' must be provided for 'exact' splits.")
+            if sum(shares) != total:
+                raise serializers.ValidationError(f"Total amount for 'exact' split is not equal the expense amount ({amount}).")
+
+        elif split_type == 'equal':
+            if generate:
+                shares = splitting.equal_shares(total, len(splits))
+            elif not splitting.is_equal_split(total, shares):
+                expected = splitting.equal_shares(total, len(splits))
+                amounts = sorted({splitting.from_cents(share) for share in expected})
+                raise serializers.ValidationError(
+                    f"Each split must be {' or '.join(str(value) for value in amounts)} for 'equal' split type, "
+                    f"adding up to {amount}."
+                )
+
+        elif split_type == 'percentage':
+            basis_points = [splitting.to_basis_points(split['percentage']) for split in splits]
+            if sum(basis_points) != splitting.FULL_PERCENTAGE:
+                total_percentage = sum(split['percentage'] for split in splits)
+                raise serializers.ValidationError(f"Total percentage for 'percentage' split must equal 100% (currently {total_percentage}%).")
+            if generate:
+                shares = splitting.percentage_shares(total, basis_points)
+            elif not splitting.is_percentage_split(total, basis_points, shares):
+                raise serializers.ValidationError(
+                    f"Amounts owed for 'percentage' split must add up to {amount} and each be within a cent of its percentage."
+                )
+
+        if generate:
+            for split, amount_owed in zip(splits, splitting.to_amounts(shares)):
+                split['amount_owed'] = amount_owed
         return data
 
+    def check_group_members(self, group, users, requester=None):
+        # Everyone on a group expense, and the user writing it, must belong to
+        # the group, as for the group's read endpoints. A set of (group_id,
+        # user_id) memberships in the context saves the query.
+        memberships = self.context.get('memberships')
+        user_ids = {user.id for user in users}
+        checked = user_ids | ({requester.id} if requester is not None else set())
+        if memberships is None:
+            members = set(GroupMembership.objects.filter(group=group, user__in=checked).values_list('user', flat=True))
+        else:
+            members = {user_id for user_id in checked if (group.id, user_id) in memberships}
+        if requester is not None and requester.id not in members:
+            raise serializers.ValidationError(f"You are not a member of group {group.id}.")
+        outsiders = sorted(user_ids - members)
+        if outsiders:
+            raise serializers.ValidationError(
+                f"User(s) {', '.join(map(str, outsiders))} are not members of group {group.id}."
+            )
+
+    @transaction.atomic
     def create(self, validated_data):
         
         splits_data = validated_data.pop('splits')
         expense = Expense.objects.create(**validated_data)
+        create_splits([(expense, splits_data)])
+
+        return expense
+
+
+class ExpenseListSerializer(ExpenseSerializer):
+    # Read serializer for expense listings. `fields` restricts the output to a
+    # subset of ExpenseSerializer's fields (e.g. dropping the nested splits).
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class GroupSerializer(serializers.ModelSerializer):
+    # members: user ids to add on creation; the creator is always a member
+    members = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'created_by', 'created_at', 'members', 'member_count']
+        read_only_fields = ['created_by']
+
+    def validate_members(self, members):
+        members = set(members)
+        found = set(User.objects.filter(pk__in=members).values_list('pk', flat=True))
+        missing = sorted(members - found)
+        if missing:
+            raise serializers.ValidationError(f"Unknown user(s): {', '.join(map(str, missing))}")
+        return members
+
+    @transaction.atomic
+    def create(self, validated_data):
+        members = validated_data.pop('members', set()) | {validated_data['created_by'].id}
+        group = Group.objects.create(**validated_data)
+        add_members(group, members)
+        group.member_count = len(members)
+        return group
+
+
+def add_members(group, user_ids):
+    # Add users to a group, skipping those already in it
+    GroupMembership.objects.bulk_create(
+        [GroupMembership(group=group, user_id=user_id) for user_id in sorted(user_ids)],
+        ignore_conflicts=True,
+    )
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    # Status of a background export; download_url is set once it succeeded
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'params', 'status', 'row_count', 'error', 'created_at', 'started_at',
+                  'finished_at', 'expires_at', 'download_url']
+
+    def get_download_url(self, job):
+        if job.status != ExportJob.SUCCEEDED:
+            return None
+        path = reverse('export-download', args=[job.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request is not None else path
+
+
+def create_splits(expenses_with_splits):
+    # Write the splits of one or more saved expenses with a single bulk insert
+    # and fold them into the pairwise balance ledger, monthly rollups and the
+    # sync change feed.
+    created = [
+        (expense, [ExpenseSplit(expense=expense, **split_data) for split_data in splits_data])
+        for expense, splits_data in expenses_with_splits
+    ]
+    splits = [split for _, expense_splits in created for split in expense_splits]
+    ExpenseSplit.objects.bulk_create(splits)
+    ledger.record_expense_splits(splits)
+    rollups.record_expenses(created)
+    sync.record_expenses(created)
+    response_cache.invalidate_users(
+        [expense.user_id for expense, _ in created] + [split.user_id for split in splits],
+        [expense.group_id for expense, _ in created if expense.group_id is not None],
+    )
+    return splits
+
+
+@transaction.atomic
+def create_expenses(validated_items):
+    # Bulk counterpart of ExpenseSerializer.create for already validated data:
+    # a fixed number of queries no matter how many expenses or splits.
+    expenses = []
+    splits_data = []
+    for data in validated_items:
+        data = dict(data)
+        splits_data.append(data.pop('splits'))
+        expenses.append(Expense(**data))
+
+    Expense.objects.bulk_create(expenses)
+    create_splits(zip(expenses, splits_data))
+    return expenses
+
+
+def referenced_group_ids(items):
+    # Collect every group id mentioned in raw expense payloads
+    ids = set()
+    for item in items:
+        if isinstance(item, dict):
+            try:
+                ids.add(int(item.get('group')))
+            except (TypeError, ValueError):
+                pass
+    return ids
+
+
+def batch_context(items, request=None):
+    # Serializer context resolving every user and group referenced by raw
+    # expense payloads, and their memberships (the requesting user's too),
+    # with three queries up front
+    user_ids = referenced_user_ids(items)
+    if request is not None:
+        user_ids.add(request.user.id)
+    users = User.objects.in_bulk(user_ids)
+    groups = Group.objects.in_bulk(referenced_group_ids(items))
+    memberships = set()
+    if groups:
+        memberships = set(
+            GroupMembership.objects.filter(group__in=list(groups), user__in=list(users))
+            .values_list('group', 'user')
+        )
+    return {'users': users, 'groups': groups, 'memberships': memberships, 'request': request}
+
 
-        for split_data in splits_data:
-            ExpenseSplit.objects.create(expense=expense, **split_data)
+def referenced_user_ids(items):
+    # Collect every user id mentioned in raw (unvalidated) expense payloads
+    # so they can be fetched with a single query before validation.
+    ids = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        candidates = [item.get('user')]
+        splits = item.get('splits')
+        if isinstance(splits, list):
+            candidates.extend(split.get('user') for split in splits if isinstance(split, dict))
+        for candidate in candidates:
+            try:
+                ids.add(int(candidate))
+            except (TypeError, ValueError):
+                pass
+    return ids
 
-        return expense
\ No newline at end of file
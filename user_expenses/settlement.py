@@ -0,0 +1,56 @@
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+from .models import PairBalance
+
+# Debt simplification ("settle up").
+#
+# Only each user's net position matters for settling, not who they shared
+# which expense with, so the pairwise ledger is collapsed into one signed
+# balance per user and re-settled with as few transfers as the greedy below
+# finds: repeatedly match the largest creditor with the largest debtor. Each
+# step settles at least one of the two, so n users never need more than n - 1
+# transfers, and with heaps the whole pass is O(n log n).
+
+
+def net_balances(pair_balances=None):
+    # {user_id: Decimal}; positive means the user is owed money overall.
+    # Summed in Python rather than with two SQL aggregates: every pair adds
+    # and subtracts the very same amount, so the result sums to exactly zero
+    # even on backends that add decimals as floats (SQLite).
+    if pair_balances is None:
+        pair_balances = PairBalance.objects.all()
+    balances = defaultdict(Decimal)
+    for debtor, creditor, amount in pair_balances.values_list('debtor', 'creditor', 'amount'):
+        balances[creditor] += amount
+        balances[debtor] -= amount
+    return balances
+
+
+def simplify_debts(balances):
+    # Return [(debtor_id, creditor_id, amount)] settling every balance.
+    # Amounts stay exact Decimals; the balances must sum to zero.
+    if sum(balances.values(), Decimal(0)) != 0:
+        raise ValueError('Balances do not sum to zero')
+
+    # Max-heaps keyed on the outstanding amount; the user id breaks ties so
+    # the result is deterministic
+    creditors = [(-amount, user) for user, amount in balances.items() if amount > 0]
+    debtors = [(amount, user) for user, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        credit, debt = -credit, -debt
+        amount = min(credit, debt)
+        transfers.append((debtor, creditor, amount))
+
+        if credit > amount:
+            heapq.heappush(creditors, (amount - credit, creditor))
+        if debt > amount:
+            heapq.heappush(debtors, (amount - debt, debtor))
+    return transfers
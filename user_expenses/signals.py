@@ -0,0 +1,21 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .middleware import time_query
+from .models import User
+from .user_cache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Fires on every (re)connect of the same wrapper, so add the hook once.
+    # Insert it first: connection.execute_wrapper() pops from the end.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+# Split arithmetic in integer cents.
+#
+# Amounts are converted to whole cents once, split with integer arithmetic,
+# and converted back, so shares always add up to the expense amount exactly
+# and a split between thousands of users costs a few integer operations per
+# share. Where a total does not divide evenly, the leftover cents go to the
+# shares with the largest remainders (largest remainder method); ties go to
+# the earlier participant, so the result is deterministic. 100.00 split
+# equally three ways is 33.34, 33.33, 33.33.
+#
+# Percentages are handled as basis points (hundredths of a percent), which is
+# the precision ExpenseSplit.percentage stores.
+
+FULL_PERCENTAGE = 10000  # 100% in basis points
+CENT = Decimal('0.01')
+
+
+class SplitError(ValueError):
+    pass
+
+
+def to_cents(amount):
+    # Decimal with at most two decimal places -> int
+    cents = amount.scaleb(2)
+    if cents != cents.to_integral_value():
+        raise SplitError(f'{amount} has more than two decimal places')
+    return int(cents)
+
+
+def from_cents(cents):
+    return Decimal(cents) * CENT
+
+
+def to_amounts(shares):
+    # from_cents over a list of shares, converting each distinct value once;
+    # an equal split has at most two
+    amounts = {share: from_cents(share) for share in set(shares)}
+    return [amounts[share] for share in shares]
+
+
+def to_basis_points(percentage):
+    # Decimal percentage with at most two decimal places -> int
+    return to_cents(percentage)
+
+
+def equal_shares(total, count):
+    # `total` cents split into `count` shares differing by at most a cent
+    if count <= 0:
+        raise SplitError('An equal split needs at least one participant')
+    base, extra = divmod(total, count)
+    return [base + 1] * extra + [base] * (count - extra)
+
+
+def weighted_shares(total, weights):
+    # `total` cents split in proportion to non-negative integer weights
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise SplitError('Split weights must add up to more than zero')
+    shares = [total * weight // weight_sum for weight in weights]
+    leftover = total - sum(shares)
+    if leftover:
+        remainders = [total * weight % weight_sum for weight in weights]
+        # Stable sort: among equal remainders the earlier index comes first
+        for index in sorted(range(len(shares)), key=remainders.__getitem__, reverse=True)[:leftover]:
+            shares[index] += 1
+    return shares
+
+
+def percentage_shares(total, basis_points):
+    if sum(basis_points) != FULL_PERCENTAGE:
+        raise SplitError('Percentages must add up to 100')
+    return weighted_shares(total, basis_points)
+
+
+def is_equal_split(total, shares):
+    # Any order of equal_shares(total, len(shares)) is accepted
+    return bool(shares) and sum(shares) == total and max(shares) - min(shares) <= 1
+
+
+def is_percentage_split(total, basis_points, shares):
+    # Shares must add up to the total and each be within a cent of its exact
+    # proportion, so any consistent rounding is accepted
+    if sum(shares) != total:
+        return False
+    return all(
+        abs(share * FULL_PERCENTAGE - total * points) < FULL_PERCENTAGE
+        for share, points in zip(shares, basis_points)
+    )
@@ -0,0 +1,124 @@
+import base64
+import binascii
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from .models import Expense, ExpenseSplit, SyncChange, SyncSequence
+
+# Incremental sync for clients that keep a local copy of their expenses.
+#
+# When an expense is written, every user involved (the payer and everyone in
+# its splits) gets a SyncChange numbered from their own SyncSequence, in the
+# transaction that writes the splits. The counters are locked in user id
+# order while numbers are handed out, so each user's numbers commit in order
+# and a client that has seen number n has seen everything before it. A sync
+# reads the user's changes after the client's token through the
+# (user, seq) index, so its cost follows new activity, not total history.
+#
+# The token is the last number the client has seen; an empty token starts
+# from the beginning.
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(seq):
+    return base64.urlsafe_b64encode(str(seq).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    if not token:
+        return 0
+    try:
+        seq = int(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+    except (ValueError, UnicodeError, binascii.Error):
+        raise InvalidToken('Invalid sync token')
+    if seq < 0:
+        raise InvalidToken('Invalid sync token')
+    return seq
+
+
+def allocate_sequences(counts):
+    # Reserve counts[user_id] numbers for each user; returns {user_id: first
+    # reserved number}. Must run inside a transaction.
+    if not counts:
+        return {}
+    users = sorted(counts)
+    SyncSequence.objects.bulk_create([SyncSequence(user_id=user_id) for user_id in users], ignore_conflicts=True)
+    current = dict(
+        SyncSequence.objects.select_for_update().filter(user__in=users).order_by('user')
+        .values_list('user', 'last_seq')
+    )
+    SyncSequence.objects.filter(user__in=users).update(last_seq=Case(
+        *[When(user=user_id, then=Value(current[user_id] + counts[user_id])) for user_id in users],
+    ))
+    return {user_id: current[user_id] + 1 for user_id in users}
+
+
+def record_expenses(expenses_with_splits):
+    # Add a change for every user involved in saved expenses, given as
+    # [(expense, [ExpenseSplit])], in that order
+    expenses_by_user = defaultdict(list)
+    for expense, splits in expenses_with_splits:
+        for user_id in sorted({expense.user_id} | {split.user_id for split in splits}):
+            expenses_by_user[user_id].append(expense.id)
+
+    first = allocate_sequences({user_id: len(ids) for user_id, ids in expenses_by_user.items()})
+    SyncChange.objects.bulk_create([
+        SyncChange(user_id=user_id, seq=first[user_id] + offset, expense_id=expense_id)
+        for user_id, ids in expenses_by_user.items()
+        for offset, expense_id in enumerate(ids)
+    ])
+
+
+@transaction.atomic
+def rebuild_changes(batch_size=1000):
+    # Renumber every user's changes from the expenses and splits, in expense
+    # id order. Numbers start over, so clients must sync from an empty token
+    # afterwards.
+    SyncChange.objects.all().delete()
+    SyncSequence.objects.all().delete()
+    involved = defaultdict(set)
+    for expense_id, user_id in Expense.objects.values_list('id', 'user').iterator(chunk_size=batch_size):
+        involved[expense_id].add(user_id)
+    for expense_id, user_id in ExpenseSplit.objects.values_list('expense', 'user').iterator(chunk_size=batch_size):
+        involved[expense_id].add(user_id)
+    expenses_by_user = defaultdict(list)
+    for expense_id in sorted(involved):
+        for user_id in sorted(involved[expense_id]):
+            expenses_by_user[user_id].append(expense_id)
+
+    SyncChange.objects.bulk_create(
+        [
+            SyncChange(user_id=user_id, seq=seq, expense_id=expense_id)
+            for user_id, ids in expenses_by_user.items()
+            for seq, expense_id in enumerate(ids, start=1)
+        ],
+        batch_size=batch_size,
+    )
+    SyncSequence.objects.bulk_create(
+        [SyncSequence(user_id=user_id, last_seq=len(ids)) for user_id, ids in expenses_by_user.items()],
+        batch_size=batch_size,
+    )
+    return SyncChange.objects.count()
+
+
+def balance_deltas(user_id, expenses):
+    # [{'user', 'amount'}] by which the user's balance with each other user
+    # changed over serialized expenses; positive means owed to the user
+    deltas = defaultdict(Decimal)
+    for expense in expenses:
+        payer = expense['user']
+        for split in expense['splits']:
+            if split['user'] == payer:
+                continue
+            if payer == user_id:
+                deltas[split['user']] += Decimal(split['amount_owed'])
+            elif split['user'] == user_id:
+                deltas[payer] -= Decimal(split['amount_owed'])
+    return [{'user': other, 'amount': amount} for other, amount in sorted(deltas.items()) if amount]
+
@@ -1,3 +1,1669 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User as AuthUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import Count, Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from . import analytics, async_views, idempotency, jobs, ledger, replicas, response_cache, rollups, splitting, sync, throttling, views
+from .benchmarks import HEAVY_MODULES, boot_worker, seed_dataset
+from .enums import SplitType
+from .fast_serializers import expense_rows
+from .metrics import registry
+from .models import (User, Expense, ExpenseSplit, ExportJob, Group, GroupBalance, GroupMembership, IdempotencyKey,
+                     MonthlyRollup, PairBalance, SyncChange, SyncSequence)
+from .renderers import ORJSONRenderer
+from .serializers import ExpenseListSerializer, ExpenseSerializer
+from .settlement import net_balances, simplify_debts
+from .user_import import hash_passwords, import_users
+from .user_cache import user_cache
+from .views import generate_jwt_token
+
+
+def make_user(name):
+    user = User(name=name, email=f'{name}@example.com', mobile_number='9999999999')
+    user.set_password('s3cure-Passw0rd')
+    user.save()
+    return user
+
+
+def make_users(n):
+    # n users without usable passwords, bulk-created as user0..user<n-1>
+    return User.objects.bulk_create([
+        User(name=f'user{i}', email=f'user{i}@example.com', mobile_number='9999999999', password='!')
+        for i in range(n)
+    ])
+
+
+def auth_header(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {generate_jwt_token(user)}'}
+
+
+def expense_payload(payer, participants, amount='30.00', split_type='equal', group=None):
+    # create_expense request body. participants are users, whose shares the
+    # API works out, or (user, amount_owed) pairs.
+    splits = []
+    for participant in participants:
+        if isinstance(participant, User):
+            splits.append({'user': participant.id, 'split_type': split_type})
+        else:
+            user, owed = participant
+            splits.append({'user': user.id, 'amount_owed': owed, 'split_type': split_type})
+    payload = {'user': payer.id, 'amount': amount, 'description': 'Dinner', 'splits': splits}
+    if group is not None:
+        payload['group'] = group.id
+    return payload
+
+
+class BaseTestCase(TestCase):
+    def setUp(self):
+        # User ids are reused between tests, so never carry cached users or
+        # responses over
+        user_cache.clear()
+        cache.clear()
+        throttling.local_buckets.clear()
+
+    def post_expense(self, payload, user, **headers):
+        return self.client.post(reverse('create_expense'), payload, content_type='application/json',
+                                **auth_header(user), **headers)
+
+    def create_expense(self, payer, participants, user=None, **kwargs):
+        # Create an expense_payload as `user` (the payer by default) and
+        # return the created expense
+        response = self.post_expense(expense_payload(payer, participants, **kwargs), user or payer)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+
+class PairBalanceLedgerTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        cls.carol = make_user('carol')
+
+    def test_expense_creation_updates_ledger(self):
+        self.create_expense(self.alice, [(self.alice, '30.00'), (self.bob, '30.00'), (self.carol, '30.00')],
+                            amount='90.00', split_type='exact')
+        self.create_expense(self.alice, [(self.bob, '20.00')], amount='20.00', split_type='exact')
+        self.create_expense(self.bob, [(self.alice, '10.00')], amount='10.00', split_type='exact')
+
+        balances = ledger.current_balances()
+        self.assertEqual(balances[(self.bob.id, self.alice.id)], Decimal('50.00'))
+        self.assertEqual(balances[(self.carol.id, self.alice.id)], Decimal('30.00'))
+        self.assertEqual(balances[(self.alice.id, self.bob.id)], Decimal('10.00'))
+        self.assertNotIn((self.alice.id, self.alice.id), balances)
+        self.assertEqual(ledger.verify_balances(), [])
+
+    def test_balance_view_reads_ledger(self):
+        self.create_expense(self.alice, [(self.alice, '60.00'), (self.bob, '30.00'), (self.carol, '60.00')],
+                            amount='150.00', split_type='exact')
+        response = self.client.get(reverse('balance'), **auth_header(self.alice))
+        self.assertEqual(response.status_code, 200)
+        owed_from = {item['from_user']: Decimal(item['total_owed']) for item in response.json()['owed_from']}
+        self.assertEqual(owed_from, {'carol': Decimal('60.00'), 'bob': Decimal('30.00')})
+        self.assertEqual(response.json()['owes_to'], [])
+
+    def test_rebuild_and_verify_command(self):
+        self.create_expense(self.alice, [(self.bob, '20.00')], amount='20.00', split_type='exact')
+        PairBalance.objects.update(amount=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', '--verify', stdout=StringIO())
+
+        call_command('rebuild_balances', stdout=StringIO())
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(PairBalance.objects.get().amount, Decimal('20.00'))
+
+
+class BatchExpenseTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'user{i}') for i in range(30)]
+        cls.payer = cls.users[0]
+
+    def post_batch(self, items, mode=None):
+        url = reverse('create_expenses_batch')
+        if mode:
+            url += f'?mode={mode}'
+        return self.client.post(url, items, content_type='application/json', **auth_header(self.payer))
+
+    def test_partial_mode_creates_valid_items(self):
+        invalid = expense_payload(self.payer, self.users[:3])
+        invalid['splits'][0]['user'] = 999999
+        response = self.post_batch([expense_payload(self.payer, self.users[:3]), invalid], mode='partial')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.json()['created']], [0])
+        self.assertEqual([item['index'] for item in response.json()['errors']], [1])
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(ExpenseSplit.objects.count(), 3)
+        self.assertEqual(ledger.verify_balances(), [])
+
+    def test_atomic_mode_rejects_whole_batch(self):
+        invalid = expense_payload(self.payer, [(user, '10.00') for user in self.users[:3]], amount='31.00')
+        response = self.post_batch([expense_payload(self.payer, self.users[:3]), invalid], mode='atomic')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Expense.objects.count(), 0)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        user_cache.get(self.payer.id)
+        small = [expense_payload(self.payer, self.users[:3])]
+        # Kept under SQLite's bulk insert batch size so the comparison holds on every backend
+        large = [expense_payload(self.payer, self.users[:30]) for _ in range(6)]
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.assertEqual(self.post_batch(small).status_code, 201)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.assertEqual(self.post_batch(large).status_code, 201)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(ExpenseSplit.objects.count(), 3 + 6 * 30)
+        self.assertEqual(ledger.verify_balances(), [])
+
+
+def seed_expenses(users, count, participants, amount_owed=Decimal('5.00')):
+    # Bulk-insert `count` expenses rotating the payer through `users`, each
+    # split equally between `participants` of them, then rebuild the ledger.
+    expenses = Expense.objects.bulk_create([
+        Expense(user=users[i % len(users)], amount=amount_owed * participants, description=f'Expense {i}')
+        for i in range(count)
+    ])
+    ExpenseSplit.objects.bulk_create([
+        ExpenseSplit(expense=expense, user=users[(i + j) % len(users)], amount_owed=amount_owed, split_type='equal')
+        for i, expense in enumerate(expenses)
+        for j in range(participants)
+    ], batch_size=500)
+    ledger.rebuild_balances()
+
+
+class QueryCountTests(BaseTestCase):
+    # Every read endpoint must issue the same number of queries whether the
+    # user has a handful of splits or thousands of them.
+    endpoints = ['balance', 'user-expenses', 'overall-expenses', 'download-balance-sheet']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(50)
+        cls.user = cls.users[0]
+
+    def count_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), **auth_header(self.user))
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, name)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        user_cache.get(self.user.id)
+        seed_expenses(self.users, count=5, participants=4)
+        small = {name: self.count_queries(name) for name in self.endpoints}
+
+        seed_expenses(self.users, count=300, participants=20)
+        self.assertGreater(ExpenseSplit.objects.filter(user=self.user).count(), 100)
+        self.assertGreater(ExpenseSplit.objects.count(), 6000)
+        large = {name: self.count_queries(name) for name in self.endpoints}
+
+        self.assertEqual(small, large)
+
+
+class BalanceSheetExportTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(5)
+        cls.user = cls.users[0]
+        seed_expenses(cls.users, count=40, participants=3)
+
+    def download(self, **params):
+        return self.client.get(reverse('download-balance-sheet'), params, **auth_header(self.user))
+
+    def test_streamed_export_matches_buffered_export(self):
+        streamed = self.download(stream='true')
+        buffered = self.download(stream='false')
+
+        self.assertTrue(streamed.streaming)
+        self.assertFalse(buffered.streaming)
+        body = b''.join(streamed.streaming_content)
+        self.assertEqual(body, buffered.content)
+        self.assertEqual(len(body.decode().splitlines()), 1 + ExpenseSplit.objects.filter(user=self.user).count())
+
+    def test_rows_are_labelled_by_who_paid(self):
+        payers = dict(Expense.objects.values_list('description', 'user__name'))
+        rows = list(csv.reader(b''.join(self.download(stream='true').streaming_content).decode().splitlines()))[1:]
+        labels = {row[-1] for row in rows}
+        self.assertIn(f'owed from {self.user.name}', labels)  # the requester's own expenses
+        self.assertIn('owed to user4', labels)
+        for row in rows:
+            payer = payers[row[0]]
+            expected = f'owed from {self.user.name}' if payer == self.user.name else f'owed to {payer}'
+            self.assertEqual(row[-1], expected)
+
+    def test_date_range_filters(self):
+        old = Expense.objects.order_by('id')[:10]
+        Expense.objects.filter(id__in=[expense.id for expense in old]).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        cutoff = (timezone.now() - timedelta(days=1)).date().isoformat()
+
+        recent = b''.join(self.download(start_date=cutoff).streaming_content).decode().splitlines()
+        older = b''.join(self.download(end_date=cutoff).streaming_content).decode().splitlines()
+        total = ExpenseSplit.objects.filter(user=self.user).count()
+        self.assertEqual(len(recent) - 1 + len(older) - 1, total)
+        self.assertGreater(len(older), 1)
+
+    def test_invalid_date_is_rejected(self):
+        self.assertEqual(self.download(start_date='yesterday').status_code, 400)
+
+
+class OverallExpensesPaginationTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(4)
+        seed_expenses(cls.users, count=25, participants=2)
+        # Give a run of expenses the same timestamp so the id tiebreak is exercised
+        tied = Expense.objects.order_by('id').values_list('id', flat=True)[5:15]
+        Expense.objects.filter(id__in=list(tied)).update(created_at=timezone.now())
+
+    def get(self, url=None, **params):
+        response = self.client.get(url or reverse('overall-expenses'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_cover_every_expense_once_in_order(self):
+        seen = []
+        page = self.get(limit=4)
+        while True:
+            seen.extend(page['results'])
+            if not page['next']:
+                break
+            page = self.get(page['next'])
+
+        expected = list(Expense.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([expense['id'] for expense in seen], expected)
+
+    def test_fields_projection_skips_splits(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.get(fields='id,amount', limit=10)
+        self.assertEqual(set(page['results'][0]), {'id', 'amount'})
+        self.assertEqual(len(queries), 1)
+
+        page = self.get(limit=1)
+        self.assertEqual(len(page['results'][0]['splits']), 2)
+
+    def test_filters(self):
+        payer = self.users[1]
+        page = self.get(user=payer.id, limit=100)
+        self.assertEqual({expense['user'] for expense in page['results']}, {payer.id})
+        self.assertEqual(len(page['results']), Expense.objects.filter(user=payer).count())
+
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.get(start_date=tomorrow)['results'], [])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('overall-expenses'), {'cursor': 'garbage'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('overall-expenses'), {'fields': 'secret'}).status_code, 400)
+
+
+class JWTAuthenticationTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(name='alice', email='alice@example.com', mobile_number='9999999999', password='!')
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_warm_request_resolves_user_without_queries(self):
+        url = reverse('user-expenses')
+        with CaptureQueriesContext(connection) as cold:
+            self.assertEqual(self.client.get(url, **auth_header(self.user)).status_code, 200)
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.client.get(url, **auth_header(self.user)).status_code, 200)
+
+        # Cold: user lookup + splits; warm: splits only
+        self.assertEqual(len(cold), 2)
+        self.assertEqual(len(warm), 1)
+
+    def test_saving_user_invalidates_cache(self):
+        url = reverse('download-balance-sheet')
+        self.client.get(url, **auth_header(self.user))
+        self.user.name = 'alicia'
+        self.user.save()
+
+        response = self.client.get(url, **auth_header(self.user))
+        self.assertIn('balance_sheet_alicia.csv', response['Content-Disposition'])
+
+    def test_rejects_missing_and_invalid_tokens(self):
+        url = reverse('balance')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer not-a-token').status_code, 401)
+
+        expired = jwt.encode({'user_id': self.user.id, 'exp': 0}, settings.SECRET_KEY, algorithm='HS256')
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {expired}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Signature expired')
+
+    def test_public_endpoints_need_no_token(self):
+        self.assertEqual(self.client.get(reverse('overall-expenses')).status_code, 200)
+        response = self.client.post(reverse('login'), {'email': 'nobody@example.com', 'password': 'x'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SettlementTests(BaseTestCase):
+    def assert_settles(self, balances, transfers):
+        remaining = dict(balances)
+        for debtor, creditor, amount in transfers:
+            self.assertGreater(amount, 0)
+            self.assertNotEqual(debtor, creditor)
+            remaining[debtor] += amount
+            remaining[creditor] -= amount
+        self.assertTrue(all(amount == 0 for amount in remaining.values()), remaining)
+        self.assertLessEqual(len(transfers), max(0, sum(1 for amount in balances.values() if amount) - 1))
+
+    def test_transfers_conserve_every_balance(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            size = rng.randint(1, 60)
+            cents = [rng.choice([0, rng.randint(-100000, 100000)]) for _ in range(size - 1)]
+            cents.append(-sum(cents))
+            balances = {user: Decimal(amount).scaleb(-2) for user, amount in enumerate(cents)}
+            self.assert_settles(balances, simplify_debts(balances))
+
+    def test_rejects_unbalanced_input(self):
+        with self.assertRaises(ValueError):
+            simplify_debts({1: Decimal('1.00'), 2: Decimal('-0.99')})
+
+    def test_settle_up_endpoint_collapses_chains(self):
+        alice, bob, carol = User.objects.bulk_create([
+            User(name=name, email=f'{name}@example.com', mobile_number='9999999999', password='!')
+            for name in ('alice', 'bob', 'carol')
+        ])
+        # carol owes bob 10 and bob owes alice 10: carol can pay alice directly
+        ledger.apply_deltas({(carol.id, bob.id): Decimal('10.00'), (bob.id, alice.id): Decimal('10.00')})
+
+        response = self.client.get(reverse('settle-up'), **auth_header(alice))
+        self.assertEqual(response.status_code, 200)
+        transfers = response.json()['transfers']
+        self.assertEqual(len(transfers), 1)
+        self.assertEqual((transfers[0]['from_user'], transfers[0]['to_user']), ('carol', 'alice'))
+        self.assertEqual(Decimal(transfers[0]['amount']), Decimal('10.00'))
+
+        # Users only see the transfers they pay or receive
+        self.assertEqual(self.client.get(reverse('settle-up'), **auth_header(carol)).json()['transfers'], transfers)
+        self.assertEqual(self.client.get(reverse('settle-up'), **auth_header(bob)).json(), {'transfers': []})
+
+
+class SeedDatasetTests(BaseTestCase):
+    def test_seeded_expenses_are_valid(self):
+        seed_dataset(
+            20, 60, random.Random(3),
+            split_sizes={2: 1, 7: 1},
+            split_types={SplitType.EQUAL: 1, SplitType.EXACT: 1, SplitType.PERCENTAGE: 1},
+            days=90,
+        )
+        self.assertEqual(Expense.objects.count(), 60)
+        for expense in Expense.objects.prefetch_related('splits'):
+            data = ExpenseSerializer(expense).data
+            data['splits'] = [dict(split) for split in data['splits']]
+            self.assertTrue(ExpenseSerializer(data=data).is_valid(), data)
+        self.assertGreater(Expense.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).count(), 0)
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(rollups.verify_rollups(), [])
+
+    def test_seeding_leaves_existing_data_alone(self):
+        existing = seed_dataset(5, 20, random.Random(1), split_sizes={3: 1}, prefix='old')
+        changes = list(SyncChange.objects.values_list('user', 'seq', 'expense'))
+        scopes = [response_cache.user_scope(user.id) for user in existing]
+        versions = response_cache.current_versions(scopes)
+        overall = response_cache.current_versions([response_cache.OVERALL_SCOPE])
+
+        created = seed_dataset(6, 30, random.Random(2), split_sizes={2: 1, 3: 1}, days=30, groups=2, prefix='new')
+
+        # Earlier sync numbers are kept and the new users' feeds start at 1
+        self.assertTrue(set(changes) <= set(SyncChange.objects.values_list('user', 'seq', 'expense')))
+        new_ids = [user.id for user in created]
+        self.assertEqual(SyncChange.objects.filter(user__in=new_ids, seq=1).count(), len(new_ids))
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(ledger.verify_group_balances(), [])
+        self.assertEqual(rollups.verify_rollups(), [])
+
+        # The seeded users' cached responses are invalidated, not the others'
+        self.assertEqual(response_cache.current_versions(scopes), versions)
+        self.assertNotEqual(response_cache.current_versions([response_cache.OVERALL_SCOPE]), overall)
+
+
+class PerformanceMiddlewareTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_sampled_request_is_timed_and_exported(self):
+        user = User.objects.create(name='alice', email='alice@example.com', mobile_number='9999999999', password='!')
+        response = self.client.get(reverse('balance'), **auth_header(user))
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('expense_api_request_duration_seconds_count{view="balance"} 1', metrics)
+        self.assertIn('expense_api_db_queries_sum{view="balance"} 3', metrics)
+        self.assertIn('expense_api_request_duration_seconds_window{view="balance",quantile="0.95"}', metrics)
+        self.assertNotIn('view="metrics"', metrics)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_recorded(self):
+        response = self.client.get(reverse('overall-expenses'))
+        self.assertNotIn('Server-Timing', response)
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertNotIn('request_duration_seconds_count{view="overall-expenses"}', metrics)
+
+
+class ResponseCacheTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        cls.carol = make_user('carol')
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def get(self, name, user=None, **params):
+        headers = auth_header(user) if user else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), params, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(queries)
+
+    def test_repeat_read_is_served_from_cache(self):
+        first, _ = self.get('balance', self.alice)
+        second, queries = self.get('balance', self.alice)
+        self.assertEqual(second, first)
+        self.assertEqual(queries, 0)
+
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('expense_api_response_cache_hits_total{view="balance"} 1', metrics)
+        self.assertIn('expense_api_response_cache_misses_total{view="balance"} 1', metrics)
+
+    def test_expense_invalidates_payer_and_participants_only(self):
+        for user in (self.alice, self.bob, self.carol):
+            self.get('balance', user)
+            self.get('user-expenses', user)
+
+        self.create_expense(self.alice, [self.alice, self.bob], amount='20.00')
+
+        balance, queries = self.get('balance', self.alice)
+        self.assertGreater(queries, 0)
+        self.assertEqual(balance['owed_from'], [{'from_user': 'bob', 'total_owed': 10.0}])
+        splits, queries = self.get('user-expenses', self.bob)
+        self.assertGreater(queries, 0)
+        self.assertEqual(len(splits), 1)
+
+        self.assertEqual(self.get('balance', self.carol)[1], 0)
+        self.assertEqual(self.get('user-expenses', self.carol)[1], 0)
+
+    def test_listing_is_keyed_on_query_parameters_and_invalidated_by_any_expense(self):
+        self.create_expense(self.alice, [self.bob])
+        self.create_expense(self.bob, [self.carol])
+        self.assertEqual(len(self.get('overall-expenses', limit=1)[0]['results']), 1)
+        self.assertEqual(len(self.get('overall-expenses', limit=2)[0]['results']), 2)
+        self.assertEqual(self.get('overall-expenses', limit=2)[1], 0)
+
+        self.create_expense(self.carol, [self.alice])
+        page, queries = self.get('overall-expenses', limit=2)
+        self.assertGreater(queries, 0)
+        self.assertEqual(page['results'][0]['user'], self.carol.id)
+
+    def test_entries_cached_before_commit_are_dropped_on_commit(self):
+        self.get('balance', self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(self.alice, [self.bob])
+            # A read cached while the transaction is still open
+            self.get('balance', self.alice)
+        self.assertGreater(self.get('balance', self.alice)[1], 0)
+
+    def test_ledger_rebuild_invalidates_everything(self):
+        self.get('balance', self.alice)
+        ledger.rebuild_balances()
+        self.assertGreater(self.get('balance', self.alice)[1], 0)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled_cache_always_queries(self):
+        self.get('balance', self.alice)
+        self.assertGreater(self.get('balance', self.alice)[1], 0)
+
+
+class FastSerializationTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(8, 30, random.Random(3), split_sizes={1: 1, 3: 1},
+                     split_types={SplitType.EQUAL: 1, SplitType.EXACT: 1, SplitType.PERCENTAGE: 1}, days=30)
+
+    def test_expense_rows_match_expense_serializer(self):
+        for fields in (ExpenseSerializer.Meta.fields, ['id', 'amount'], ['created_at', 'splits']):
+            with self.subTest(fields=fields):
+                expenses = Expense.objects.order_by('id')
+                expected = ExpenseListSerializer(expenses.prefetch_related('splits'), many=True, fields=fields).data
+                columns = {'id'} | {field for field in fields if field != 'splits'}
+                self.assertEqual(expense_rows(list(expenses.values(*columns)), fields), expected)
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_expense_rows_use_current_time_zone(self):
+        expenses = Expense.objects.order_by('id')[:3]
+        expected = ExpenseListSerializer(expenses, many=True, fields=['created_at']).data
+        self.assertEqual(expense_rows(list(expenses.values('created_at')), ['created_at']), expected)
+        self.assertTrue(expected[0]['created_at'].endswith('+05:30'))
+
+    def test_create_expense_response_matches_expense_serializer(self):
+        payer, other = User.objects.order_by('id')[:2]
+        response = self.client.post(reverse('create_expense'), {
+            'user': payer.id,
+            'amount': '100',
+            'description': 'Tickets',
+            'splits': [
+                {'user': payer.id, 'amount_owed': '25', 'split_type': 'percentage', 'percentage': '25'},
+                {'user': other.id, 'amount_owed': '75', 'split_type': 'percentage', 'percentage': '75'},
+            ],
+        }, content_type='application/json', **auth_header(payer))
+        self.assertEqual(response.status_code, 201, response.content)
+
+        expense = Expense.objects.get(pk=response.json()['id'])
+        self.assertEqual(response.content, JSONRenderer().render(ExpenseSerializer(expense).data))
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'amount': Decimal('12.50'),
+            'utc': timezone.now(),
+            'local': timezone.now().astimezone(ZoneInfo('Asia/Kolkata')),
+            'date': timezone.now().date(),
+            'text': 'caf\u00e9 \u2028 \u2029 "quoted"',
+            'lazy': gettext_lazy('Invalid token'),
+            'nested': [1, 2.5, None, True, {'list': ExpenseListSerializer([], many=True).data}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        indented = ORJSONRenderer().render(data, 'application/json; indent=4')
+        self.assertEqual(indented, JSONRenderer().render(data, 'application/json; indent=4'))
+
+
+class MonthlyRollupTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        cls.carol = make_user('carol')
+
+    def backdate(self, months):
+        # Move every expense `months` months back, then recompute the rollups
+        for expense in Expense.objects.all():
+            created_at = expense.created_at
+            for _ in range(months):
+                created_at = created_at.replace(day=1) - timedelta(days=1)
+            Expense.objects.filter(pk=expense.pk).update(created_at=created_at)
+        rollups.rebuild_rollups()
+
+    def test_created_expenses_update_rollups(self):
+        self.create_expense(self.alice, [(self.alice, '10.00'), (self.bob, '20.00')], split_type='exact')
+        response = self.client.post(reverse('create_expenses_batch'), [
+            expense_payload(self.bob, [(self.alice, '6.00'), (self.carol, '6.00')], amount='12.00'),
+            expense_payload(self.carol, [(self.bob, '9.00')], amount='9.00', split_type='exact'),
+        ], content_type='application/json', **auth_header(self.alice))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(response.json()['errors'])
+        self.assertEqual(rollups.verify_rollups(), [])
+
+        month = rollups.month_of(timezone.now())
+        alice = {row.split_type: row for row in MonthlyRollup.objects.filter(user=self.alice, month=month)}
+        self.assertEqual(alice['exact'].total_owed, Decimal('10.00'))
+        self.assertEqual(alice['exact'].total_paid, Decimal('30.00'))
+        self.assertEqual(alice['exact'].count, 1)
+        self.assertEqual(alice['equal'].total_owed, Decimal('6.00'))
+        self.assertEqual(alice['equal'].total_paid, Decimal('0.00'))
+        bob_exact = MonthlyRollup.objects.get(user=self.bob, month=month, split_type='exact')
+        self.assertEqual((bob_exact.total_owed, bob_exact.count), (Decimal('29.00'), 2))
+
+    def test_backfill_command_rebuilds_and_verifies(self):
+        self.create_expense(self.alice, [(self.bob, '30.00')], split_type='exact')
+        MonthlyRollup.objects.update(total_owed=0)
+        with self.assertRaises(CommandError):
+            call_command('backfill_rollups', '--verify', stdout=StringIO())
+        call_command('backfill_rollups', stdout=StringIO())
+        call_command('backfill_rollups', '--verify', stdout=StringIO())
+
+    def test_report_groups_months_and_filters_by_date(self):
+        self.create_expense(self.alice, [(self.alice, '10.00'), (self.bob, '20.00')], split_type='exact')
+        self.backdate(2)
+        self.create_expense(self.bob, [self.alice], amount='10.00')
+        self.create_expense(self.carol, [(self.alice, '5.00')], amount='5.00', split_type='exact')
+
+        user_cache.get(self.alice.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('monthly-report'), **auth_header(self.alice))
+        self.assertEqual(len(queries), 1)
+        report = response.json()
+        self.assertEqual([month['count'] for month in report['months']], [1, 2])
+        old, current = report['months']
+        self.assertEqual(current['month'], timezone.localdate().strftime('%Y-%m'))
+        self.assertEqual(current['split_types'], {
+            'equal': {'total_owed': 10.0, 'total_paid': 0.0, 'count': 1},
+            'exact': {'total_owed': 5.0, 'total_paid': 0.0, 'count': 1},
+        })
+        self.assertEqual((old['total_owed'], old['total_paid']), (10.0, 30.0))
+        self.assertEqual((report['total_owed'], report['total_paid']), (25.0, 30.0))
+
+        response = self.client.get(reverse('monthly-report'), {'start_date': timezone.localdate().isoformat()},
+                                   **auth_header(self.alice))
+        self.assertEqual([month['month'] for month in response.json()['months']], [current['month']])
+        response = self.client.get(reverse('monthly-report'), {'end_date': 'not-a-date'}, **auth_header(self.alice))
+        self.assertEqual(response.status_code, 400)
+
+
+class SplittingTests(BaseTestCase):
+    def test_equal_shares_hand_leftover_cents_to_the_first_participants(self):
+        self.assertEqual(splitting.equal_shares(10000, 3), [3334, 3333, 3333])
+        self.assertEqual(splitting.equal_shares(5, 7), [1, 1, 1, 1, 1, 0, 0])
+        with self.assertRaises(splitting.SplitError):
+            splitting.equal_shares(100, 0)
+
+    def test_weighted_shares_use_largest_remainders(self):
+        # Exact shares 16.667, 33.333, 50 -> the first has the largest remainder
+        self.assertEqual(splitting.weighted_shares(100, [1, 2, 3, 0]), [17, 33, 50, 0])
+        self.assertEqual(splitting.weighted_shares(100, [1, 1, 1]), [34, 33, 33])
+
+        rng = random.Random(5)
+        for _ in range(200):
+            total = rng.randint(0, 10 ** 7)
+            weights = [rng.randint(0, 10000) for _ in range(rng.randint(1, 40))]
+            if not any(weights):
+                continue
+            shares = splitting.weighted_shares(total, weights)
+            self.assertEqual(sum(shares), total)
+            for share, weight in zip(shares, weights):
+                self.assertLess(abs(share * sum(weights) - total * weight), sum(weights))
+
+    def test_conversions_are_exact(self):
+        self.assertEqual(splitting.to_cents(Decimal('100.10')), 10010)
+        self.assertEqual(splitting.from_cents(3334), Decimal('33.34'))
+        with self.assertRaises(splitting.SplitError):
+            splitting.to_cents(Decimal('0.005'))
+        with self.assertRaises(splitting.SplitError):
+            splitting.percentage_shares(100, [5000, 4999])
+
+
+class SplitValidationTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(name) for name in ('alice', 'bob', 'carol')]
+
+    def serializer(self, amount, split_type, owed=None, percentages=None):
+        splits = []
+        for i, user in enumerate(self.users):
+            split = {'user': user.id, 'split_type': split_type}
+            if owed is not None:
+                split['amount_owed'] = owed[i]
+            if percentages is not None:
+                split['percentage'] = percentages[i]
+            splits.append(split)
+        return ExpenseSerializer(data={'user': self.users[0].id, 'amount': amount, 'description': 'Cab', 'splits': splits})
+
+    def assertInvalid(self, serializer, message):
+        self.assertFalse(serializer.is_valid())
+        self.assertIn(message, str(serializer.errors['non_field_errors'][0]))
+
+    def test_uneven_equal_split_is_accepted_in_any_order(self):
+        for owed in (['33.34', '33.33', '33.33'], ['33.33', '33.33', '33.34']):
+            serializer = self.serializer('100.00', 'equal', owed)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertInvalid(self.serializer('100.00', 'equal', ['33.33', '33.33', '33.33']), '33.33 or 33.34')
+        self.assertInvalid(self.serializer('100.00', 'equal', ['33.32', '33.34', '33.34']), '33.33 or 33.34')
+
+    def test_shares_are_generated_when_amount_owed_is_left_out(self):
+        serializer = self.serializer('100.00', 'equal')
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        expense = serializer.save()
+        self.assertEqual([split.amount_owed for split in expense.splits.order_by('id')],
+                         [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual(ledger.verify_balances(), [])
+
+        serializer = self.serializer('10.00', 'percentage', percentages=['33.33', '33.33', '33.34'])
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual([split['amount_owed'] for split in serializer.validated_data['splits']],
+                         [Decimal('3.33'), Decimal('3.33'), Decimal('3.34')])
+
+    def test_invalid_splits_are_rejected(self):
+        self.assertInvalid(self.serializer('30.00', 'exact'), "'amount_owed' must be provided")
+        self.assertInvalid(self.serializer('30.00', 'exact', ['10.00', '10.00', '9.99']), "Total amount for 'exact'")
+        serializer = self.serializer('30.00', 'equal', ['10.00', '10.00', '10.00'])
+        serializer.initial_data['splits'][2].pop('amount_owed')
+        self.assertInvalid(serializer, "for every split or for none")
+        self.assertInvalid(self.serializer('10.00', 'percentage', percentages=['50', '25', '20']), 'must equal 100%')
+        self.assertInvalid(self.serializer('10.00', 'percentage', ['5.00', '2.00', '3.00'], ['50', '25', '25']),
+                           'within a cent')
+        serializer = self.serializer('10.00', 'percentage', ['5.00', '2.50', '2.50'], ['50', '25', '25'])
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_generated_split_over_the_api(self):
+        expense = self.create_expense(self.users[0], self.users, amount='0.02')
+        self.assertEqual([split['amount_owed'] for split in expense['splits']], ['0.01', '0.01', '0.00'])
+
+
+class AsyncReadEndpointTests(TransactionTestCase):
+    # The async views query from worker threads on their own connections,
+    # which cannot see the uncommitted data of a TestCase transaction.
+    # 'replica' stays empty: a replica that has replicated nothing yet.
+    databases = {'default', 'replica'}
+    pairs = [
+        ('balance', 'async-balance'),
+        ('user-expenses', 'async-user-expenses'),
+        ('overall-expenses', 'async-overall-expenses'),
+    ]
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        registry.clear()
+        throttling.local_buckets.clear()
+        self.users = make_users(4)
+        seed_expenses(self.users, count=12, participants=3)
+        self.headers = auth_header(self.users[0])
+
+    def test_responses_match_sync_views(self):
+        for sync_name, async_name in self.pairs:
+            for params in ({}, {'limit': 5, 'fields': 'id,amount,splits'}):
+                with self.subTest(endpoint=async_name, params=params):
+                    expected = self.client.get(reverse(sync_name), params, **self.headers)
+                    response = self.client.get(reverse(async_name), params, **self.headers)
+                    self.assertEqual(response.status_code, 200, response.content)
+                    data = response.json()
+                    if isinstance(data, dict) and data.get('next'):
+                        data['next'] = data['next'].replace('/async', '')
+                    self.assertEqual(data, expected.json())
+
+    def test_errors_match_sync_views(self):
+        cases = [
+            ('balance', {}, {}),
+            ('balance', {}, {'HTTP_AUTHORIZATION': 'Bearer nonsense'}),
+            ('overall-expenses', {'cursor': 'nonsense'}, {}),
+            ('overall-expenses', {'fields': 'id,bogus'}, {}),
+        ]
+        for sync_name, params, headers in cases:
+            with self.subTest(endpoint=sync_name, params=params, headers=headers):
+                expected = self.client.get(reverse(sync_name), params, **headers)
+                response = self.client.get(reverse(f'async-{sync_name}'), params, **headers)
+                self.assertGreaterEqual(expected.status_code, 400)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response.get('WWW-Authenticate'), expected.get('WWW-Authenticate'))
+
+    async def test_worker_queries_are_timed_under_asgi(self):
+        headers = {'Authorization': self.headers['HTTP_AUTHORIZATION']}
+        response = await self.async_client.get(reverse('async-balance'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # User lookup plus the two balance queries, run in worker threads
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+        # The same response cache as the sync view
+        response = await self.async_client.get(reverse('async-balance'), headers=headers)
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        self.assertEqual(registry.counts['response_cache_hits_total'], {'async-balance': 1})
+
+    def test_cache_is_invalidated_by_expense_writes(self):
+        url = reverse('async-balance')
+        before = self.client.get(url, **self.headers).json()
+        self.assertEqual(self.client.get(url, **self.headers).json(), before)
+        response = self.client.post(reverse('create_expense'),
+                                    expense_payload(self.users[0], [(self.users[1], '30.00')], split_type='exact'),
+                                    content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 201, response.content)
+        after = self.client.get(url, **self.headers).json()
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, self.client.get(reverse('balance'), **self.headers).json())
+
+    @override_settings(RATE_LIMITS={'balance': {'rate': 0.001, 'burst': 2}})
+    def test_balance_shares_the_sync_rate_limit(self):
+        # One bucket for both URLs, so neither bypasses the other's limit
+        self.assertEqual(self.client.get(reverse('balance'), **self.headers).status_code, 200)
+        self.assertEqual(self.client.get(reverse('async-balance'), **self.headers).status_code, 200)
+        for name in ('async-balance', 'balance'):
+            response = self.client.get(reverse(name), **self.headers)
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(registry.counts['throttled_requests_total'], {'balance': 2})
+
+    @override_settings(DATABASE_REPLICAS=['replica'], RESPONSE_CACHE_ENABLED=False)
+    def test_reads_are_routed_like_the_sync_views(self):
+        for name in ('balance', 'overall-expenses'):
+            with self.subTest(endpoint=name):
+                expected = self.client.get(reverse(name), **self.headers).json()
+                response = self.client.get(reverse(f'async-{name}'), **self.headers).json()
+                self.assertEqual(response, expected)
+                with override_settings(DATABASE_REPLICAS=[]):
+                    self.assertNotEqual(self.client.get(reverse(f'async-{name}'), **self.headers).json(), response)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    async def test_concurrent_requests_share_one_computation(self):
+        headers = {'Authorization': self.headers['HTTP_AUTHORIZATION']}
+        run_query = async_views.run_query
+
+        async def slowed(*args):
+            await asyncio.sleep(0.2)
+            return await run_query(*args)
+
+        with mock.patch.object(async_views, 'run_query', slowed):
+            responses = await asyncio.gather(*[
+                self.async_client.get(reverse('async-balance'), headers=headers) for _ in range(3)
+            ])
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(registry.counts['coalesced_requests_total'], {'async-balance': 2})
+
+
+class ExportJobTests(TransactionTestCase):
+    # Exports run on worker threads with their own connections, which cannot
+    # see the uncommitted data of a TestCase transaction.
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings_override = override_settings(EXPORT_ROOT=export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.users = make_users(4)
+        seed_expenses(self.users, count=20, participants=3)
+        self.user = self.users[0]
+        self.headers = auth_header(self.user)
+
+    def wait_for(self, job_id, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = ExportJob.objects.get(pk=job_id)
+            if job.status not in ExportJob.ACTIVE_STATUSES or time.monotonic() > deadline:
+                return job
+            time.sleep(0.01)
+
+    def test_export_runs_in_background_and_matches_download(self):
+        response = self.client.post(reverse('export-balance-sheet'), **self.headers)
+        self.assertEqual(response.status_code, 202, response.content)
+        job_id = response.json()['id']
+        self.assertEqual(response['Location'], reverse('export-status', args=[job_id]))
+
+        job = self.wait_for(job_id)
+        self.assertEqual(job.status, ExportJob.SUCCEEDED, job.error)
+        self.assertEqual(job.row_count, ExpenseSplit.objects.filter(user=self.user).count())
+
+        status = self.client.get(reverse('export-status', args=[job_id]), **self.headers).json()
+        self.assertEqual(status['status'], ExportJob.SUCCEEDED)
+        self.assertTrue(status['download_url'].endswith(reverse('export-download', args=[job_id])))
+
+        download = self.client.get(reverse('export-download', args=[job_id]), **self.headers)
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+        expected = self.client.get(reverse('download-balance-sheet'), {'stream': 'false'}, **self.headers)
+        self.assertEqual(b''.join(download.streaming_content), expected.content)
+
+    def test_jobs_are_private_and_downloadable_only_when_finished(self):
+        job = ExportJob.objects.create(user=self.user, kind=ExportJob.BALANCE_SHEET)
+        other = auth_header(self.users[1])
+        self.assertEqual(self.client.get(reverse('export-status', args=[job.id]), **other).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export-download', args=[job.id]), **other).status_code, 404)
+
+        response = self.client.get(reverse('export-download', args=[job.id]), **self.headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], ExportJob.PENDING)
+
+    def test_active_jobs_per_user_are_limited(self):
+        with override_settings(EXPORT_MAX_ACTIVE_PER_USER=2):
+            ExportJob.objects.bulk_create([
+                ExportJob(user=self.user, kind=ExportJob.BALANCE_SHEET, status=status)
+                for status in (ExportJob.PENDING, ExportJob.RUNNING, ExportJob.SUCCEEDED)
+            ])
+            response = self.client.post(reverse('export-balance-sheet'), **self.headers)
+            self.assertEqual(response.status_code, 429)
+            # Other users are not affected
+            response = self.client.post(reverse('export-balance-sheet'), **auth_header(self.users[1]))
+            self.assertEqual(response.status_code, 202)
+            self.wait_for(response.json()['id'])
+
+    def test_failed_job_records_error_and_keeps_no_file(self):
+        job = ExportJob.objects.create(user=self.user, kind=ExportJob.BALANCE_SHEET,
+                                       params={'start_date': 'nonsense'})
+        with self.assertLogs('user_expenses.jobs', 'ERROR'):
+            jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertTrue(job.error)
+        self.assertEqual(job.file_name, '')
+        self.assertEqual(list(jobs.export_root().iterdir()), [])
+
+        # A job runs at most once
+        jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+
+    def test_purge_deletes_expired_jobs_and_fails_stale_ones(self):
+        expired = ExportJob.objects.create(user=self.user, kind=ExportJob.BALANCE_SHEET)
+        jobs.run_job(expired.id)
+        expired.refresh_from_db()
+        path = jobs.export_path(expired)
+        self.assertTrue(path.exists())
+        ExportJob.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.get(reverse('export-status', args=[expired.id]), **self.headers).status_code, 410)
+        self.assertEqual(self.client.get(reverse('export-download', args=[expired.id]), **self.headers).status_code, 410)
+
+        stale = ExportJob.objects.create(user=self.user, kind=ExportJob.BALANCE_SHEET)
+        ExportJob.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        fresh = ExportJob.objects.create(user=self.user, kind=ExportJob.BALANCE_SHEET)
+
+        out = StringIO()
+        call_command('purge_exports', timeout=3600, stdout=out)
+        self.assertIn('Failed 1 stale export(s), purged 1 expired export(s).', out.getvalue())
+        self.assertFalse(ExportJob.objects.filter(pk=expired.pk).exists())
+        self.assertFalse(path.exists())
+        self.assertEqual(ExportJob.objects.get(pk=stale.pk).status, ExportJob.FAILED)
+        self.assertEqual(ExportJob.objects.get(pk=fresh.pk).status, ExportJob.PENDING)
+
+
+class GroupTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(4)
+        cls.trip = Group.objects.create(name='Trip', created_by=cls.users[0])
+        cls.flat = Group.objects.create(name='Flat', created_by=cls.users[2])
+        GroupMembership.objects.bulk_create(
+            [GroupMembership(group=cls.trip, user=user) for user in cls.users[:3]]
+            + [GroupMembership(group=cls.flat, user=user) for user in cls.users[2:]]
+        )
+
+    def get(self, name, group, user, **params):
+        return self.client.get(reverse(name, args=[group.id]), params, **auth_header(user))
+
+    def test_create_and_list_groups(self):
+        response = self.client.post(reverse('groups'), {'name': 'Office', 'members': [self.users[1].id]},
+                                    content_type='application/json', **auth_header(self.users[3]))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['member_count'], 2)
+        self.assertEqual(response.json()['created_by'], self.users[3].id)
+
+        groups = self.client.get(reverse('groups'), **auth_header(self.users[3])).json()
+        self.assertEqual([(group['name'], group['member_count']) for group in groups], [('Flat', 2), ('Office', 2)])
+
+        response = self.client.post(reverse('groups'), {'name': 'Nope', 'members': [999999]},
+                                    content_type='application/json', **auth_header(self.users[3]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_add_members(self):
+        url = reverse('group-members', args=[self.flat.id])
+        response = self.client.post(url, {'members': [self.users[0].id, self.users[2].id]},
+                                    content_type='application/json', **auth_header(self.users[3]))
+        self.assertEqual(response.json(), {'member_count': 3})
+        # Only members can add members
+        response = self.client.post(url, {'members': [self.users[1].id]},
+                                    content_type='application/json', **auth_header(self.users[1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_group_expense_updates_group_and_overall_balances(self):
+        expense = self.create_expense(self.users[0], self.users[:3], group=self.trip)
+        self.assertEqual(expense['group'], self.trip.id)
+        self.create_expense(self.users[0], self.users[:2])
+
+        group_balances = GroupBalance.objects.filter(group=self.trip).values_list('debtor', 'creditor', 'amount')
+        self.assertEqual(sorted(group_balances), [(self.users[1].id, self.users[0].id, Decimal('10.00')),
+                                                  (self.users[2].id, self.users[0].id, Decimal('10.00'))])
+        self.assertEqual(PairBalance.objects.get(debtor=self.users[1], creditor=self.users[0]).amount, Decimal('25.00'))
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(ledger.verify_group_balances(), [])
+
+        balance = self.get('group-balance', self.trip, self.users[1]).json()
+        self.assertEqual(balance, {'owes_to': [{'to_user': 'user0', 'total_owed': 10.0}], 'owed_from': []})
+        transfers = self.get('group-settle-up', self.trip, self.users[0]).json()['transfers']
+        self.assertEqual(sorted((t['from_user_id'], t['amount']) for t in transfers),
+                         [(self.users[1].id, 10.0), (self.users[2].id, 10.0)])
+        self.assertEqual(self.get('group-settle-up', self.flat, self.users[2]).json(), {'transfers': []})
+
+    def test_everyone_on_a_group_expense_must_be_a_member(self):
+        response = self.post_expense(expense_payload(self.users[0], [self.users[1], self.users[3]], group=self.trip),
+                                     self.users[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'User(s) {self.users[3].id} are not members of group {self.trip.id}.', str(response.json()))
+
+        response = self.post_expense(expense_payload(self.users[0], self.users[2:], group=self.flat), self.users[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Expense.objects.count(), 0)
+
+    def test_batch_checks_membership_from_prefetched_context(self):
+        items = [
+            expense_payload(self.users[0], self.users[:3], group=self.trip),
+            expense_payload(self.users[2], self.users[2:], group=self.flat),
+            expense_payload(self.users[2], self.users[1:], group=self.flat),
+        ]
+        # users[2] belongs to both groups
+        response = self.client.post(reverse('create_expenses_batch') + '?mode=partial', items,
+                                    content_type='application/json', **auth_header(self.users[2]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.json()['errors']], [2])
+        self.assertEqual(ledger.verify_group_balances(), [])
+
+    def test_only_members_can_write_group_expenses(self):
+        # users[3] is not in the trip, though everyone on the expense is
+        expense = expense_payload(self.users[0], self.users[:3], group=self.trip)
+        response = self.post_expense(expense, self.users[3])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'You are not a member of group {self.trip.id}.', str(response.json()))
+
+        items = [expense, expense_payload(self.users[2], self.users[2:], group=self.flat),
+                 expense_payload(self.users[3], self.users[2:])]
+        response = self.client.post(reverse('create_expenses_batch') + '?mode=partial', items,
+                                    content_type='application/json', **auth_header(self.users[3]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.json()['errors']], [0])
+        self.assertEqual(len(response.json()['created']), 2)
+        self.assertFalse(GroupBalance.objects.filter(group=self.trip).exists())
+
+    def test_group_views_are_for_members_only(self):
+        for name in ('group-balance', 'group-settle-up', 'group-expenses'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name, self.trip, self.users[3]).status_code, 404)
+                self.assertEqual(self.get(name, self.trip, self.users[1]).status_code, 200)
+        response = self.client.get(reverse('group-expenses', args=[self.trip.id]))
+        self.assertEqual(response.status_code, 401)
+
+    def test_group_expense_listing_is_scoped_and_invalidated(self):
+        self.create_expense(self.users[0], self.users[:3], group=self.trip)
+        self.create_expense(self.users[0], self.users[:3])
+        self.create_expense(self.users[2], self.users[2:], group=self.flat)
+
+        listing = self.get('group-expenses', self.trip, self.users[1]).json()
+        self.assertEqual([expense['group'] for expense in listing['results']], [self.trip.id])
+        # Cached per group and not mixed up with the overall listing
+        self.assertEqual(len(self.client.get(reverse('overall-expenses')).json()['results']), 3)
+
+        self.create_expense(self.users[1], self.users[:2], group=self.trip, user=self.users[0])
+        listing = self.get('group-expenses', self.trip, self.users[1], fields='id,group').json()
+        self.assertEqual(len(listing['results']), 2)
+        self.assertEqual(set(listing['results'][0]), {'id', 'group'})
+
+    def test_rebuild_restores_group_balances(self):
+        self.create_expense(self.users[0], self.users[:3], group=self.trip)
+        GroupBalance.objects.all().delete()
+        self.assertEqual(len(ledger.verify_group_balances()), 2)
+        ledger.rebuild_balances()
+        self.assertEqual(ledger.verify_group_balances(), [])
+
+
+# A cheap hasher: these tests are about the write path, not the hashing cost
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(BaseTestCase):
+    def row(self, i, **overrides):
+        return {'name': f'new{i}', 'email': f'new{i}@example.com', 'mobile_number': '9999999999',
+                'password': f'Imp0rted-{i}-pass', **overrides}
+
+    def test_signup_writes_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), self.row(0), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        writes = [query['sql'] for query in queries if not query['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(User.objects.get(email='new0@example.com').check_password('Imp0rted-0-pass'))
+
+    def test_import_hashes_in_processes_and_inserts_valid_rows(self):
+        make_user('taken')
+        rows = [
+            self.row(0),
+            self.row(1, email='taken@example.com'),
+            self.row(2, password='123'),
+            self.row(3),
+            self.row(4, email='new0@example.com'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            users, errors = import_users(rows, workers=2)
+
+        self.assertEqual([error['index'] for error in errors], [1, 2, 4])
+        self.assertIn('email', errors[0]['errors'])
+        self.assertEqual([user.email for user in users], ['new0@example.com', 'new3@example.com'])
+        # One email lookup and one INSERT, inside a transaction
+        self.assertEqual(len([query for query in queries if query['sql'].startswith(('SELECT', 'INSERT'))]), 2)
+        self.assertTrue(User.objects.get(email='new3@example.com').check_password('Imp0rted-3-pass'))
+
+        users, errors = import_users([self.row(5), self.row(6, email='bad')], atomic=True)
+        self.assertEqual((users, [error['index'] for error in errors]), ([], [1]))
+        self.assertFalse(User.objects.filter(email='new5@example.com').exists())
+
+    def test_hash_passwords_matches_inline_hashing(self):
+        hashed = hash_passwords(['a', 'b', 'c'], workers=2)
+        self.assertEqual(len(hashed), 3)
+        for password, encoded in zip('abc', hashed):
+            user = User(password=encoded)
+            self.assertTrue(user.check_password(password))
+
+    def test_import_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,email,mobile_number,password\n')
+            f.write('new1,new1@example.com,9999999999,Imp0rted-1-pass\n')
+            f.write('new2,not-an-email,9999999999,Imp0rted-2-pass\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out, err = StringIO(), StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_users', f.name, '--atomic', stdout=out, stderr=err)
+        self.assertIn('Row 3:', err.getvalue())
+        self.assertEqual(User.objects.count(), 0)
+
+        call_command('import_users', f.name, '--workers', '1', stdout=out, stderr=err)
+        self.assertIn('Imported 1 user(s), skipped 1', out.getvalue())
+        self.assertTrue(User.objects.filter(email='new1@example.com').exists())
+
+
+class SyncTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(4)
+
+    def sync(self, user, **params):
+        response = self.client.get(reverse('sync'), params, **auth_header(user))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_sync_returns_only_new_changes(self):
+        alice, bob, carol, dave = self.users
+        first = self.create_expense(alice, [alice, bob, carol])['id']
+        self.create_expense(dave, [dave, carol])
+
+        data = self.sync(bob)
+        self.assertEqual([expense['id'] for expense in data['expenses']], [first])
+        self.assertEqual(len(data['expenses'][0]['splits']), 3)
+        self.assertEqual(data['balance_deltas'], [{'user': alice.id, 'amount': -10.0}])
+        self.assertFalse(data['has_more'])
+
+        # Nothing new: an empty page and the same token
+        token = data['sync_token']
+        again = self.sync(bob, since=token)
+        self.assertEqual((again['expenses'], again['balance_deltas'], again['sync_token']), ([], [], token))
+
+        second = self.create_expense(bob, [alice, bob], amount='20.00')['id']
+        data = self.sync(bob, since=token)
+        self.assertEqual([expense['id'] for expense in data['expenses']], [second])
+        self.assertEqual(data['balance_deltas'], [{'user': alice.id, 'amount': 10.0}])
+
+        data = self.sync(alice)
+        self.assertEqual([expense['id'] for expense in data['expenses']], [first, second])
+        # Bob's debt and credit cancel out, so only Carol's is reported
+        self.assertEqual(data['balance_deltas'], [{'user': carol.id, 'amount': 10.0}])
+
+    def test_pages_follow_the_sequence(self):
+        alice, bob = self.users[:2]
+        created = [self.create_expense(alice, [alice, bob])['id'] for _ in range(5)]
+        items = [expense_payload(bob, [alice, bob], amount='4.00') for _ in range(3)]
+        response = self.client.post(reverse('create_expenses_batch'), items, content_type='application/json',
+                                    **auth_header(bob))
+        created += [item['id'] for item in response.json()['created']]
+
+        seen, token, pages = [], None, 0
+        while True:
+            data = self.sync(bob, limit=3, **({'since': token} if token else {}))
+            seen += [expense['id'] for expense in data['expenses']]
+            token, pages = data['sync_token'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, created)
+        self.assertEqual(pages, 3)
+        self.assertEqual(SyncSequence.objects.get(user=bob).last_seq, 8)
+
+    def test_query_count_does_not_grow_with_history(self):
+        alice, bob = self.users[:2]
+        self.create_expense(alice, [alice, bob])
+        token = self.sync(bob)['sync_token']
+        for _ in range(20):
+            self.create_expense(alice, [alice, bob])
+        self.create_expense(alice, [alice, bob])
+        user_cache.get(bob.id)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.sync(bob, since=token, limit=1)
+        self.assertEqual(len(data['expenses']), 1)
+        # Changes, expenses and their splits
+        self.assertEqual(len(queries), 3)
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get(reverse('sync'), {'since': 'nonsense!'}, **auth_header(self.users[0]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_matches_incremental_feed(self):
+        alice, bob, carol = self.users[:3]
+        self.create_expense(alice, [alice, bob, carol])
+        self.create_expense(bob, [bob, carol])
+        self.create_expense(carol, [alice])
+        recorded = sorted(SyncChange.objects.values_list('user', 'seq', 'expense'))
+        sequences = sorted(SyncSequence.objects.values_list('user', 'last_seq'))
+
+        call_command('backfill_sync', stdout=StringIO())
+        self.assertEqual(sorted(SyncChange.objects.values_list('user', 'seq', 'expense')), recorded)
+        self.assertEqual(sorted(SyncSequence.objects.values_list('user', 'last_seq')), sequences)
+
+    def test_rebuild_renumbers_from_one(self):
+        alice, bob = self.users[:2]
+        created = [self.create_expense(alice, [alice, bob])['id'] for _ in range(4)]
+        Expense.objects.filter(id=created[1]).delete()
+        SyncChange.objects.filter(user=alice).delete()
+
+        self.assertEqual(sync.rebuild_changes(batch_size=2), 6)
+        for user in (alice, bob):
+            self.assertEqual(
+                list(SyncChange.objects.filter(user=user).order_by('seq').values_list('seq', 'expense')),
+                [(1, created[0]), (2, created[2]), (3, created[3])],
+            )
+            self.assertEqual(SyncSequence.objects.get(user=user).last_seq, 3)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], RESPONSE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(BaseTestCase):
+    # 'replica' is a separate database; replicate() stands in for replication,
+    # so anything written since the last call is replication lag
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = make_users(3)
+
+    def setUp(self):
+        super().setUp()
+        self.replicate()
+
+    def replicate(self):
+        for model in (User, Expense, ExpenseSplit, PairBalance, MonthlyRollup, SyncSequence, SyncChange):
+            model.objects.using('replica').all().delete()
+            model.objects.using('replica').bulk_create(list(model.objects.all()))
+
+    def create(self, payer, participants):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_expense(payer, participants)
+
+    def owes_to(self, user):
+        response = self.client.get(reverse('balance'), **auth_header(user))
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['to_user'] for item in response.json()['owes_to']]
+
+    @override_settings(REPLICA_READ_YOUR_WRITES=0)
+    def test_reads_use_the_replica_and_writes_the_primary(self):
+        alice, bob, _ = self.users
+        self.create(alice, [alice, bob])
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(Expense.objects.using('replica').count(), 0)
+        response = self.client.post(reverse('register'), {
+            'name': 'new', 'email': 'new@example.com', 'mobile_number': '9999999999', 'password': 'N3w-user-pass',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(User.objects.using('replica').filter(email='new@example.com').exists())
+
+        # Without a window, Bob reads the lagging replica until it catches up
+        self.assertEqual(self.owes_to(bob), [])
+        self.replicate()
+        self.assertEqual(self.owes_to(bob), ['user0'])
+
+    @override_settings(REPLICA_READ_YOUR_WRITES=60)
+    def test_writers_read_the_primary_within_the_window(self):
+        alice, bob, carol = self.users
+        self.create(alice, [alice, bob])
+        user_cache.get(carol.id)
+
+        # Everyone the expense involves sees it straight away
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.owes_to(bob), ['user0'])
+            response = self.client.get(reverse('user-expenses'), **auth_header(alice))
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(replica_queries), 0)
+
+        # Others keep reading the replica, as do the involved users once
+        # their window has closed
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.owes_to(carol), [])
+        self.assertGreater(len(replica_queries), 0)
+        cache.clear()
+        self.assertEqual(self.owes_to(bob), [])
+
+    @override_settings(REPLICA_READ_YOUR_WRITES=0)
+    def test_streamed_balance_sheet_reads_the_replica(self):
+        alice, bob, _ = self.users
+        self.create(alice, [alice, bob])
+        self.replicate()
+        self.create(alice, [alice, bob])
+
+        response = self.client.get(reverse('download-balance-sheet'), {'stream': 'true'}, **auth_header(bob))
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 2)  # header and the replicated expense
+
+    def test_reads_outside_routed_views_use_the_primary(self):
+        self.assertIsNone(replicas.ReplicaRouter().db_for_read(Expense))
+        with replicas.reading_from('replica'):
+            self.assertEqual(Expense.objects.all().db, 'replica')
+            self.assertEqual(Expense.objects.select_for_update().db, 'default')
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertIsNone(replicas.replica_for(['user:1']))
+
+
+class RateLimitTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.users = make_users(2)
+
+    def test_bucket_refills_at_the_rate(self):
+        state = None
+        for _ in range(2):
+            state, allowed, _ = throttling.take_token(state, 0.0, rate=1, burst=2)
+            self.assertTrue(allowed)
+        state, allowed, wait = throttling.take_token(state, 0.0, rate=1, burst=2)
+        self.assertEqual((allowed, wait), (False, 1.0))
+        state, allowed, wait = throttling.take_token(state, 0.5, rate=1, burst=2)
+        self.assertEqual((allowed, wait), (False, 0.5))
+        state, allowed, _ = throttling.take_token(state, 1.0, rate=1, burst=2)
+        self.assertTrue(allowed)
+        # A long pause refills up to the burst only
+        self.assertEqual(throttling.take_token(state, 100.0, rate=1, burst=2)[0], (1, 100.0))
+
+    @override_settings(RATE_LIMITS={'balance': {'rate': 0.01, 'burst': 2}})
+    def test_each_user_has_a_bucket_per_endpoint(self):
+        alice, bob = self.users
+        for alias in (None, 'default'):
+            with self.subTest(cache_alias=alias), override_settings(RATE_LIMIT_CACHE_ALIAS=alias):
+                throttling.local_buckets.clear()
+                cache.clear()
+                statuses = [self.client.get(reverse('balance'), **auth_header(alice)).status_code for _ in range(3)]
+                self.assertEqual(statuses, [200, 200, 429])
+                response = self.client.get(reverse('balance'), **auth_header(alice))
+                self.assertEqual(response.status_code, 429)
+                self.assertGreater(int(response['Retry-After']), 90)
+
+                self.assertEqual(self.client.get(reverse('balance'), **auth_header(bob)).status_code, 200)
+                # Endpoints without a limit are unaffected
+                self.assertEqual(self.client.get(reverse('user-expenses'), **auth_header(alice)).status_code, 200)
+        self.assertEqual(registry.counts['throttled_requests_total'], {'balance': 4})
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False, RATE_LIMITS={})
+class CoalescingTests(TransactionTestCase):
+    # The burst runs on threads with their own connections, which cannot see
+    # the uncommitted data of a TestCase transaction
+    burst = 6
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        registry.clear()
+        self.users = make_users(4)
+        seed_expenses(self.users, count=12, participants=3)
+        self.headers = auth_header(self.users[0])
+        user_cache.get(self.users[0].id)
+
+    def run_burst(self, name, params=None):
+        # Send `burst` identical requests at once while the view's first
+        # query is slowed down; returns the responses and the queries they ran
+        barrier = threading.Barrier(self.burst)
+        responses = [None] * self.burst
+
+        def send(index):
+            try:
+                barrier.wait()
+                responses[index] = Client().get(reverse(name), params, **self.headers)
+            finally:
+                connection.close()
+
+        def slowed(func):
+            return lambda *args: time.sleep(0.3) or func(*args)
+
+        with mock.patch.object(views, 'owes_to_queryset', slowed(views.owes_to_queryset)), \
+                mock.patch.object(views, 'balance_sheet_queryset', slowed(views.balance_sheet_queryset)):
+            threads = [threading.Thread(target=send, args=(index,)) for index in range(self.burst)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        queries = sum(int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+                      for response in responses)
+        return responses, queries
+
+    def test_burst_runs_the_queries_once(self):
+        responses, queries = self.run_burst('balance')
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        # One computation: the two balance queries
+        self.assertEqual(queries, 2)
+        self.assertEqual(registry.counts['coalesced_requests_total'], {'balance': self.burst - 1})
+
+        with override_settings(COALESCE_REQUESTS=False):
+            _, queries = self.run_burst('balance')
+        self.assertEqual(queries, 2 * self.burst)
+
+    @override_settings(COALESCE_CACHE_ALIAS='default', COALESCE_POLL_INTERVAL=0.01)
+    def test_shared_cache_backend(self):
+        responses, queries = self.run_burst('download-balance-sheet', {'stream': 'false'})
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(responses[-1]['Content-Type'], 'text/csv')
+        self.assertEqual(queries, 1)
+
+    def test_streamed_responses_are_not_shared(self):
+        responses, _ = self.run_burst('download-balance-sheet', {'stream': 'true'})
+        contents = {b''.join(response.streaming_content) for response in responses}
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(registry.counts['coalesced_requests_total'], {})
+
+
+class AnalyticsTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(12, 60, random.Random(3), split_sizes={1: 1, 3: 2, 5: 1},
+                     split_types={SplitType.EQUAL: 1, SplitType.EXACT: 1, SplitType.PERCENTAGE: 1})
+
+    def test_matches_the_ledger_and_the_database(self):
+        columns = analytics.load_columns(chunk_size=7)
+        self.assertEqual(columns.shape, (len(analytics.COLUMNS), ExpenseSplit.objects.count()))
+
+        net = analytics.net_positions(columns)
+        expected = {user: splitting.to_cents(amount) for user, amount in net_balances().items() if amount}
+        self.assertEqual({user: int(amount) for user, amount in enumerate(net.tolist()) if amount}, expected)
+
+        summary = analytics.split_type_summary(columns)
+        totals = ExpenseSplit.objects.values('split_type').annotate(count=Count('id'), total=Sum('amount_owed'))
+        self.assertEqual(
+            {name: (entry['count'], entry['total']) for name, entry in summary.items()},
+            {row['split_type']: (row['count'], row['total'].quantize(splitting.CENT)) for row in totals},
+        )
+
+        top = analytics.top_users(net, 3)
+        self.assertEqual(net[top].tolist(), sorted(net.tolist(), reverse=True)[:3])
+
+    def test_view_is_for_staff_and_reuses_the_snapshot(self):
+        url = reverse('analytics')
+        self.assertEqual(self.client.get(url).status_code, 302)  # to the admin login
+
+        self.client.force_login(AuthUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(ANALYTICS_SNAPSHOT_PATH=os.path.join(directory, 'splits.npy')):
+            first = self.client.get(url, {'top': 2}).json()
+            self.assertEqual(first['source'], 'database')
+            self.assertEqual(first['splits'], ExpenseSplit.objects.count())
+            self.assertEqual(first['expenses'], 60)
+            self.assertEqual(len(first['top_creditors']), 2)
+
+            # Later reports map the snapshot until it is refreshed or too old
+            ExpenseSplit.objects.filter(pk=ExpenseSplit.objects.order_by('pk')[0].pk).delete()
+            second = self.client.get(url, {'top': 2}).json()
+            self.assertEqual(second['source'], 'snapshot')
+            self.assertEqual({**second, 'duration_ms': 0}, {**first, 'source': 'snapshot', 'duration_ms': 0})
+            refreshed = self.client.get(url, {'refresh': 1}).json()
+            self.assertEqual((refreshed['source'], refreshed['splits']), ('database', first['splits'] - 1))
+            with override_settings(ANALYTICS_SNAPSHOT_MAX_AGE=-1):
+                self.assertEqual(self.client.get(url).json()['source'], 'database')
+
+
+class StartupProfileTests(BaseTestCase):
+    def test_production_profile_boots_without_the_heavy_modules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {'DB_ENGINE': 'sqlite', 'DB_NAME': os.path.join(directory, 'db.sqlite3'), 'ALLOWED_HOSTS': 'localhost'}
+            production, _ = boot_worker('expense_api.settings_production', env=env)
+            default, _ = boot_worker('expense_api.settings', env=env)
+        # The API answers (401 without a token) with none of them imported
+        self.assertEqual(production['status'], 401)
+        self.assertEqual(production['modules'], [])
+        self.assertEqual(default['status'], 401)
+        self.assertEqual(set(default['modules']), set(HEAVY_MODULES) - {'drf_yasg.views', 'drf_yasg.generators'})
+
+    def test_docs_serve_the_built_schema(self):
+        url = '/api/swagger/?format=openapi'
+        live = self.client.get(url)
+        self.assertEqual(live.status_code, 200)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            with override_settings(SWAGGER_SCHEMA_PATH=path):
+                call_command('build_schema', stdout=StringIO())
+                built = self.client.get(url)
+                self.assertEqual(built['Content-Type'], 'application/openapi+json')
+                document = json.loads(b''.join(built.streaming_content))
+                built.close()
+        self.assertEqual(document['paths'], live.json()['paths'])
+        self.assertEqual(document['definitions'], live.json()['definitions'])
+
+
+class IdempotencyTests(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+
+    def post(self, payload, key, user=None):
+        return self.post_expense(payload, user or self.alice, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeats_return_the_stored_response(self):
+        payload = expense_payload(self.alice, [self.alice, self.bob])
+        first = self.post(payload, 'key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        # The retry is one read of the key: no validation, no writes
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post(payload, 'key-1')
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual([query['sql'].split()[0] for query in queries.captured_queries], ['SELECT'])
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(ExpenseSplit.objects.count(), 2)
+        self.assertEqual(PairBalance.objects.get().amount, Decimal('15.00'))
+
+        # Other keys, requests without a key and other users' keys are new requests
+        self.assertEqual(self.post(payload, 'key-2').status_code, 201)
+        self.assertEqual(self.post_expense(payload, self.alice).status_code, 201)
+        self.assertEqual(self.post(expense_payload(self.bob, [self.alice]), 'key-1', user=self.bob).status_code, 201)
+        self.assertEqual(Expense.objects.count(), 4)
+
+        # A key cannot be reused for a different request
+        conflict = self.post(expense_payload(self.alice, [self.bob]), 'key-1')
+        self.assertEqual(conflict.status_code, 422)
+        self.assertEqual(self.post(payload, 'x' * 256).status_code, 400)
+        self.assertEqual(Expense.objects.count(), 4)
+
+    def test_failures_are_not_stored_and_keys_expire(self):
+        payload = expense_payload(self.alice, [self.alice, self.bob])
+        self.assertEqual(self.post({**payload, 'amount': 'thirty'}, 'key-1').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post(payload, 'key-1').status_code, 201)
+
+        # An expired key that was not purged yet is taken over by the next request
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        again = self.post(payload, 'key-1')
+        self.assertEqual(again.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', again)
+        self.assertEqual(Expense.objects.count(), 2)
+        self.assertEqual(self.post(payload, 'key-1')['Idempotent-Replayed'], 'true')
+
+        self.post(payload, 'key-2')
+        IdempotencyKey.objects.filter(key='key-2').update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--batch-size', '1', stdout=out)
+        self.assertIn('Purged 1 expired', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-1'])
+
+    def test_attempt_that_loses_the_insert_replays_the_winner(self):
+        # As if the first attempt committed between this one's read of the
+        # key and its insert
+        payload = expense_payload(self.alice, [self.alice, self.bob])
+        first = self.post(payload, 'key-1')
+        with mock.patch.object(idempotency, 'find_key', return_value=None):
+            second = self.post(payload, 'key-1')
+            conflict = self.post(expense_payload(self.alice, [self.bob]), 'key-1')
+        self.assertEqual((second.status_code, second.content), (201, first.content))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(conflict.status_code, 422)
+        self.assertEqual(Expense.objects.count(), 1)
+
+
+# SQLite's shared in-memory test database fails concurrent writers at once
+# ("table is locked") instead of making them wait; run with
+# DB_ENGINE=postgresql
+@unittest.skipIf(connection.vendor == 'sqlite', 'needs concurrent writers')
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    # Threads with their own connections, as in CoalescingTests
+    burst = 4
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        throttling.local_buckets.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def test_concurrent_duplicates_create_one_expense(self):
+        payload = expense_payload(self.alice, [self.alice, self.bob])
+        barrier = threading.Barrier(self.burst)
+        responses = [None] * self.burst
+
+        def send(index):
+            try:
+                barrier.wait()
+                responses[index] = Client().post(
+                    reverse('create_expense'), payload, content_type='application/json',
+                    HTTP_IDEMPOTENCY_KEY='key-1', **auth_header(self.alice),
+                )
+            finally:
+                connection.close()
+
+        # Keep the first attempt's transaction open while the others arrive
+        save = views.ExpenseSerializer.save
+        with mock.patch.object(views.ExpenseSerializer, 'save', lambda *args, **kwargs: time.sleep(0.3) or
+                               save(*args, **kwargs)):
+            threads = [threading.Thread(target=send, args=(index,)) for index in range(self.burst)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(sum('Idempotent-Replayed' in response for response in responses), self.burst - 1)
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(ExpenseSplit.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
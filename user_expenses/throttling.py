@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+# Per-user token bucket rate limits for expensive endpoints.
+#
+# RATE_LIMITS maps a scope to {'rate': tokens added per second, 'burst':
+# bucket size}. A request takes one token from its user's bucket for the
+# view's scope, or from its client address' bucket when anonymous. An empty
+# bucket means 429 with a Retry-After of the time until the next token.
+# Scopes missing from RATE_LIMITS are not limited.
+#
+# Buckets live in this process unless RATE_LIMIT_CACHE_ALIAS names a Django
+# cache shared by all workers. Cache buckets are read and written without a
+# lock, so concurrent requests on different workers can both take the last
+# token; the limit holds to within the number of workers.
+
+KEY_PREFIX = 'ratelimit'
+LOCAL_MAX_BUCKETS = 10000
+
+
+def take_token(state, now, rate, burst):
+    # One request against a bucket. state is (tokens, updated_at), or None
+    # for a full bucket; returns (new state, allowed, seconds until the next
+    # token)
+    tokens, updated_at = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0.0
+    return (tokens, now), False, (1 - tokens) / rate
+
+
+class LocalBuckets:
+    # Buckets of this process, least recently used dropped first; a dropped
+    # bucket is simply full again
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        with self._lock:
+            state, allowed, wait = take_token(self._buckets.get(key), time.time(), rate, burst)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > LOCAL_MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def take(self, key, rate, burst):
+        cache = caches[self.alias]
+        state, allowed, wait = take_token(cache.get(key), time.time(), rate, burst)
+        # Kept until the bucket would be full again
+        cache.set(key, state, int(burst / rate) + 1)
+        return allowed, wait
+
+
+local_buckets = LocalBuckets()
+
+
+def buckets():
+    alias = settings.RATE_LIMIT_CACHE_ALIAS
+    return local_buckets if alias is None else CacheBuckets(alias)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Subclasses set scope; see rate_limit
+    scope = None
+
+    def allow_request(self, request, view):
+        limit = settings.RATE_LIMITS.get(self.scope)
+        if limit is None:
+            return True
+        user = request.user
+        ident = user.id if user is not None and user.is_authenticated else self.get_ident(request)
+        allowed, self.wait_seconds = buckets().take(
+            f'{KEY_PREFIX}:{self.scope}:{ident}', limit['rate'], limit['burst']
+        )
+        if not allowed:
+            registry.increment('throttled_requests_total', self.scope)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def rate_limit(scope):
+    # Throttle class for a RATE_LIMITS scope, for throttle_classes or a
+    # view's throttle_classes attribute
+    return type(f"TokenBucketThrottle_{scope.replace('-', '_')}", (TokenBucketThrottle,), {'scope': scope})
@@ -0,0 +1,31 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, Q, Value, When
+
+
+def increment_rows(model, key_fields, deltas):
+    # Add {key: {field: delta}} to the rows of `model` identified by
+    # key_fields (a tuple of field names matching each key) with a fixed two
+    # queries: insert any missing rows, which relies on a unique constraint
+    # over key_fields, then bump them all in a single UPDATE. New rows start
+    # from the fields' defaults.
+    if not deltas:
+        return
+
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas],
+        ignore_conflicts=True,
+    )
+
+    keys = Q()
+    whens = defaultdict(list)
+    for key, values in deltas.items():
+        lookup = dict(zip(key_fields, key))
+        keys |= Q(**lookup)
+        for field, delta in values.items():
+            whens[field].append(When(**lookup, then=Value(delta)))
+
+    model.objects.filter(keys).update(**{
+        field: F(field) + Case(*field_whens, default=Value(0), output_field=model._meta.get_field(field))
+        for field, field_whens in whens.items()
+    })
@@ -1,23 +1,13 @@
-from django.contrib import admin
+from django.conf import settings
 from django.conf.urls import include
-from .views import (SignupView, LoginView, user_expenses, create_expense, 
+from .views import (SignupView, LoginView, user_expenses, create_expense, create_expenses_batch,
                     user_balance_view,  OverallExpensesView, 
-                    download_balance_sheet)
+                    download_balance_sheet, settle_up_view, monthly_report,
+                    start_balance_sheet_export, export_status, download_export,
+                    groups_view, group_members_view, group_balance_view, group_settle_up_view, GroupExpensesView,
+                    sync_view)
+from . import async_views, schema
 from django.urls import path, re_path
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# DRF-YASG schema view for Swagger API documentation
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Expense Sharing API",  # API title
-      default_version='v1',  # API version
-      description="API documentation for the Expense Sharing Application",  # API description
-      contact=openapi.Contact(email="adityauttarwar29@gmail.com"),  # Support email for the API
-      
-   ),
-   public=True,  # Public visibility
-)
 
 # URL patterns for API endpoints
 urlpatterns = [
@@ -25,9 +15,29 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),  # User login
    #  path('expenses/', user_expenses, name='expenses'),  # Fetch expenses of the authenticated user
     path('create_expense/', create_expense, name='create_expense'),  # Create a new expense
+    path('create_expenses/batch/', create_expenses_batch, name='create_expenses_batch'),  # Create many expenses at once
     path('balance/', user_balance_view, name='balance'),  # Get balance overview for the user
+    path('settle-up/', settle_up_view, name='settle-up'),  # Minimal set of transfers settling all balances
     path('expenses/user/', user_expenses, name='user-expenses'),  # List expenses for a specific user
     path('expenses/overall/', OverallExpensesView.as_view(), name='overall-expenses'),  # List overall expenses for all users
     path('expenses/balance-sheet/', download_balance_sheet, name='download-balance-sheet'),  # Download balance sheet
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),  # Swagger UI for API documentation
+    # Groups: expenses, balances and settle-up scoped to one group's members
+    path('groups/', groups_view, name='groups'),
+    path('groups/<int:group_id>/members/', group_members_view, name='group-members'),
+    path('groups/<int:group_id>/balance/', group_balance_view, name='group-balance'),
+    path('groups/<int:group_id>/settle-up/', group_settle_up_view, name='group-settle-up'),
+    path('groups/<int:group_id>/expenses/', GroupExpensesView.as_view(), name='group-expenses'),
+    path('exports/balance-sheet/', start_balance_sheet_export, name='export-balance-sheet'),  # Start a background export
+    path('exports/<uuid:job_id>/', export_status, name='export-status'),  # Poll a background export
+    path('exports/<uuid:job_id>/download/', download_export, name='export-download'),  # Download a finished export
+    path('sync/', sync_view, name='sync'),  # Expenses and balance changes since a sync token
+    path('reports/monthly/', monthly_report, name='monthly-report'),  # Monthly totals from the rollups
+    # Async variants of the read endpoints, for ASGI deployments
+    path('async/balance/', async_views.user_balance_view, name='async-balance'),
+    path('async/expenses/user/', async_views.user_expenses, name='async-user-expenses'),
+    path('async/expenses/overall/', async_views.overall_expenses, name='async-overall-expenses'),
 ]
+
+if settings.SWAGGER_ENABLED:
+    # Swagger UI for API documentation; drf_yasg loads on the first request
+    urlpatterns.append(path('swagger/', schema.swagger_ui, name='schema-swagger-ui'))
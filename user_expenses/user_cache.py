@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import User
+
+
+class UserCache:
+    # Per-process LRU cache of User rows with a TTL, used by JWT
+    # authentication so a warm request resolves its user without a query.
+    #
+    # Entries are dropped when the user is saved or deleted (see signals.py);
+    # the TTL bounds staleness for writes made by other processes or through
+    # QuerySet.update(). Cached instances are shared between requests and
+    # must be treated as read-only. Size and TTL come from the USER_CACHE_SIZE
+    # and USER_CACHE_TTL settings; a TTL of 0 disables caching.
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        user = self.cached(user_id)
+        if user is not None:
+            return user
+
+        ttl = settings.USER_CACHE_TTL
+        now = time.monotonic()
+        with self._lock:
+            self.misses += 1
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None and ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (user, now + ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > settings.USER_CACHE_SIZE:
+                    self._entries.popitem(last=False)
+        return user
+
+    def cached(self, user_id):
+        # The cached user, or None on a miss; never queries, so async views
+        # can call it from the event loop
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+        return None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+user_cache = UserCache()
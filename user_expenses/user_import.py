@@ -0,0 +1,79 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import User
+from .serializers import UserImportSerializer
+
+# Bulk user import (manage.py import_users).
+#
+# Almost all the time of creating a user goes into hashing its password,
+# which is slow on purpose and CPU bound. An import validates every row
+# first, hashes the passwords of the valid ones on a pool of worker
+# processes (one core each) and inserts the users with batched INSERTs in a
+# single transaction, so the database sees a handful of statements instead
+# of a round trip per user.
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def hash_passwords(passwords, workers=None):
+    # make_password for each password, on `workers` processes
+    workers = workers or default_workers()
+    if workers == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    # A few chunks per worker keeps them busy without a round trip per hash
+    chunksize = max(1, len(passwords) // (workers * 4))
+    # Workers set Django up themselves when they are spawned rather than forked
+    with ProcessPoolExecutor(workers, initializer=django.setup) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def validate_rows(rows, batch_size=1000):
+    # Return ([(index, validated data)], [{'index', 'errors'}]). Emails must
+    # be unique across the rows and not registered yet.
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        serializer = UserImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    emails = [data['email'] for _, data in valid]
+    taken = set()
+    for start in range(0, len(emails), batch_size):
+        taken.update(User.objects.filter(email__in=emails[start:start + batch_size]).values_list('email', flat=True))
+
+    unique = []
+    for index, data in valid:
+        if data['email'] in taken:
+            errors.append({'index': index, 'errors': {'email': ['user with this email already exists.']}})
+        else:
+            taken.add(data['email'])
+            unique.append((index, data))
+    errors.sort(key=lambda error: error['index'])
+    return unique, errors
+
+
+def import_users(rows, workers=None, batch_size=1000, atomic=False):
+    # Create users from dicts with name, email, mobile_number and password.
+    # Invalid rows are reported and skipped, or with atomic=True reject the
+    # whole import. Returns (created users, errors).
+    valid, errors = validate_rows(rows, batch_size)
+    if not valid or (errors and atomic):
+        return [], errors
+
+    passwords = hash_passwords([data['password'] for _, data in valid], workers)
+    users = [
+        User(name=data['name'], email=data['email'], mobile_number=data['mobile_number'], password=password)
+        for (_, data), password in zip(valid, passwords)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+    return users, errors
@@ -1,30 +1,60 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from .serializers import UserSerializer, RepresentativeSerializer, LoginSerializer, ExpenseSerializer
-from .models import User, Expense, ExpenseSplit
+from .serializers import (UserSerializer, RepresentativeSerializer, LoginSerializer, ExpenseSerializer,
+                          ExpenseListSerializer, ExportJobSerializer, GroupSerializer, add_members, batch_context,
+                          create_expenses)
+from .models import User, Expense, ExpenseSplit, ExportJob, Group, GroupMembership
+from .coalescing import coalesced
+from .exports import balance_sheet_queryset, balance_sheet_rows, stream_csv
+from .fast_serializers import EXPENSE_FIELDS, expense_data, expense_rows
+from .filters import created_between
+from .idempotency import HEADER as IDEMPOTENCY_HEADER, idempotent
+from .jobs import TooManyJobs, export_path, start_job
+from .pagination import CreatedAtKeysetPagination
+from .queries import (balances, monthly_rollups_queryset, owes_to_queryset, owed_from_queryset, sync_changes_queryset,
+                      user_splits_queryset)
+from .replicas import read_from_replica
+from .response_cache import cached_response, group_scope
+from .rollups import monthly_report_data
+from .settlement import net_balances, simplify_debts
+from .sync import InvalidToken, balance_deltas, decode_token, encode_token
+from .throttling import rate_limit
 import datetime
+import functools
 import jwt  
 from django.conf import settings
-from rest_framework.decorators import api_view
-from django.db.models import Sum
+from rest_framework.decorators import api_view, throttle_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.settings import api_settings
+from django.db.models import Count, Sum
 import csv
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.urls import reverse
+from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 
 # Views for the expense-sharing application
 
+BATCH_MODES = ('partial', 'atomic')
+
 # Signup view for user registration
 class SignupView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
     @swagger_auto_schema(request_body=UserSerializer,
     responses={200: "User created successfully", 400: "Invalid credentials or errors"})
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            token = generate_jwt_token(user)
+            serializer.save()
             return Response({'message': 'User created successfully'}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -35,6 +65,9 @@ class LoginSerializer(serializers.Serializer):
 
 # Login view for user authentication
 class LoginView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
     @swagger_auto_schema(
         request_body=LoginSerializer,
         responses={200: "User logged in successfully", 400: "Invalid credentials or errors"}
@@ -56,25 +89,18 @@ class LoginView(APIView):
                 return Response({'error': 'User does not exist'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Function to decode JWT and retrieve user information
-def get_user_from_token(request):
-    token = request.META.get('HTTP_AUTHORIZATION', '').replace('Bearer ', '')
-
-    if not token:
-        return Response({'error': 'Missing token'}, status=status.HTTP_401_UNAUTHORIZED)
+# Function to read an optional YYYY-MM-DD query parameter
+def get_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        user = User.objects.get(id=payload['user_id'])
-        serializer = UserSerializer(user)
-        return serializer.data
-    except jwt.ExpiredSignatureError:
-        return Response({'error': 'Signature expired'}, status=status.HTTP_401_UNAUTHORIZED)
-    except jwt.DecodeError:
-        return Response({'error': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
-    except User.DoesNotExist:
-        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"'{name}' must be a valid date in YYYY-MM-DD format")
+    return parsed
 
 # Function to generate JWT token for a user
 def generate_jwt_token(user):
@@ -86,138 +112,494 @@ def generate_jwt_token(user):
     token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
     return token
 
-# View to create a new expense
+# View to create a new expense. Retries sent with the same Idempotency-Key
+# header get the first response back instead of a duplicate expense.
 @swagger_auto_schema(methods=['post'], operation_description="Create an Expense", 
-request_body=ExpenseSerializer, responses={201: "Expense created successfully", 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields)."})
+manual_parameters=[openapi.Parameter(IDEMPOTENCY_HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING,
+description="Client-generated key, the same for every retry of this request; repeats return the stored response.")],
+request_body=ExpenseSerializer, responses={201: "Expense created successfully", 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields).",
+422: "(Unprocessable Entity): Raised when the Idempotency-Key was already used for a different request."})
 @api_view(['POST'])
+@idempotent('create-expense')
 def create_expense(request):
-    user = get_user_from_token(request)
-    if isinstance(user, Response):
-        return user
-
-    user = user.get('id')
-    serializer = ExpenseSerializer(data=request.data)
+    serializer = ExpenseSerializer(data=request.data, context={'request': request})
     
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        expense = serializer.save()
+        return Response(expense_data(expense, serializer.validated_data['splits']), status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# View to create many expenses (e.g. a CSV import of a trip) in one request.
+# In 'partial' mode invalid items are reported and the valid ones are still
+# created; in 'atomic' mode any invalid item rejects the whole batch.
+@swagger_auto_schema(methods=['post'], operation_description="Create a batch of Expenses",
+manual_parameters=[openapi.Parameter('mode', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(BATCH_MODES),
+description="'partial' or 'atomic'; defaults to the EXPENSE_BATCH_MODE setting.")],
+request_body=ExpenseSerializer(many=True), responses={201: "Expenses created successfully", 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields)."})
+@api_view(['POST'])
+def create_expenses_batch(request):
+    mode = request.query_params.get('mode', settings.EXPENSE_BATCH_MODE)
+    if mode not in BATCH_MODES:
+        return Response({'error': f"mode must be one of {', '.join(BATCH_MODES)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = request.data
+    if not isinstance(items, list):
+        return Response({'error': 'Expected a list of expenses'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.EXPENSE_BATCH_MAX_SIZE:
+        return Response({'error': f'A batch may contain at most {settings.EXPENSE_BATCH_MAX_SIZE} expenses'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Resolve every referenced user and group up front so validation does not query per item
+    context = batch_context(items, request)
+
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        serializer = ExpenseSerializer(data=item, context=context)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    if errors and (mode == 'atomic' or not valid):
+        return Response({'created': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    expenses = create_expenses([data for _, data in valid])
+    created = [{'index': index, 'id': expense.id} for (index, _), expense in zip(valid, expenses)]
+    return Response({'created': created, 'errors': errors}, status=status.HTTP_201_CREATED)
+
 # View to retrieve user's balance with other users
 @swagger_auto_schema(methods=['get'], operation_description="Retrieve User Balance"
 ,responses={200: "User balance retrieved successfully", 401 : "(Unauthorized): Raised when the token is invalid, missing, or expired.",
-404 : "(Not Found): Raised when the requested resource (like a user or expense) cannot be found.", 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields)."})
+404 : "(Not Found): Raised when the requested resource (like a user or expense) cannot be found.", 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields).",
+429: "(Too Many Requests): Raised when the user exceeds the endpoint's rate limit; see Retry-After."})
 @api_view(['GET'])
+@throttle_classes([rate_limit('balance')])
+@cached_response('balance')
+@coalesced('balance')
+@read_from_replica()
 def user_balance_view(request):
-    user = get_user_from_token(request)
-    if isinstance(user, Response):
-        return user
-
-    user = user.get('id')
+    user = request.user.id
     
     # Get amounts the user owes to others
-    owes_to = (
-        ExpenseSplit.objects.filter(user=user)
-        .exclude(expense__user=user)
-        .values('expense__user')
-        .annotate(total_owed=Sum('amount_owed'))
-        .order_by('-total_owed')
-    )
+    owes_to = owes_to_queryset(user)
 
     # Get amounts owed to the user by others
-    owed_from = (
-        ExpenseSplit.objects.filter(expense__user=user)
-        .exclude(user=user)
-        .values('user')
-        .annotate(total_owed=Sum('amount_owed'))
-        .order_by('-total_owed')
-    )
+    owed_from = owed_from_queryset(user)
 
-    # Format the response data
+    return Response(balance_data(owes_to, owed_from))
+
+# Function to format the balance response from the two balance querysets
+def balance_data(owes_to, owed_from):
     owes_to_data = [
         {
-            'to_user': User.objects.get(pk=item['expense__user']).name,
-            'total_owed': item['total_owed']
+            'to_user': item['creditor__name'],
+            'total_owed': item['amount']
         }
         for item in owes_to
     ]
 
     owed_from_data = [
         {
-            'from_user': User.objects.get(pk=item['user']).name,
-            'total_owed': item['total_owed']
+            'from_user': item['debtor__name'],
+            'total_owed': item['amount']
         }
         for item in owed_from
     ]
 
-    return Response({
+    return {
         'owes_to': owes_to_data,
         'owed_from': owed_from_data
-    })
+    }
 
 
-# View to list overall expenses for all users
+# View to suggest the fewest transfers that settle every outstanding balance.
+# Debts are simplified across all users, and each user is shown only the
+# transfers they pay or receive.
+@swagger_auto_schema(methods=['get'], operation_description="Suggest the user's transfers that settle all balances"
+,responses={200: "Settlement transfers computed successfully", 401 : "(Unauthorized): Raised when the token is invalid, missing, or expired.",
+429: "(Too Many Requests): Raised when the user exceeds the endpoint's rate limit; see Retry-After."})
+@api_view(['GET'])
+@throttle_classes([rate_limit('settle-up')])
+@coalesced('settle-up')
+@read_from_replica()
+def settle_up_view(request):
+    user = request.user.id
+    transfers = [transfer for transfer in simplify_debts(net_balances()) if user in transfer[:2]]
+    return Response(settle_up_data(transfers))
+
+# Function to format settle-up transfers with the users' names
+def settle_up_data(transfers):
+    names = User.objects.in_bulk(
+        {debtor for debtor, _, _ in transfers} | {creditor for _, creditor, _ in transfers}
+    )
+
+    return {
+        'transfers': [
+            {
+                'from_user': names[debtor].name,
+                'from_user_id': debtor,
+                'to_user': names[creditor].name,
+                'to_user_id': creditor,
+                'amount': amount
+            }
+            for debtor, creditor, amount in transfers
+        ]
+    }
+
+
+# Query parameters of the expense listings
+EXPENSE_LIST_PARAMETERS = [
+    openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Opaque cursor taken from the 'next' link of the previous page."),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Page size, capped by the EXPENSE_MAX_PAGE_SIZE setting."),
+    openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description=f"Comma separated subset of: {', '.join(ExpenseSerializer.Meta.fields)}. "
+                                  "Nested splits are only loaded when 'splits' is requested."),
+    openapi.Parameter('user', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Only include expenses paid by this user."),
+    openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or after this date (YYYY-MM-DD)."),
+    openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or before this date (YYYY-MM-DD)."),
+]
+
+# View to list overall expenses for all users, newest first, one keyset page at a time
 class OverallExpensesView(generics.ListAPIView):
-    queryset = Expense.objects.all()
-    serializer_class = ExpenseSerializer
+    permission_classes = [AllowAny]
+    # Describes the response for the schema; list() builds it with expense_rows
+    serializer_class = ExpenseListSerializer
+    pagination_class = CreatedAtKeysetPagination
 
+    @swagger_auto_schema(operation_description="List Expenses of all users, newest first",
+    manual_parameters=EXPENSE_LIST_PARAMETERS)
+    @method_decorator(cached_response('overall-expenses', per_user=False))
+    @method_decorator(read_from_replica(per_user=False))
     def get(self, request, *args, **kwargs):
-        expenses = self.get_queryset()
-        serializer = self.get_serializer(expenses, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        return self.list(request, *args, **kwargs)
+
+    def get_requested_fields(self):
+        # The schema generator (build_schema) calls this without a request
+        if getattr(self, 'swagger_fake_view', False) and self.request is None:
+            return list(ExpenseSerializer.Meta.fields)
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return list(ExpenseSerializer.Meta.fields)
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(fields) - set(ExpenseSerializer.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_queryset(self):
+        params = self.request.query_params
+        fields = self.get_requested_fields()
+        queryset = Expense.objects.all()
+
+        if params.get('user'):
+            try:
+                queryset = queryset.filter(user=int(params['user']))
+            except ValueError:
+                raise serializers.ValidationError({'user': 'Must be a user id'})
+        try:
+            start_date = get_date_param(self.request, 'start_date')
+            end_date = get_date_param(self.request, 'end_date')
+        except ValueError as e:
+            raise serializers.ValidationError({'date': str(e)})
+        queryset = queryset.filter(created_between(start_date, end_date))
+
+        # Load only the requested columns (plus the keyset columns) as plain
+        # rows; expense_rows adds the splits only when they were asked for
+        columns = {'id', 'created_at'} | {field for field in fields if field != 'splits'}
+        return queryset.values(*columns)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(expense_rows(page, self.get_requested_fields()))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
 
 # View to download the balance sheet as a CSV
+@swagger_auto_schema(methods=['get'], operation_description="Download the Balance Sheet as CSV",
+manual_parameters=[
+    openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or after this date (YYYY-MM-DD)."),
+    openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or before this date (YYYY-MM-DD)."),
+    openapi.Parameter('stream', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                      description="Stream rows as they are read; defaults to the BALANCE_SHEET_STREAM setting."),
+],
+responses={200: "CSV balance sheet", 400: "(Bad Request): Raised when a date filter is not a valid date.",
+401 : "(Unauthorized): Raised when the token is invalid, missing, or expired.",
+429: "(Too Many Requests): Raised when the user exceeds the endpoint's rate limit; see Retry-After."})
+@api_view(['GET'])
+@throttle_classes([rate_limit('balance-sheet')])
+@coalesced('balance-sheet')
+@read_from_replica()
 def download_balance_sheet(request):
-    
-    user = get_user_from_token(request)
-    if isinstance(user, Response):
-        return user
-    user_id = user.get('id')
-    
-    splits = ExpenseSplit.objects.filter(user=user_id)
+    user_id = request.user.id
 
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="balance_sheet_{user.get('name')}.csv"'
+    try:
+        start_date = get_date_param(request, 'start_date')
+        end_date = get_date_param(request, 'end_date')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    writer = csv.writer(response)
-    writer.writerow(['Expense', 'Amount Owed', 'Split Type', 'Percentage', 'Date', 'Owed To/From'])
+    splits = balance_sheet_queryset(user_id, start_date, end_date)
+    stream = request.query_params.get('stream')
+    stream = settings.BALANCE_SHEET_STREAM if stream is None else stream.lower() in ('1', 'true', 'yes')
 
-    for split in splits:
-        if split.expense.user == user_id:
-            owed_to_from = f'owed from {split.user.name}'
-        else:
-            owed_to_from = f'owed to {split.expense.user.name}'
-        writer.writerow([
-            split.expense.description,
-            split.amount_owed,
-            split.split_type,
-            split.percentage if split.split_type == 'percentage' else 'N/A',
-            split.expense.created_at,
-            owed_to_from
-        ])
+    if stream:
+        # Read through a server-side cursor and write rows as they arrive, so
+        # memory stays flat and the client gets the first bytes immediately.
+        # The rows are read after the view returns, so pin the database
+        # read_from_replica picked.
+        splits = splits.using(splits.db)
+        rows = balance_sheet_rows(user_id, splits.iterator(chunk_size=settings.BALANCE_SHEET_CHUNK_SIZE))
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    else:
+        # Create the HttpResponse object with the appropriate CSV header.
+        response = HttpResponse(content_type='text/csv')
+        csv.writer(response).writerows(balance_sheet_rows(user_id, splits))
 
+    user_name = request.user.name
+    response['Content-Disposition'] = f'attachment; filename="balance_sheet_{user_name}.csv"'
     return response
 
+# View to start a background export of the balance sheet; poll the returned
+# job and download the file from its download_url once it has succeeded
+@swagger_auto_schema(methods=['post'], operation_description="Start a background export of the Balance Sheet as CSV",
+manual_parameters=[
+    openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or after this date (YYYY-MM-DD)."),
+    openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include expenses created on or before this date (YYYY-MM-DD)."),
+],
+responses={202: ExportJobSerializer, 400: "(Bad Request): Raised when a date filter is not a valid date.",
+401 : "(Unauthorized): Raised when the token is invalid, missing, or expired.",
+429: "(Too Many Requests): Raised when the user already has EXPORT_MAX_ACTIVE_PER_USER exports in progress."})
+@api_view(['POST'])
+def start_balance_sheet_export(request):
+    try:
+        start_date = get_date_param(request, 'start_date')
+        end_date = get_date_param(request, 'end_date')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    params = {name: value.isoformat() for name, value in (('start_date', start_date), ('end_date', end_date)) if value}
+    try:
+        job = start_job(request.user, ExportJob.BALANCE_SHEET, params)
+    except TooManyJobs as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    data = ExportJobSerializer(job, context={'request': request}).data
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': reverse('export-status', args=[job.id])})
+
+# Function to fetch one of the user's export jobs, treating expired jobs as gone
+def get_export_job(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id, user=request.user.id)
+    if job.expires_at is not None and job.expires_at <= timezone.now():
+        return None
+    return job
+
+# View to check the status of a background export
+@swagger_auto_schema(methods=['get'], operation_description="Status of a background export",
+responses={200: ExportJobSerializer, 404: "(Not Found): No such export for this user.", 410: "(Gone): The export has expired."})
+@api_view(['GET'])
+def export_status(request, job_id):
+    job = get_export_job(request, job_id)
+    if job is None:
+        return Response({'error': 'This export has expired.'}, status=status.HTTP_410_GONE)
+    return Response(ExportJobSerializer(job, context={'request': request}).data)
+
+# View to download the file of a finished background export
+@swagger_auto_schema(methods=['get'], operation_description="Download the file of a finished background export",
+responses={200: "Export file", 404: "(Not Found): No such export for this user.",
+409: "(Conflict): The export has not succeeded (yet).", 410: "(Gone): The export has expired."})
+@api_view(['GET'])
+def download_export(request, job_id):
+    job = get_export_job(request, job_id)
+    if job is None:
+        return Response({'error': 'This export has expired.'}, status=status.HTTP_410_GONE)
+    if job.status != ExportJob.SUCCEEDED:
+        return Response({'error': f'This export is {job.status}.', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+    try:
+        f = open(export_path(job), 'rb')
+    except FileNotFoundError:
+        return Response({'error': 'This export has expired.'}, status=status.HTTP_410_GONE)
+    return FileResponse(f, as_attachment=True, filename=f'balance_sheet_{request.user.name}.csv',
+                        content_type='text/csv')
+
+# Decorator for group views: 404 unless the user is a member of the group
+def group_member_required(view):
+    @functools.wraps(view)
+    def wrapped(request, *args, group_id, **kwargs):
+        if not GroupMembership.objects.filter(group=group_id, user=request.user.id).exists():
+            raise NotFound('Group not found')
+        return view(request, *args, group_id=group_id, **kwargs)
+    return wrapped
+
+# View to list the user's groups or create a group
+@swagger_auto_schema(methods=['post'], operation_description="Create a Group; the creator becomes a member",
+request_body=GroupSerializer, responses={201: GroupSerializer, 400: "(Bad Request): Raised when the input validation fails (e.g., missing or invalid fields)."})
+@swagger_auto_schema(methods=['get'], operation_description="List the Groups the user is a member of",
+responses={200: GroupSerializer(many=True), 401 : "(Unauthorized): Raised when the token is invalid, missing, or expired."})
+@api_view(['GET', 'POST'])
+def groups_view(request):
+    if request.method == 'POST':
+        serializer = GroupSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(created_by=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    groups = (
+        Group.objects.filter(pk__in=GroupMembership.objects.filter(user=request.user.id).values('group'))
+        .annotate(member_count=Count('memberships'))
+        .order_by('id')
+    )
+    return Response(GroupSerializer(groups, many=True).data)
+
+# View to add members to a group
+@swagger_auto_schema(methods=['post'], operation_description="Add members to a Group",
+request_body=openapi.Schema(type=openapi.TYPE_OBJECT, required=['members'], properties={
+    'members': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+}),
+responses={200: "Members added", 400: "(Bad Request): Raised when a user does not exist.",
+404: "(Not Found): No such group for this user."})
+@api_view(['POST'])
+@group_member_required
+def group_members_view(request, group_id):
+    serializer = GroupSerializer(data=request.data, partial=True)
+    serializer.is_valid(raise_exception=True)
+    add_members(Group(pk=group_id), serializer.validated_data.get('members', set()))
+    return Response({'member_count': GroupMembership.objects.filter(group=group_id).count()})
+
+# View to retrieve the user's balances within a group
+@swagger_auto_schema(methods=['get'], operation_description="Retrieve User Balance within a Group",
+responses={200: "Group balance retrieved successfully", 404: "(Not Found): No such group for this user."})
+@api_view(['GET'])
+@group_member_required
+@cached_response('group-balance')
+@read_from_replica()
+def group_balance_view(request, group_id):
+    user = request.user.id
+    return Response(balance_data(owes_to_queryset(user, group_id), owed_from_queryset(user, group_id)))
+
+# View to suggest the fewest transfers that settle a group's balances
+@swagger_auto_schema(methods=['get'], operation_description="Suggest transfers that settle a Group's balances",
+responses={200: "Settlement transfers computed successfully", 404: "(Not Found): No such group for this user."})
+@api_view(['GET'])
+@group_member_required
+@read_from_replica(scope=lambda request, group_id: group_scope(group_id))
+def group_settle_up_view(request, group_id):
+    return Response(settle_up_data(simplify_debts(net_balances(balances(group_id)))))
+
+# View to list a group's expenses, newest first; the parameters of the overall listing apply
+class GroupExpensesView(OverallExpensesView):
+    # Unlike the overall listing, only for the group's members
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+
+    @swagger_auto_schema(operation_description="List a Group's Expenses, newest first",
+                         manual_parameters=EXPENSE_LIST_PARAMETERS)
+    @method_decorator(group_member_required)
+    @method_decorator(cached_response('group-expenses', scope=lambda request, group_id: group_scope(group_id)))
+    @method_decorator(read_from_replica(scope=lambda request, group_id: group_scope(group_id)))
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(group=self.kwargs['group_id'])
+
 @api_view(['GET'])
+@cached_response('user-expenses')
+@read_from_replica()
 def user_expenses(request):
-    user = get_user_from_token(request)
-    if isinstance(user, Response):
-        return user
-    user_id = user.get('id')
+    user_id = request.user.id
 
     # Fetch the splits related to the user
-    splits = ExpenseSplit.objects.filter(user=user_id)
+    splits = user_splits_queryset(user_id)
+
+    return Response(user_expense_rows(splits))
 
+# Function to format the splits returned by user_splits_queryset
+def user_expense_rows(splits):
     balance_sheet_data = []
 
     for split in splits:
         balance_sheet_data.append({
-            'expense': split.expense.description,
-            'amount_owed': split.amount_owed,
-            'split_type': split.split_type,
-            'percentage': split.percentage if split.split_type == 'percentage' else 'N/A',
-            'date': split.expense.created_at.isoformat(),
+            'expense': split['expense__description'],
+            'amount_owed': split['amount_owed'],
+            'split_type': split['split_type'],
+            'percentage': split['percentage'] if split['split_type'] == 'percentage' else 'N/A',
+            'date': split['expense__created_at'].isoformat(),
         })
 
-    return Response(balance_sheet_data)
\ No newline at end of file
+    return balance_sheet_data
+
+
+# View to report the user's totals per month from the monthly rollups
+@swagger_auto_schema(methods=['get'], operation_description="Monthly totals owed and paid by the user, by split type",
+manual_parameters=[
+    openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include months from the one containing this date (YYYY-MM-DD)."),
+    openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                      description="Only include months up to the one containing this date (YYYY-MM-DD)."),
+],
+responses={200: "Monthly report retrieved successfully", 400: "(Bad Request): Raised when a date filter is not a valid date.",
+401 : "(Unauthorized): Raised when the token is invalid, missing, or expired."})
+@api_view(['GET'])
+@cached_response('monthly-report')
+@read_from_replica()
+def monthly_report(request):
+    try:
+        start_date = get_date_param(request, 'start_date')
+        end_date = get_date_param(request, 'end_date')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = monthly_rollups_queryset(request.user.id, start_date, end_date)
+    return Response(monthly_report_data(rows))
+
+
+# View to return the user's expenses (with splits) and balance changes since a
+# sync token, oldest first; keep calling with the returned sync_token until
+# has_more is false
+@swagger_auto_schema(methods=['get'], operation_description="Expenses and balance changes since a sync token",
+manual_parameters=[
+    openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="The sync_token of the previous response; leave out to start from the beginning."),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Expenses per response, capped by the SYNC_MAX_PAGE_SIZE setting."),
+],
+responses={200: "Changes retrieved successfully", 400: "(Bad Request): Raised when the sync token is invalid.",
+401 : "(Unauthorized): Raised when the token is invalid, missing, or expired."})
+@api_view(['GET'])
+@read_from_replica()
+def sync_view(request):
+    try:
+        since = decode_token(request.query_params.get('since'))
+    except InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+    except ValueError:
+        limit = settings.SYNC_PAGE_SIZE
+    limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+
+    changes = list(sync_changes_queryset(request.user.id, since)[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    columns = [field for field in EXPENSE_FIELDS if field != 'splits']
+    rows = Expense.objects.filter(id__in=[expense_id for _, expense_id in changes]).values(*columns)
+    by_id = {expense['id']: expense for expense in expense_rows(list(rows))}
+    expenses = [by_id[expense_id] for _, expense_id in changes]
+
+    return Response({
+        'expenses': expenses,
+        'balance_deltas': balance_deltas(request.user.id, expenses),
+        'sync_token': encode_token(changes[-1][0] if changes else since),
+        'has_more': has_more,
+    })